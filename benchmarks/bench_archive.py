@@ -0,0 +1,60 @@
+"""Measure the load of a workspace with all its tasks, and a weekly report,
+before and after archiving all but the last 90 days of history. The load should
+only depend on the recent window and the report must be the same.
+
+Run from the repository root with ``python -m benchmarks.bench_archive``.
+"""
+import tempfile
+import timeit
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks.generate import make_workspace
+from wok.api import WokApi
+from wok.period import from_us, period_start
+
+JOBS = 10
+TASKS_PER_JOB = 10
+INTERVALS_PER_TASK = 2000
+
+
+def load(dir: Path) -> WokApi:
+    api = WokApi(dir=dir)
+    api.load()
+    api.wok.load_all()
+    return api
+
+
+def bench(dir: Path):
+    load_time = min(timeit.repeat(lambda: load(dir), number=1, repeat=5))
+    api = load(dir)
+    report_time = min(
+        timeit.repeat(lambda: load(dir).report("week"), number=1, repeat=5)
+    )
+    return load_time, report_time - load_time, api.report("week")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        dir = Path(tmp) / ".wok"
+        make_workspace(dir, JOBS, TASKS_PER_JOB, INTERVALS_PER_TASK)
+        api = load(dir)
+        # the running time would change the last report
+        api.suspend()
+        api.save()
+        before = bench(dir)
+        last = max(task.ends[-1] for job in api.wok.jobs for task in job.tasks)
+        day = period_start(from_us(last) - timedelta(days=90), "day")
+        res, msg = api.archive(day.strftime("%Y-%m-%d"))
+        assert res, msg
+        api.save()
+        after = bench(dir)
+        assert before[2] == after[2]
+    print(f"{JOBS * TASKS_PER_JOB * INTERVALS_PER_TASK} intervals, {msg}")
+    print(f"{'':<10} {'load (ms)':>10} {'report (ms)':>12}")
+    for name, (load_time, report_time, _) in [("live", before), ("archived", after)]:
+        print(f"{name:<10} {load_time * 1000:>10.1f} {report_time * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
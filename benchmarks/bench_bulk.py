@@ -0,0 +1,80 @@
+"""Measure the throughput of wok import and wok export on a generated CSV file
+of 2M intervals over 20 jobs of 10 tasks, and compare it with registering
+intervals one at a time through WokApi.register_task.
+
+Run from the repository root with ``python -m benchmarks.bench_bulk [rows]``.
+"""
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from wok.api import WokApi
+
+ROWS = 2_000_000
+JOBS = 20
+TASKS_PER_JOB = 10
+REGISTER_ROWS = 20_000
+
+
+def make_csv(path: Path, rows: int) -> None:
+    origin = datetime(2000, 1, 1, 9)
+    with path.open("w") as f:
+        f.write("job,task,start,end\n")
+        for i in range(rows):
+            start = origin + timedelta(minutes=37 * i)
+            end = start + timedelta(minutes=25)
+            f.write(
+                f"job{i % JOBS},task{i // JOBS % TASKS_PER_JOB},"
+                + f"{start.isoformat()},{end.isoformat()}\n"
+            )
+
+
+def bench_register(dir: Path) -> float:
+    api = WokApi(dir=dir)
+    api.load()
+    api.add_job("job", current=True)
+    api.add_task("task")
+    origin = datetime(2000, 1, 1, 9)
+    begin = time.perf_counter()
+    for i in range(REGISTER_ROWS):
+        start = origin + timedelta(minutes=37 * i)
+        end = start + timedelta(minutes=25)
+        api.register_task(
+            "task",
+            start.strftime("%Y-%m-%dT%H:%M:%S"),
+            end.strftime("%Y-%m-%dT%H:%M:%S"),
+        )
+    return REGISTER_ROWS / (time.perf_counter() - begin)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = Path(tmp) / "in.csv"
+        make_csv(csv, rows)
+        api = WokApi(dir=Path(tmp) / ".wok")
+        api.load()
+        begin = time.perf_counter()
+        with csv.open(newline="") as f:
+            res, msg = api.import_intervals(f)
+        import_time = time.perf_counter() - begin
+        begin = time.perf_counter()
+        with (Path(tmp) / "out.csv").open("w", newline="") as f:
+            api.export_intervals(f)
+        export_time = time.perf_counter() - begin
+        register = bench_register(Path(tmp) / ".wok2")
+    # kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(msg)
+    print(f"{'':>16} {'rows/s':>10}")
+    print(f"{'import':>16} {rows / import_time:>10.0f}")
+    print(f"{'export':>16} {rows / export_time:>10.0f}")
+    print(f"{'register_task':>16} {register:>10.0f}")
+    print(f"peak RSS: {peak:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
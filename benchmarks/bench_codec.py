@@ -0,0 +1,65 @@
+"""Compare the parse and format throughput of the task file date encodings on
+a 100k-interval task.
+
+Run from the repository root with ``python -m benchmarks.bench_codec``.
+"""
+import time
+from datetime import datetime, timedelta
+
+from wok.task import Task
+
+INTERVALS = 100_000
+
+
+def make_task() -> Task:
+    task = Task("task")
+    origin = datetime(2015, 1, 1, 9, 0, 0, 123456)
+    for i in range(INTERVALS):
+        start = origin + timedelta(minutes=37 * i)
+        task.add_interval(start, start + timedelta(minutes=25))
+    return task
+
+
+def strptime_load(lines):
+    # the codec used before Task.decode_datetime
+    return [
+        tuple(datetime.strptime(x, Task.isoformat) for x in line.split("->"))
+        for line in lines
+    ]
+
+
+def strftime_save(task):
+    # the codec used before Task.encode_datetime
+    return "\n".join(
+        ["->".join([d.strftime(Task.isoformat) for d in dt]) for dt in task.datetimes]
+    )
+
+
+def timed(fun, *args) -> float:
+    start = time.perf_counter()
+    fun(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    task = make_task()
+    iso = task.save()
+    epoch = task.save(epoch=True)
+    assert strftime_save(task) == iso
+    rows = [
+        (
+            "strptime/strftime",
+            timed(strptime_load, iso.split("\n")),
+            timed(strftime_save, task),
+        ),
+        ("isoformat", timed(Task("t").load, iso.split("\n")), timed(task.save)),
+        ("epoch", timed(Task("t").load, epoch.split("\n")), timed(task.save, True)),
+    ]
+    print(f"{INTERVALS} intervals")
+    print(f"{'codec':<18} {'parse (lines/s)':>16} {'format (lines/s)':>17}")
+    for name, parse, format in rows:
+        print(f"{name:<18} {INTERVALS / parse:>16,.0f} {INTERVALS / format:>17,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare the memory and total duration speed of Task intervals stored as
+arrays of microseconds with a list of (start, end) datetime tuples, the
+representation used before, at 1M intervals. Also time Task.check, a single
+pass over the sorted intervals, the bisect overlap lookup of a register and a
+range query with the prefix sums against a scan of the intervals.
+
+Run from the repository root with ``python -m benchmarks.bench_intervals``.
+"""
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from wok.task import Task
+
+INTERVALS = 1_000_000
+
+
+def make_intervals():
+    origin = datetime(2000, 1, 1, 9, 0, 0, 123456)
+    for i in range(INTERVALS):
+        start = origin + timedelta(minutes=37 * i)
+        yield start, start + timedelta(minutes=25)
+
+
+def measure(build):
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def build_list():
+    return [(start, end) for start, end in make_intervals()]
+
+
+def build_task():
+    task = Task("task")
+    for start, end in make_intervals():
+        task.add_interval(start, end)
+    return task
+
+
+def list_total(datetimes):
+    # Task.get_total_duration before the arrays
+    return sum([dt[1] - dt[0] for dt in datetimes], timedelta(0))
+
+
+def timed(fun, *args):
+    start = time.perf_counter()
+    res = fun(*args)
+    return res, time.perf_counter() - start
+
+
+def main():
+    datetimes, list_size = measure(build_list)
+    task, task_size = measure(build_task)
+    list_res, list_time = timed(list_total, datetimes)
+    task_res, task_time = timed(task.get_total_duration)
+    assert list_res == task_res
+    print(f"{INTERVALS} intervals")
+    print(
+        f"{'storage':<16} {'memory (MB)':>12} {'bytes/interval':>15}"
+        + f" {'total (ms)':>11}"
+    )
+    for name, size, duration in [
+        ("list of tuples", list_size, list_time),
+        ("arrays", task_size, task_time),
+    ]:
+        print(
+            f"{name:<16} {size / 1e6:>12.1f} {size / INTERVALS:>15.1f}"
+            + f" {duration * 1000:>11.1f}"
+        )
+    _, check_time = timed(task.check)
+    lookups = 10_000
+    start = time.perf_counter()
+    for i in range(lookups):
+        j = i * (INTERVALS // lookups)
+        task.find_overlap(task.starts[j] + 1, task.ends[j] - 1)
+    lookup_time = time.perf_counter() - start
+    print(f"check (ms) {check_time * 1000:.1f}")
+    print(f"overlap lookup (us) {lookup_time / lookups * 1e6:.2f}")
+    since, until = task.starts[INTERVALS // 3] + 1, task.ends[2 * INTERVALS // 3] - 1
+    task.get_range_us(since, until)  # builds the prefix sums
+    range_res, range_time = timed(task.get_range_us, since, until)
+    scan_res, scan_time = timed(
+        lambda: sum(
+            max(0, min(end, until) - max(start, since))
+            for start, end in zip(task.starts, task.ends)
+        )
+    )
+    assert range_res == scan_res
+    print(f"range query (us) {range_time * 1e6:.2f}, scan (ms) {scan_time * 1000:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Measure loading a workspace with all its tasks on a slow file system, with
+the serial load and with pools of threads reading the task files.
+
+The file system is a shim adding LATENCY to each listing and read, as a network
+file system would, and the loads must give the same jobs, tasks and current job.
+
+Run from the repository root with ``python -m benchmarks.bench_load``.
+"""
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+from benchmarks.generate import make_workspace
+from wok.wok import Wok
+
+JOBS = 20
+TASKS_PER_JOB = 10
+INTERVALS_PER_TASK = 20
+# seconds added to each file system access
+LATENCY = 0.002
+
+
+@contextmanager
+def slow_fs():
+    iterdir, read_text = Path.iterdir, Path.read_text
+
+    def slow_iterdir(path):
+        time.sleep(LATENCY)
+        return iterdir(path)
+
+    def slow_read_text(path, *args, **kwargs):
+        time.sleep(LATENCY)
+        return read_text(path, *args, **kwargs)
+
+    with mock.patch.object(Path, "iterdir", slow_iterdir), mock.patch.object(
+        Path, "read_text", slow_read_text
+    ):
+        yield
+
+
+def load(dir: Path, workers: int):
+    start = time.perf_counter()
+    wok = Wok()
+    wok.load(dir=dir, workers=workers)
+    wok.load_all()
+    duration = time.perf_counter() - start
+    return duration, (
+        wok.current_job_idx,
+        [
+            (job.name, [(task.name, task.save()) for task in job.tasks])
+            for job in wok.jobs
+        ],
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        dir = Path(tmp) / ".wok"
+        make_workspace(dir, JOBS, TASKS_PER_JOB, INTERVALS_PER_TASK)
+        print(
+            f"{JOBS * TASKS_PER_JOB} task files, {LATENCY * 1000:.0f} ms per access"
+        )
+        print(f"{'workers':>8} {'load (ms)':>10} {'speedup':>8}")
+        with slow_fs():
+            serial, expected = load(dir, 0)
+            print(f"{'serial':>8} {serial * 1000:>10.1f} {1:>8.1f}")
+            for workers in [4, 8, 16, 32]:
+                duration, result = load(dir, workers)
+                assert result == expected
+                print(
+                    f"{workers:>8} {duration * 1000:>10.1f}"
+                    + f" {serial / duration:>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Measure Wok.save cost after starting a single task, for a growing number of
+untouched jobs. The incremental save should stay flat.
+
+Run from the repository root with ``python -m benchmarks.bench_save``.
+"""
+import tempfile
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.generate import make_workspace
+from wok.wok import Wok
+
+TASKS_PER_JOB = 5
+INTERVALS_PER_TASK = 50
+
+
+def bench(jobs: int, repeat: int = 20) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        dir = Path(tmp) / ".wok"
+        make_workspace(dir, jobs, TASKS_PER_JOB, INTERVALS_PER_TASK)
+        wok = Wok()
+        wok.load(dir=dir)
+        task = wok.jobs[wok.current_job_idx].tasks[0]
+
+        def start_end_save():
+            if task.is_running():
+                task.end(dt=datetime.now())
+            else:
+                task.start(dt=datetime.now())
+            wok.save(dir=dir)
+
+        return min(timeit.repeat(start_end_save, number=1, repeat=repeat))
+
+
+def main():
+    print(f"{'jobs':>8} {'save (ms)':>10}")
+    for jobs in [10, 100, 1000]:
+        print(f"{jobs:>8} {bench(jobs) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare the file layout with the monthly shards on a task with years of
+history: saving an end, which rewrites the task file but only appends to a
+shard, and reading the intervals of a month.
+
+Run from the repository root with ``python -m benchmarks.bench_shards``.
+"""
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.generate import make_workspace
+from wok.api import WokApi
+
+INTERVALS = 20000
+
+
+def bench(dir: Path):
+    api = WokApi(dir=dir)
+    api.load()
+    task = api.get_current_job().tasks[0]
+    # the generated history goes past now, go on from its running interval
+    clock = [task.current_datetime]
+
+    def tick() -> datetime:
+        clock[0] += timedelta(minutes=1)
+        return clock[0]
+
+    task.end(dt=tick())
+    api.save()
+
+    def start_end_save():
+        if task.is_running():
+            task.end(dt=tick())
+        else:
+            task.start(dt=tick())
+        api.save()
+
+    save = min(timeit.repeat(start_end_save, number=1, repeat=20))
+    month = min(
+        timeit.repeat(
+            lambda: list(
+                api.storage.iter_intervals(datetime(2020, 6, 1), datetime(2020, 7, 1))
+            ),
+            number=1,
+            repeat=5,
+        )
+    )
+    return save, month
+
+
+def main():
+    print(f"{INTERVALS} intervals in one task")
+    print(f"{'layout':<8} {'save (ms)':>10} {'month (ms)':>11}")
+    for backend in ["files", "shards"]:
+        with tempfile.TemporaryDirectory() as tmp:
+            dir = Path(tmp) / ".wok"
+            make_workspace(dir, 1, 1, INTERVALS)
+            if backend != "files":
+                api = WokApi(dir=dir)
+                api.load()
+                api.migrate(backend)
+            save, month = bench(dir)
+        print(f"{backend:<8} {save * 1000:>10.3f} {month * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
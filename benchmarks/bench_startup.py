@@ -0,0 +1,64 @@
+"""Measure the wall time of cold ``wok status``, ``wok start`` and ``wok end``
+runs on a 100-job workspace, minus the time to start an empty interpreter, and
+check them against a budget.
+
+Run from the repository root with ``python -m benchmarks.bench_startup``. It
+exits with status 1 when a command goes over its budget.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.generate import make_workspace
+
+JOBS = 100
+REPEAT = 10
+# milliseconds over the empty interpreter start
+BUDGETS = {"status": 40, "start": 150, "end": 150}
+
+
+def run(argv, env) -> float:
+    begin = time.perf_counter()
+    subprocess.run(argv, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - begin
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        make_workspace(Path(tmp) / ".wok", JOBS, 5, 50)
+        env = dict(os.environ, HOME=tmp)
+        # what an installed wok console script runs
+        wok = [sys.executable, "-c", "from wokcli.wokcli import main; main()"]
+        commands = {
+            "status": wok + ["status"],
+            "start": wok + ["start", "task1"],
+            "end": wok + ["end", "task1"],
+        }
+        # first run writes the status file
+        run(commands["status"], env)
+        times = {name: [] for name in ["python"] + list(commands)}
+        for _ in range(REPEAT):
+            times["python"].append(run([sys.executable, "-c", "pass"], env))
+            for name, argv in commands.items():
+                times[name].append(run(argv, env))
+    base = statistics.median(times.pop("python"))
+    print(f"python -c pass: {base * 1000:.1f} ms")
+    print(f"{'command':>8} {'median (ms)':>12} {'overhead':>9} {'budget':>7}")
+    over = False
+    for name, values in times.items():
+        median = statistics.median(values)
+        overhead = (median - base) * 1000
+        over = over or overhead > BUDGETS[name]
+        print(
+            f"{name:>8} {median * 1000:>12.1f} {overhead:>9.1f} {BUDGETS[name]:>7}"
+            + (" OVER" if overhead > BUDGETS[name] else "")
+        )
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Compare the session statistics of wok stats computed over flat arrays with
+NumPy against the pure Python loop, at 10 jobs of 10 tasks of 10k intervals.
+Both must give the same statistics.
+
+Run from the repository root with ``python -m benchmarks.bench_stats``, NumPy
+being installed.
+"""
+import timeit
+
+from benchmarks.generate import make_wok
+from wok.stats import compute, flatten, load_numpy
+
+JOBS = 10
+TASKS_PER_JOB = 10
+INTERVALS_PER_TASK = 10000
+
+
+def main():
+    if load_numpy() is None:
+        raise SystemExit("NumPy is not installed")
+    wok = make_wok(JOBS, TASKS_PER_JOB, INTERVALS_PER_TASK)
+    flatten_time = min(timeit.repeat(lambda: flatten(wok.jobs), number=1, repeat=5))
+    starts, ends, job_ids, _ = flatten(wok.jobs)
+    times = {}
+    for name, vectorized in [("loop", False), ("numpy", True)]:
+        times[name] = min(
+            timeit.repeat(
+                lambda: compute(starts, ends, job_ids, vectorized), number=1, repeat=5
+            )
+        )
+    assert compute(starts, ends, job_ids, False) == compute(
+        starts, ends, job_ids, True
+    )
+    print(f"{len(starts)} intervals, flatten {flatten_time * 1000:.1f} ms")
+    print(f"{'':<6} {'stats (ms)':>11}")
+    for name, seconds in times.items():
+        print(f"{name:<6} {seconds * 1000:>11.1f}")
+    print(f"speedup {times['loop'] / times['numpy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
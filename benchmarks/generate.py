@@ -0,0 +1,72 @@
+"""Deterministic synthetic workspaces for the benchmarks.
+
+A workspace has jobs × tasks × intervals closed intervals, of 5 to 120
+minutes separated by gaps of up to a day, starting on 2019-01-01. The first job
+is the current one and its first task is running since the last end, so that
+the workspace passes ``wok check``. The same arguments and seed always give the
+same workspace.
+
+Run from the repository root with
+``python -m benchmarks.generate DIR [--jobs J --tasks T --intervals I --seed S]``
+to write one to DIR.
+"""
+import random
+from argparse import ArgumentParser
+from array import array
+from datetime import datetime
+from pathlib import Path
+
+from wok.job import Job
+from wok.period import from_us, to_us
+from wok.task import Task
+from wok.wok import Wok
+
+ORIGIN: int = to_us(datetime(2019, 1, 1, 9))
+MINUTE: int = 60_000_000
+
+
+def make_wok(jobs: int, tasks: int, intervals: int, seed: int = 0) -> Wok:
+    rng = random.Random(seed)
+    wok = Wok()
+    last_end = ORIGIN
+    for j in range(jobs):
+        job = Job(f"job{j}")
+        for t in range(tasks):
+            task = Task(f"task{t}")
+            starts, ends = array("q"), array("q")
+            start = ORIGIN + rng.randrange(24 * 60) * MINUTE
+            for _ in range(intervals):
+                end = start + rng.randrange(5, 120) * MINUTE
+                starts.append(start)
+                ends.append(end)
+                last_end = max(last_end, end)
+                start = end + rng.randrange(1, 24 * 60) * MINUTE
+            task.extend_us(starts, ends)
+            job.add_task(task)
+        wok.add_job(job)
+    if jobs > 0:
+        wok.current_job = wok.jobs[0]
+        if tasks > 0:
+            wok.current_job.tasks[0].start(dt=from_us(last_end + MINUTE))
+    return wok
+
+
+def make_workspace(
+    dir: Path, jobs: int, tasks: int, intervals: int, seed: int = 0
+) -> None:
+    make_wok(jobs, tasks, intervals, seed).save(dir=dir)
+
+
+def main():
+    parser = ArgumentParser(description="Write a synthetic workspace")
+    parser.add_argument("dir", type=Path, help="the folder to write, e.g. ~/.wok")
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=10)
+    parser.add_argument("--intervals", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    make_workspace(args.dir, args.jobs, args.tasks, args.intervals, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Time the hot paths on a synthetic workspace (see benchmarks.generate) and
+print the results as JSON, so that runs can be compared between releases.
+
+Each scenario is run repeat times on a fresh copy of the workspace when it
+modifies it, and its minimum and median times in seconds are reported.
+
+Run from the repository root with
+``python -m benchmarks.suite [--jobs J --tasks T --intervals I --repeat R]``.
+"""
+import json
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict
+
+from benchmarks.generate import make_workspace
+from wok.api import WokApi
+from wok.wok import Wok
+
+
+def loaded(dir: Path) -> WokApi:
+    api = WokApi(dir=dir)
+    api.load()
+    api.wok.load_all()
+    return api
+
+
+def scenarios(dir: Path) -> Dict[str, Callable[[], Callable[[], object]]]:
+    """The scenarios by name, each one prepares then returns what is timed"""
+
+    def load():
+        return lambda: Wok().load(dir=dir)
+
+    def load_all():
+        def run():
+            wok = Wok()
+            wok.load(dir=dir)
+            wok.load_all()
+
+        return run
+
+    def save_incremental():
+        api = loaded(dir)
+        return lambda: (api.start("task1"), api.save())
+
+    def save_full():
+        api = loaded(dir)
+        other = dir.with_name("full")
+        shutil.rmtree(other, ignore_errors=True)
+        return lambda: api.wok.save(dir=other)
+
+    def status():
+        api = loaded(dir)
+        return api.status
+
+    def details_grid():
+        api = loaded(dir)
+        return lambda: sum(1 for _ in api.iter_details("grid")[1])
+
+    def details_plain():
+        api = loaded(dir)
+        return lambda: sum(1 for _ in api.iter_details("plain")[1])
+
+    def total_duration():
+        api = loaded(dir)
+        now = datetime.now()
+        return lambda: sum(
+            (
+                task.get_total_duration(now)
+                for job in api.wok.jobs
+                for task in job.tasks
+            ),
+            timedelta(0),
+        )
+
+    def report_week():
+        api = loaded(dir)
+        return lambda: api.report("week")
+
+    return {
+        "load": load,
+        "load_all": load_all,
+        "save_incremental": save_incremental,
+        "save_full": save_full,
+        "status": status,
+        "details_grid": details_grid,
+        "details_plain": details_plain,
+        "total_duration": total_duration,
+        "report_week": report_week,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Time the hot paths, print JSON")
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=10)
+    parser.add_argument("--intervals", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only", nargs="*", help="the scenarios to run, default to all"
+    )
+    parser.add_argument("-o", "--output", type=Path, help="default to stdout")
+    args = parser.parse_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_workspace(source, args.jobs, args.tasks, args.intervals, args.seed)
+        dir = Path(tmp) / ".wok"
+        for name, prepare in scenarios(dir).items():
+            if args.only and name not in args.only:
+                continue
+            times = []
+            for _ in range(args.repeat):
+                shutil.rmtree(dir, ignore_errors=True)
+                shutil.copytree(source, dir)
+                run = prepare()
+                begin = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - begin)
+            results[name] = {
+                "min": min(times),
+                "median": statistics.median(times),
+                "repeat": args.repeat,
+            }
+    out = {
+        "workspace": {
+            "jobs": args.jobs,
+            "tasks": args.tasks,
+            "intervals": args.intervals,
+            "seed": args.seed,
+        },
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    text = json.dumps(out, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        args.output.write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
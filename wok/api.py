@@ -1,30 +1,113 @@
+import json
+import shlex
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from inspect import signature
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
 
+from wok.bulk import FORMATS, read_records, write_records
 from wok.job import Job
+from wok.period import PERIODS, from_us, next_period, period_start, to_us
+from wok.status import (
+    STATUS_NAME,
+    Status,
+    encode_status,
+    prompt_str,
+    read_status,
+    status_str,
+)
+from wok.storage import FileStorage, Storage, lock, open_storage, write_atomic
 from wok.task import Task
-from wok.wok import Wok
+from wok.trace import traced
+from wok.wok import DETAIL_FORMATS, Wok
 
 ApiRtype = Tuple[bool, str]
 
 
 class WokApi:
-    def __init__(self, dir: Path = Wok.default_dir):
+    # number of intervals read for a task before they are added to it
+    import_chunk: int = 4096
+
+    def __init__(
+        self,
+        dir: Path = Wok.default_dir,
+        journal: bool = False,
+        epoch: bool = False,
+        workers: int = 0,
+    ):
         self.wok: Wok = Wok()
         self.dir = dir
+        # the generation of the folder at the end of the last lock, see lock
+        self.generation: Optional[str] = None
+        self.storage: Storage = open_storage(
+            dir, journal=journal, epoch=epoch, workers=workers
+        )
+
+    @contextmanager
+    def lock(self, exclusive: bool = True) -> Iterator[None]:
+        """Lock the folder for a load-modify-save cycle (see storage.lock), e.g.
+        'with api.lock(): api.load(); api.start("task"); api.save()'
+
+        An api kept loaded between cycles, as by the daemon, is loaded again
+        when another process locked the folder to write since its last cycle.
+
+        :param exclusive: Default value = True, False for read-only commands
+
+        """
+        with lock(self.dir, exclusive) as (before, after):
+            if self.generation is not None and before != self.generation:
+                self.reload()
+            yield
+            self.generation = after
 
     def load(self) -> ApiRtype:
-        return self.wok.load(self.dir)
+        return self.storage.load(self.wok)
+
+    def reload(self) -> ApiRtype:
+        """Forget the unsaved changes and load again"""
+        self.wok = Wok()
+        return self.load()
 
     def save(self) -> ApiRtype:
-        self.wok.save(self.dir)
+        res, msg = self.storage.save(self.wok)
+        if res:
+            self.update_status()
+        return res, msg
+
+    def migrate(self, backend: str) -> ApiRtype:
+        from wok.shard_storage import ShardStorage
+        from wok.sqlite_storage import SqliteStorage
+
+        backends = {
+            "files": FileStorage,
+            "sqlite": SqliteStorage,
+            "shards": ShardStorage,
+        }
+        if backend not in backends:
+            return False, f"Unknown backend '{backend}'"
+        if type(self.storage) is backends[backend]:
+            return False, f"Already using the {backend} backend"
+        storage = backends[backend](self.dir)
+        res, msg = storage.save(self.wok)
+        if not res:
+            return res, msg
+        self.storage.clear()
+        self.storage = storage
+        return True, f"Migrated to the {backend} backend"
 
     def get_current_job(self) -> Optional[Job]:
-        return (
-            None
-            if self.wok.current_job_idx == -1
-            else self.wok.jobs[self.wok.current_job_idx]
-        )
+        return self.wok.current_job
 
     @staticmethod
     def __validate_name(name: str) -> bool:
@@ -35,12 +118,11 @@ class WokApi:
     def add_job(self, name: str, current: bool = False) -> ApiRtype:
         if not WokApi.__validate_name(name):
             return False, f"Job name {name} is invalid"
-        if any([job.name == name for job in self.wok.jobs]):
-            return False, f"Job with name '{name}' already exists"
         job = Job(name)
-        self.wok.jobs.append(job)
+        if not self.wok.add_job(job):
+            return False, f"Job with name '{name}' already exists"
         if current:
-            self.wok.current_job_idx = len(self.wok.jobs) - 1
+            self.wok.current_job = job
         return True, f"Job '{name}' created"
 
     def add_task(self, name: str) -> ApiRtype:
@@ -49,16 +131,14 @@ class WokApi:
         job = self.get_current_job()
         if job is None:
             return False, "No current job to add a task to"
-        if any([task.name == name for task in job.tasks]):
+        if not job.add_task(Task(name))[0]:
             return False, f"Task with name '{name}' already exists in job '{job.name}'"
-        task = Task(name)
-        job.add_task(task)
         return True, f"Task '{name}' created"
 
     def list_jobs(self) -> ApiRtype:
         out = ""
-        for i, j in enumerate(self.wok.jobs):
-            if i == self.wok.current_job_idx:
+        for j in self.wok.jobs:
+            if j is self.wok.current_job:
                 out += j.name + " [current]\n"
             else:
                 out += j.name + "\n"
@@ -80,26 +160,19 @@ class WokApi:
         return True, out[:-1]
 
     def __get_job(self, name: str) -> Optional[Job]:
-        return next(filter(lambda job: job.name == name, self.wok.jobs), None)
+        return self.wok.get_job(name)
 
     def __get_task(self, name: str) -> Optional[Task]:
         job = self.get_current_job()
         if job is None:
             return None
-        return next(filter(lambda task: task.name == name, job.tasks), None)
+        return job.get_task(name)
 
     def delete_job(self, name: str) -> ApiRtype:
-        current = self.get_current_job()
         job = self.__get_job(name)
         if job is None:
             return False, f"No job '{name}' found to delete"
-        self.wok.jobs.remove(job)
-        if current.name == name:
-            self.wok.current_job_idx = -1
-        else:
-            _, self.wok.current_job_idx = next(
-                ((j, i) for i, j in enumerate(self.wok.jobs) if j.name == current.name)
-            )
+        self.wok.remove_job(job)
         return True, f"Job '{name}' deleted!"
 
     def delete_task(self, path: str) -> ApiRtype:
@@ -107,12 +180,12 @@ class WokApi:
         if not res:
             return res, msg
         job = self.__get_job(job_name)
-        task = self.__get_task(task_name)
+        task = None if job is None else job.get_task(task_name)
         if task is None:
             if job is None:
                 return False, "No current job"
             return False, f"No task '{task_name}' found in job '{job_name}'"
-        job.tasks.remove(task)
+        job.remove_task(task)
         return True, f"Task '{task_name}' deleted from job '{job_name}'"
 
     def rename_job(self, old_name: str, new_name: str) -> ApiRtype:
@@ -124,7 +197,7 @@ class WokApi:
                 False,
                 f"A job with name '{new_name}' already exists",
             )
-        job.name = new_name
+        self.wok.rename_job(job, new_name)
         return True, f"Job '{old_name}' renamed '{new_name}' successfully"
 
     def rename_task(self, old_name: str, new_name: str) -> ApiRtype:
@@ -143,7 +216,7 @@ class WokApi:
                 False,
                 f"No task named '{old_name}' to rename in current job '{job.name}'",
             )
-        task.name = new_name
+        job.rename_task(task, new_name)
         return True, f"Task '{old_name}' renamed '{new_name}' successfully"
 
     def get_job_details(self, name: str, table: bool = False) -> ApiRtype:
@@ -230,7 +303,9 @@ class WokApi:
         ended, msg = task.end()
         return ended, out + msg
 
-    def register_task(self, path: str, start: str = None, end: str = None) -> ApiRtype:
+    def register_task(
+        self, path: str, start: str = None, end: str = None, merge: bool = False
+    ) -> ApiRtype:
         res, msg, job_name, task_name = self.__handle_path(path)
         if not res:
             return res, msg
@@ -241,32 +316,43 @@ class WokApi:
                 False,
                 out + f"No task named '{task_name}' found in current job '{job_name}'",
             )
-        reg, msg = task.register_dates(started=start, ended=end)
+        reg, msg = task.register_dates(started=start, ended=end, merge=merge)
         return reg, out + msg
 
+    def __status(self) -> Status:
+        job = self.get_current_job()
+        if job is None:
+            return None, []
+        running = job.get_running_tasks()
+        return job.name, [(t.name, to_us(t.current_datetime)) for t in running]
+
     def status(self) -> ApiRtype:
-        j, t = "No current job", []
+        return True, status_str(self.__status(), datetime.now())
+
+    def prompt(self) -> ApiRtype:
+        return True, prompt_str(self.__status())
+
+    @traced("status_file")
+    def update_status(self) -> None:
+        """Write the status file read by the fast status path if it changed"""
         job = self.get_current_job()
-        if job is not None:
-            j = f"Job '{job.name}'"
-            tasks = job.get_running_tasks()
-            if len(tasks) == 0:
-                t.append("No running task")
-            else:
-                for task in tasks:
-                    d = task.detailed_str()
-                    t.append(d[0] + " (" + d[1].split()[-1] + ")")
-        else:
-            t.append("No running task")
-        out = "Current job:\n"
-        out += "\t" + j + "\n"
-        out += "Running task(s):\n"
-        out += "\n".join(["\t" + tt for tt in t])
-        return True, out
+        stored = read_status(self.dir)
+        if job is not None and not job.is_loaded() and stored is not None:
+            if stored[0] == job.name:
+                # the running tasks only change once the tasks are loaded
+                return
+        content = encode_status(self.__status())
+        if stored is None or encode_status(stored) != content:
+            write_atomic(self.dir / STATUS_NAME, content)
 
     def suspend(self) -> ApiRtype:
         r = []
+        current = self.get_current_job()
         for job in self.wok.jobs:
+            if not job.is_loaded() and job is not current:
+                # switching jobs suspends all running tasks so tasks can only
+                # be running in the current job or in jobs modified since load
+                continue
             for task in job.get_running_tasks():
                 r.append(task.end())
         if len(r) == 0:
@@ -274,10 +360,8 @@ class WokApi:
         return any([b for b, _ in r]), "\n".join([m for _, m in r])
 
     def switch(self, job_name: str, create: bool = False) -> ApiRtype:
-        if (
-            self.get_current_job() is not None
-            and self.get_current_job().name == job_name
-        ):
+        current = self.get_current_job()
+        if current is not None and current.name == job_name:
             return False, f"Already on job '{job_name}'"
         # suspend all running tasks before switching
         suspended, suspend_out = self.suspend()
@@ -291,18 +375,473 @@ class WokApi:
             suspend_out
             + f"Impossible to switch to job '{job_name}', try using the '-c' option",
         )
+        job = self.__get_job(job_name)
+        if job is not None:
+            self.wok.current_job = job
+            return ok
+        if create:
+            self.add_job(job_name, current=True)
+            return ok
+        return ko
+
+    def get_details(self) -> ApiRtype:
+        return True, self.wok.detailed_table()
+
+    def iter_details(
+        self, format: str = "grid", limit: int = None
+    ) -> Tuple[bool, Iterator[str]]:
+        if format not in DETAIL_FORMATS:
+            return False, iter([f"Unknown format '{format}'"])
+        return True, self.wok.iter_details(format, limit)
+
+    def report(
+        self, by: str = "week", since: str = None, until: str = None
+    ) -> ApiRtype:
+        if by not in PERIODS:
+            return False, f"Unknown period '{by}', use one of {', '.join(PERIODS)}"
+        res, dates = WokApi.__parse_days(since, until)
+        if not res:
+            return False, dates
+        # whole periods are reported, from the one of since to the one of until
+        first = None if since is None else to_us(period_start(dates[0], by))
+        last = (
+            None
+            if until is None
+            else to_us(next_period(period_start(dates[1], by), by))
+        )
+        return True, self.__range_wok(first, last).report_table(by, *dates)
+
+    def time(
+        self, path: str = None, since: str = None, until: str = None
+    ) -> ApiRtype:
+        """The time spent between two days on a job, a task or all jobs, each
+        task answering in O(log n) (see Task.get_range_us)
+
+        :param path: Default value = None, all jobs, else 'job' or 'job.task'
+        :param since: Default value = None, first day as YYYY-MM-DD
+        :param until: Default value = None, last day as YYYY-MM-DD
+        :return: True if success + the duration of each job or task and the total
+        :rtype: boolean, string
+
+        """
+        res, dates = WokApi.__parse_days(since, until)
+        if not res:
+            return False, dates
+        first = dates[0]
+        last = None if until is None else dates[1] + timedelta(days=1)
+        if first is not None and last is not None and first >= last:
+            return False, f"The first day {since} is after the last day {until}"
+        wok = self.__range_wok(
+            None if first is None else to_us(first),
+            None if last is None else to_us(last),
+        )
+        now = datetime.now()
+        if path is None:
+            wok.load_all()
+            durations = [
+                (job.name, job.get_range_duration(first, last, now))
+                for job in wok.jobs
+            ]
+        else:
+            job_name, _, task_name = path.partition(".")
+            job = wok.get_job(job_name)
+            if job is None:
+                return False, f"No job named '{job_name}' found"
+            if task_name == "":
+                tasks = job.tasks
+            else:
+                task = job.get_task(task_name)
+                if task is None:
+                    return False, f"No task named '{task_name}' found in '{job_name}'"
+                tasks = [task]
+            durations = [
+                (f"{job.name}.{task.name}", task.get_range_duration(first, last, now))
+                for task in tasks
+            ]
+        lines = [
+            f"{name} {Task.duration_to_str(duration)}"
+            for name, duration in durations
+            if duration > timedelta(0)
+        ]
+        total = sum((duration for _, duration in durations), timedelta(0))
+        lines.append(f"total {Task.duration_to_str(total)}")
+        return True, "\n".join(lines)
+
+    def archive(self, before: str) -> ApiRtype:
+        """Move the intervals before a day into daily totals, to keep the task
+        files small, totals and reports being unchanged (see Task.archive_before)
+
+        :param before: The first day kept as intervals, as YYYY-MM-DD
+        :return: True if success + message
+        :rtype: boolean, string
+
+        """
+        res, dates = WokApi.__parse_days(before)
+        if not res:
+            return False, dates
+        intervals, tasks = 0, 0
+        for job in self.wok.jobs:
+            for task in job.tasks:
+                archived = task.archive_before(to_us(dates[0]))
+                if archived > 0:
+                    intervals += archived
+                    tasks += 1
+        if intervals == 0:
+            return False, f"No interval before {before}"
+        return True, f"Archived {intervals} intervals of {tasks} tasks before {before}"
+
+    def check(self, merge: bool = False) -> ApiRtype:
+        """Validate the intervals of all tasks, each task is checked in a single
+        pass over its sorted intervals
+
+        :param merge: Default value = False, merge the overlapping intervals
+        :return: True if no issue is left + the issues found
+        :rtype: boolean, string
+
+        """
+        lines = []
+        left = 0
+        self.wok.load_all()
+        for job in self.wok.jobs:
+            for task in job.tasks:
+                issues = task.check()
+                if len(issues) == 0:
+                    continue
+                if merge:
+                    merged = task.merge_overlaps()
+                    if merged > 0:
+                        lines.append(
+                            f"{job.name}.{task.name}: merged {merged} intervals"
+                        )
+                    issues = task.check()
+                left += len(issues)
+                lines += [f"{job.name}.{task.name}: {issue}" for issue in issues]
+        if len(lines) == 0:
+            return True, "No issue found"
+        return left == 0, "\n".join(lines)
+
+    @traced("stats")
+    def stats(self, vectorized: Optional[bool] = None) -> ApiRtype:
+        """Session length histogram, hour of week heatmap and session length
+        percentiles by job, computed over flat arrays of all the intervals (see
+        stats.compute)
+
+        :param vectorized: Default value = None, with NumPy if it is installed,
+            False for the pure Python loop
+        :return: True if success + the tables
+        :rtype: boolean, string
+
+        """
+        from wok import stats
+
+        self.wok.load_all()
+        starts, ends, job_ids, names = stats.flatten(self.wok.jobs)
+        if len(starts) == 0:
+            return False, "No interval found"
         try:
-            _, self.wok.current_job_idx = next(
-                ((j, i) for i, j in enumerate(self.wok.jobs) if j.name == job_name)
+            result = stats.compute(starts, ends, job_ids, vectorized)
+        except ImportError as e:
+            return False, str(e)
+        return True, stats.stats_str(result, names)
+
+    @staticmethod
+    @traced("merge_report")
+    def merge_report(
+        dirs: List[str], since: str = None, until: str = None
+    ) -> ApiRtype:
+        """The time spent by several people between two days, each wok folder
+        being read as a stream of intervals sorted by start (see
+        Storage.iter_sorted_us) and the streams merged in a single pass (see
+        merge.merge_intervals). Archived daily totals are not included.
+
+        :param dirs: The wok folders, as DIR or NAME=DIR, the name of a person
+            being the name of DIR, or of its parent if hidden as ~/.wok
+        :param since: Default value = None, first day as YYYY-MM-DD
+        :param until: Default value = None, last day as YYYY-MM-DD
+        :return: True if no task has overlapping intervals + the time spent by
+            person and task, the total and the overlaps found
+        :rtype: boolean, string
+
+        """
+        from contextlib import ExitStack
+
+        from wok.merge import merge_intervals
+
+        res, dates = WokApi.__parse_days(since, until)
+        if not res:
+            return False, dates
+        first = None if since is None else to_us(dates[0])
+        last = None if until is None else to_us(dates[1] + timedelta(days=1))
+        folders: Dict[str, Path] = {}
+        for arg in dirs:
+            name, sep, path = arg.partition("=")
+            dir = Path(path if sep else arg).expanduser()
+            if not sep:
+                name = dir.parent.name if dir.name.startswith(".") else dir.name
+            if not dir.is_dir():
+                return False, f"No wok folder {dir}"
+            if name in folders:
+                return False, f"Several folders for {name}, use NAME=DIR"
+            folders[name] = dir
+
+        def interval_str(start: int, end: int) -> str:
+            return (
+                f"{from_us(start).strftime(Task.niceformat)} -> "
+                + from_us(end).strftime(Task.niceformat)
             )
-            return ok
 
-        except StopIteration:
-            if create:
-                self.add_job(job_name, current=True)
-                return ok
+        with ExitStack() as stack:
+            sources = {}
+            for name, dir in folders.items():
+                stack.enter_context(lock(dir, exclusive=False))
+                sources[name] = open_storage(dir).iter_sorted_us(first, last)
+            totals, overlaps, count = merge_intervals(sources, first, last)
+        lines = []
+        for (person, job_name, task_name), us in sorted(totals.items()):
+            if us > 0:
+                duration = Task.duration_to_str(timedelta(microseconds=us))
+                lines.append(f"{person} {job_name}.{task_name} {duration}")
+        total = timedelta(microseconds=sum(totals.values()))
+        lines.append(f"total {Task.duration_to_str(total)}")
+        for person, (start, end, job_name, task_name), previous in overlaps:
+            lines.append(
+                f"{person}: {job_name}.{task_name} {interval_str(start, end)} "
+                + f"overlaps {previous[2]}.{previous[3]} "
+                + interval_str(*previous[:2])
+            )
+        if count > len(overlaps):
+            lines.append(f"... {count - len(overlaps)} more overlaps")
+        return count == 0, "\n".join(lines)
+
+    def __storage_only(self) -> bool:
+        """True when the storage holds the loaded wok and no task was read yet,
+        so that it can be asked for less than everything"""
+        return (
+            self.wok.source is self.storage
+            and len(self.wok.removed_jobs) == 0
+            and not any(job.is_loaded() or job.is_dirty() for job in self.wok.jobs)
+        )
+
+    def __range_wok(self, since: Optional[int], until: Optional[int]) -> Wok:
+        """The wok to answer for [since, until), in microseconds: a wok only
+        holding the intervals overlapping it when the storage can load them
+        (see Storage.load_range), else the loaded one"""
+        if (since is not None or until is not None) and self.__storage_only():
+            wok = Wok()
+            if self.storage.load_range(wok, since, until):
+                return wok
+        return self.wok
+
+    @staticmethod
+    def __parse_days(*days: Optional[str]) -> Tuple[bool, Union[list, str]]:
+        dates = []
+        for day in days:
+            try:
+                dates.append(
+                    None if day is None else datetime.strptime(day, "%Y-%m-%d")
+                )
+            except ValueError:
+                return False, f"Unrecognized date {day}, use YYYY-MM-DD"
+        return True, dates
+
+    @traced("import")
+    def import_intervals(
+        self, f: TextIO, format: str = "csv", merge: bool = False
+    ) -> ApiRtype:
+        """Import the intervals read from f (see bulk.read_records), creating the
+        missing jobs and tasks. The intervals are grouped by task and added in
+        bulk, those overlapping another one being skipped unless merged (see
+        Task.extend_us).
+
+        :param f: The file to read
+        :param format: Default value = "csv", one of bulk.FORMATS
+        :param merge: Default value = False, merge the overlapping intervals
+        :return: True if no record was invalid or skipped + message
+        :rtype: boolean, string
+
+        """
+        if format not in FORMATS:
+            return False, f"Unknown format '{format}'"
+        buffers: Dict[Tuple[str, str], Tuple[array, array]] = {}
+        tasks: Dict[Tuple[str, str], Task] = {}
+        invalid: List[str] = []
+        overlaps: List[str] = []
+        imported = 0
+
+        def flush(key: Tuple[str, str]) -> None:
+            starts, ends = buffers.pop(key)
+            job_name, task_name = key
+            task = tasks.get(key)
+            if task is None:
+                job = self.__get_job(key[0])
+                if job is None:
+                    job = Job(key[0])
+                    self.wok.add_job(job)
+                task = job.get_task(key[1])
+                if task is None:
+                    task = Task(key[1])
+                    job.add_task(task)
+                tasks[key] = task
+            for start, end in task.extend_us(starts, ends, merge):
+                overlaps.append(
+                    f"{job_name}.{task_name} {Task.interval_str(start, end)}"
+                )
+
+        for line, record in read_records(f, format):
+            if (
+                record is None
+                or not WokApi.__validate_name(record[0])
+                or not WokApi.__validate_name(record[1])
+                or record[2] > record[3]
+            ):
+                invalid.append(str(line))
+                continue
+            key = record[:2]
+            if key not in buffers:
+                buffers[key] = (array("q"), array("q"))
+            starts, ends = buffers[key]
+            starts.append(record[2])
+            ends.append(record[3])
+            imported += 1
+            if len(starts) >= WokApi.import_chunk:
+                flush(key)
+        for key in list(buffers):
+            flush(key)
+        msg = f"Imported {imported - len(overlaps)} intervals in {len(tasks)} tasks"
+        if len(invalid) > 0:
+            lines = ", ".join(invalid[:10]) + (", ..." if len(invalid) > 10 else "")
+            msg += f"\n{len(invalid)} invalid records skipped: {lines}"
+        if len(overlaps) > 0:
+            msg += f"\n{len(overlaps)} overlapping intervals skipped (use merge): "
+            msg += ", ".join(overlaps[:10]) + (", ..." if len(overlaps) > 10 else "")
+        return len(invalid) == 0 and len(overlaps) == 0, msg
+
+    @traced("export")
+    def export_intervals(
+        self, f: TextIO, format: str = "csv", since: str = None, until: str = None
+    ) -> ApiRtype:
+        """Write the closed intervals overlapping the since to until days to f,
+        job by job
+
+        :param f: The file to write
+        :param format: Default value = "csv", one of bulk.FORMATS
+        :param since: Default value = None, first day as YYYY-MM-DD
+        :param until: Default value = None, last day as YYYY-MM-DD
+        :return: True if success + message
+        :rtype: boolean, string
+
+        """
+        if format not in FORMATS:
+            return False, f"Unknown format '{format}'"
+        res, dates = WokApi.__parse_days(since, until)
+        if not res:
+            return False, dates
+        first = None if since is None else to_us(dates[0])
+        last = None if until is None else to_us(dates[1] + timedelta(days=1))
+        if not self.__storage_only():
+            self.wok.load_all()
+            intervals: Iterator[Tuple[str, str, int, int]] = (
+                (job.name, task.name, start, end)
+                for job in self.wok.jobs
+                for task in job.tasks
+                for start, end in zip(task.starts, task.ends)
+            )
+        else:
+            # the storage only reads what the range needs (see ShardStorage)
+            intervals = (
+                (job_name, task_name, to_us(start), to_us(end))
+                for job_name, task_name, start, end in self.storage.iter_intervals(
+                    None if first is None else from_us(first),
+                    None if last is None else from_us(last),
+                )
+            )
+        records = (
+            (job_name, task_name, start, end)
+            for job_name, task_name, start, end in intervals
+            if (first is None or end >= first) and (last is None or start < last)
+        )
+        return True, f"Exported {write_records(f, records, format)} intervals"
+
+    # the operations apply_batch accepts
+    batch_ops: List[str] = [
+        "add_job",
+        "add_task",
+        "delete_job",
+        "delete_task",
+        "rename_job",
+        "rename_task",
+        "start",
+        "end",
+        "register_task",
+        "suspend",
+        "switch",
+    ]
+
+    @staticmethod
+    def parse_op(line: str) -> dict:
+        """Parse a batch line, either a JSON object or 'op arg... key=value...'
+        where true and false values are booleans, e.g.
+        'start job.task create=true'.
+
+        :param line: The line
+        :return: the operation (see apply_batch)
+        :rtype: dict
+
+        """
+        if line.lstrip().startswith("{"):
+            return json.loads(line)
+        words = shlex.split(line)
+        op: dict = {"op": words[0] if len(words) > 0 else None, "args": []}
+        for word in words[1:]:
+            key, sep, value = word.partition("=")
+            if sep == "" or not key.isidentifier():
+                op["args"].append(word)
             else:
-                return ko
+                op[key] = {"true": True, "false": False}.get(value, value)
+        return op
 
-    def get_details(self) -> ApiRtype:
-        return True, self.wok.detailed_table()
+    @traced("batch")
+    def apply_batch(
+        self, ops: Iterable[Union[dict, str]], atomic: bool = False
+    ) -> Tuple[bool, List[ApiRtype]]:
+        """Apply operations one after the other, to be saved once afterwards
+
+        An operation is a dict such as {"op": "start", "path": "job.task"} where
+        op is one of batch_ops and the other keys its arguments, positional
+        arguments can be given as "args": [...]. Lines are parsed by parse_op.
+
+        :param ops: The operations
+        :param atomic: Default value = False, stop at the first failure and
+            forget the changes made since the last save
+        :return: True if all succeeded + the result of each applied operation
+        :rtype: boolean, [(boolean, string)]
+
+        """
+        results = []
+        for op in ops:
+            res = self.__apply_op(op)
+            results.append(res)
+            if atomic and not res[0]:
+                self.reload()
+                return False, results
+        return all(res for res, _ in results), results
+
+    def __apply_op(self, op: Union[dict, str]) -> ApiRtype:
+        if isinstance(op, str):
+            try:
+                op = WokApi.parse_op(op)
+            except ValueError as e:
+                return False, f"Invalid operation: {e}"
+        if not isinstance(op, dict):
+            return False, f"Invalid operation {op!r}"
+        kwargs = dict(op)
+        name = kwargs.pop("op", None)
+        if name not in WokApi.batch_ops:
+            return False, f"Unknown operation '{name}'"
+        args = kwargs.pop("args", [])
+        method = getattr(self, name)
+        try:
+            signature(method).bind(*args, **kwargs)
+        except TypeError as e:
+            return False, f"Invalid arguments for {name}: {e}"
+        return method(*args, **kwargs)
@@ -0,0 +1,120 @@
+import csv
+import json
+from datetime import datetime
+from typing import Iterator, TextIO, Tuple
+
+from wok.period import from_us, to_us
+
+# (job name, task name, start, end), dates in microseconds since EPOCH
+Record = Tuple[str, str, int, int]
+
+FORMATS: Tuple[str, ...] = ("csv", "jsonl")
+FIELDS: Tuple[str, ...] = ("job", "task", "start", "end")
+
+
+def guess_format(file_name: str) -> str:
+    """
+
+    :param file_name: The file name, '-' for stdin or stdout
+    :return: jsonl for .jsonl and .json files, csv otherwise
+    :rtype: string
+
+    """
+    return "jsonl" if file_name.endswith((".jsonl", ".json")) else "csv"
+
+
+def parse_us(s: str) -> int:
+    """Parses an ISO 8601 date or a number of microseconds since EPOCH
+
+    :param s: The date
+    :return: The date in microseconds since EPOCH
+    :rtype: int
+
+    """
+    if s.isdigit():
+        return int(s)
+    return to_us(datetime.fromisoformat(s))
+
+
+def format_us(us: int) -> str:
+    return from_us(us).isoformat(timespec="microseconds")
+
+
+def read_records(f: TextIO, format: str) -> Iterator[Tuple[int, Record]]:
+    """Read records one at a time
+
+    CSV files have a job,task,start,end header line, JSON Lines files have an
+    object with these keys per line.
+
+    :param f: The file to read
+    :param format: One of FORMATS
+    :return: (line number, record) for each valid record, (line number, None)
+        for each invalid one
+    :rtype: iterator
+
+    """
+    if format == "csv":
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        try:
+            columns = [header.index(field) for field in FIELDS]
+        except ValueError:
+            yield reader.line_num, None
+            return
+        for row in reader:
+            try:
+                job, task, start, end = (row[c] for c in columns)
+                yield reader.line_num, (job, task, parse_us(start), parse_us(end))
+            except (IndexError, ValueError):
+                yield reader.line_num, None
+    else:
+        for i, line in enumerate(f, 1):
+            if line.strip() == "":
+                continue
+            try:
+                obj = json.loads(line)
+                start, end = obj["start"], obj["end"]
+                yield i, (
+                    obj["job"],
+                    obj["task"],
+                    start if isinstance(start, int) else parse_us(start),
+                    end if isinstance(end, int) else parse_us(end),
+                )
+            except (KeyError, TypeError, ValueError):
+                yield i, None
+
+
+def write_records(f: TextIO, records: Iterator[Record], format: str) -> int:
+    """Write records one at a time, dates as ISO 8601 dates
+
+    :param f: The file to write
+    :param records: The records to write
+    :param format: One of FORMATS
+    :return: the number of records written
+    :rtype: int
+
+    """
+    n = 0
+    if format == "csv":
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(FIELDS)
+        for job, task, start, end in records:
+            writer.writerow((job, task, format_us(start), format_us(end)))
+            n += 1
+    else:
+        for job, task, start, end in records:
+            f.write(
+                json.dumps(
+                    {
+                        "job": job,
+                        "task": task,
+                        "start": format_us(start),
+                        "end": format_us(end),
+                    }
+                )
+                + "\n"
+            )
+            n += 1
+    return n
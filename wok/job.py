@@ -1,16 +1,62 @@
-from datetime import timedelta
-from typing import List, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
 
-from tabulate import tabulate
 from wok.task import Task
+from wok.trace import traced
 
 
 class Job:
-    """A Job has a name and a list of tasks."""
-
-    def __init__(self, name: str):
+    """A Job has a name and a list of tasks.
+    The tasks can be loaded on first access by a loader function.
+    closed_us is the rollup of the closed_us of its tasks.
+    """
+
+    __slots__ = (
+        "name",
+        "__tasks",
+        "__by_name",
+        "__loader",
+        "closed_us",
+        "saved_name",
+        "removed_tasks",
+    )
+
+    def __init__(self, name: str, loader: Callable[["Job"], List[Task]] = None):
         self.name: str = name
-        self.tasks: List[Task] = []
+        self.__tasks: Optional[Tuple[Task, ...]] = None if loader else ()
+        # tasks by name, kept up to date by add_task, remove_task and rename_task
+        self.__by_name: Dict[str, Task] = {}
+        self.__loader = loader
+        self.closed_us: int = 0
+        # name of the directory on disk, None until saved once
+        self.saved_name: Optional[str] = None
+        # saved names of the removed tasks whose files must be deleted
+        self.removed_tasks: List[str] = []
+
+    @property
+    def tasks(self) -> Tuple[Task, ...]:
+        """The tasks, a tuple only changed by add_task and remove_task so that
+        the index by name cannot go stale"""
+        if self.__tasks is None:
+            self.__tasks = tuple(self.__loader(self))
+            self.__by_name = {task.name: task for task in self.__tasks}
+            for task in self.__tasks:
+                task.job = self
+            self.closed_us = sum(task.closed_us for task in self.__tasks)
+        return self.__tasks
+
+    def __index(self) -> Dict[str, Task]:
+        self.tasks
+        return self.__by_name
+
+    def is_loaded(self) -> bool:
+        """
+
+        :return: True if the tasks are loaded
+        :rtype: boolean
+
+        """
+        return self.__tasks is not None
 
     def add_task(self, task: Task) -> Tuple[bool, str]:
         """Adds the task if the name is not taken
@@ -21,12 +67,16 @@ class Job:
         :rtype: boolean, string
 
         """
-        if self.get_task(task.name):
+        index = self.__index()
+        if task.name in index:
             return (
                 False,
                 f"A task with name '{task.name}' already exists in job '{self.name}'",
             )
-        self.tasks.append(task)
+        self.__tasks = self.tasks + (task,)
+        index[task.name] = task
+        task.job = self
+        self.closed_us += task.closed_us
         return True, f"Task '{task.name}' added to job '{self.name}'"
 
     def remove_task(self, task: Task) -> Tuple[bool, str]:
@@ -38,11 +88,16 @@ class Job:
         :rtype: boolean, string
 
         """
-        try:
-            self.tasks.remove(task)
-            return True, f"Task '{task.name}' removed from job '{self.name}'"
-        except ValueError:
+        index = self.__index()
+        if task is None or index.get(task.name) is not task:
             return False, "No task to remove"
+        self.__tasks = tuple(t for t in self.tasks if t is not task)
+        del index[task.name]
+        task.job = None
+        self.closed_us -= task.closed_us
+        if task.saved_name is not None:
+            self.removed_tasks.append(task.saved_name)
+        return True, f"Task '{task.name}' removed from job '{self.name}'"
 
     def get_task(self, taskname: str) -> Optional[Task]:
         """
@@ -53,10 +108,45 @@ class Job:
         :rtype: Task
 
         """
-        try:
-            return next(filter(lambda t: t.name == taskname, self.tasks))
-        except StopIteration:
-            return None
+        return self.__index().get(taskname)
+
+    def rename_task(self, task: Task, name: str) -> Tuple[bool, str]:
+        """Renames the task if the new name is not taken
+
+        :param task: The task to rename
+        :type task: Task
+        :param name: The new name
+        :type name: string
+        :return: True for success + message
+        :rtype: boolean, string
+
+        """
+        index = self.__index()
+        if name in index:
+            return (
+                False,
+                f"A task with name '{name}' already exists in job '{self.name}'",
+            )
+        old_name = task.name
+        del index[old_name]
+        task.name = name
+        index[name] = task
+        return True, f"Task '{old_name}' renamed '{name}'"
+
+    def is_dirty(self) -> bool:
+        """
+
+        :return: True if the job or one of its tasks must be saved
+        :rtype: boolean
+
+        """
+        if not self.is_loaded():
+            return self.saved_name != self.name
+        return (
+            self.saved_name != self.name
+            or len(self.removed_tasks) > 0
+            or any(t.dirty or t.saved_name != t.name for t in self.tasks)
+        )
 
     def get_running_tasks(self) -> List[Task]:
         """
@@ -87,15 +177,51 @@ class Job:
                 s += f"\t{task}\n"
         return s[:-1]  # Remove last \n
 
+    def get_total_duration(self, now: datetime = None) -> timedelta:
+        """
+
+        :param now: Default value = None, datetime.now()
+        :return: the total duration of the tasks, running ones included
+        :rtype: timedelta
+
+        """
+        now = now or datetime.now()
+        duration = timedelta(0, 0, self.closed_us)
+        for task in self.get_running_tasks():
+            duration += task.get_current_duration(now)
+        return duration
+
+    def get_range_duration(
+        self, since: datetime = None, until: datetime = None, now: datetime = None
+    ) -> timedelta:
+        """
+
+        :param since: Default value = None, no lower bound
+        :param until: Default value = None, no upper bound, excluded
+        :param now: Default value = None, datetime.now()
+        :return: the time spent on the tasks between since and until, see
+            Task.get_range_us
+        :rtype: timedelta
+
+        """
+        return sum(
+            (task.get_range_duration(since, until, now) for task in self.tasks),
+            timedelta(0),
+        )
+
+    @traced("render")
     def detailed_table(self, title: str = "Job", suffix: List[str] = []) -> str:
-        tasks = [(t, t.get_total_duration()) for t in self.tasks]
-        total = sum([d for (t, d) in tasks], timedelta(0))
+        from tabulate import tabulate
+
+        now = datetime.now()
+        tasks = [(t, t.get_total_duration(now)) for t in self.tasks]
+        total = self.get_total_duration(now)
         tasks_data = [
             [
                 t.name,
                 "yes" if t.is_running() else "no",
                 Task.duration_to_str(d),
-                "N/A" if total == 0 else f"{d / total:.2%}",
+                "N/A" if total == timedelta(0) else f"{d / total:.2%}",
             ]
             for (t, d) in tasks
         ]
@@ -0,0 +1,59 @@
+import heapq
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from wok.storage import SortedRow
+
+# person, job name, task name
+Key = Tuple[str, str, str]
+# person, the interval and the interval it overlaps
+Overlap = Tuple[str, SortedRow, SortedRow]
+
+
+def tag(person: str, rows: Iterator[SortedRow]) -> Iterator[tuple]:
+    """(start, end, person, job name, task name) tuples, still sorted by start"""
+    for start, end, job_name, task_name in rows:
+        yield start, end, person, job_name, task_name
+
+
+def merge_intervals(
+    sources: Dict[str, Iterator[SortedRow]],
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    max_overlaps: int = 20,
+) -> Tuple[Dict[Key, int], List[Overlap], int]:
+    """Aggregate the intervals of several people in a single pass over the k-way
+    merge of their intervals sorted by start (see Storage.iter_sorted_us).
+
+    The memory used only depends on the number of people, of their tasks and
+    on max_overlaps, not on the number of intervals. An interval overlaps when
+    it starts before the end of a previous interval of the same task, as the
+    tasks of a person may run at the same time.
+
+    :param sources: The sorted intervals of each person
+    :param since: Default value = None, clip the intervals starting before
+    :param until: Default value = None, clip the intervals ending after
+    :param max_overlaps: Default value = 20, the number of overlaps kept
+    :return: the time spent by person, job and task in microseconds, the first
+        overlaps and their count
+    :rtype: {(string, string, string): int}, [Overlap], int
+
+    """
+    totals: Dict[Key, int] = {}
+    # the interval ending last so far, by person and task
+    reach: Dict[Key, SortedRow] = {}
+    overlaps: List[Overlap] = []
+    count = 0
+    for start, end, person, job_name, task_name in heapq.merge(
+        *(tag(person, rows) for person, rows in sources.items())
+    ):
+        key = person, job_name, task_name
+        duration = min(end, until or end) - max(start, since or start)
+        totals[key] = totals.get(key, 0) + max(0, duration)
+        last = reach.get(key)
+        if last is not None and start < last[1]:
+            count += 1
+            if len(overlaps) < max_overlaps:
+                overlaps.append((person, (start, end, job_name, task_name), last))
+        if last is None or end > last[1]:
+            reach[key] = start, end, job_name, task_name
+    return totals, overlaps, count
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from typing import Iterator, Tuple
+
+EPOCH: datetime = datetime(1970, 1, 1)
+MICROSECOND: timedelta = timedelta(microseconds=1)
+PERIODS: Tuple[str, ...] = ("day", "week", "month", "year")
+# a day in microseconds, days start at multiples of it since EPOCH
+DAY_US: int = 24 * 3600 * 1000000
+
+
+def to_us(dt: datetime) -> int:
+    """Converts a date to microseconds since EPOCH"""
+    return (dt - EPOCH) // MICROSECOND
+
+
+def from_us(us: int) -> datetime:
+    """Converts microseconds since EPOCH to a date"""
+    return EPOCH + timedelta(0, 0, us)
+
+
+def duration_to_str(duration: timedelta) -> str:
+    sec = duration.total_seconds()
+    hours = sec // 3600
+    sec = sec - hours * 3600
+    minutes = sec // 60
+    sec = sec - minutes * 60
+    return f"{int(hours):02}:{int(minutes):02}:{int(sec):02}"
+
+
+def period_start(dt: datetime, by: str) -> datetime:
+    """
+
+    :param dt: A date
+    :param by: One of PERIODS, weeks start on mondays
+    :return: the start of the period holding dt
+    :rtype: datetime
+
+    """
+    day = datetime(dt.year, dt.month, dt.day)
+    if by == "day":
+        return day
+    if by == "week":
+        return day - timedelta(days=day.weekday())
+    if by == "month":
+        return day.replace(day=1)
+    if by == "year":
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Unknown period '{by}'")
+
+
+def next_period(start: datetime, by: str) -> datetime:
+    """
+
+    :param start: The start of a period
+    :param by: One of PERIODS
+    :return: the start of the following period
+    :rtype: datetime
+
+    """
+    if by == "day":
+        return start + timedelta(days=1)
+    if by == "week":
+        return start + timedelta(days=7)
+    if by == "month":
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    if by == "year":
+        return start.replace(year=start.year + 1)
+    raise ValueError(f"Unknown period '{by}'")
+
+
+def period_label(start: datetime, by: str) -> str:
+    """
+
+    :param start: The start of a period
+    :param by: One of PERIODS
+    :return: the period as 2020-01-31, 2020-W05, 2020-01 or 2020
+    :rtype: string
+
+    """
+    if by == "week":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02}"
+    return start.strftime({"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}[by])
+
+
+def split_us(start: int, end: int, by: str) -> Iterator[Tuple[int, int]]:
+    """Splits an interval at the period boundaries
+
+    :param start: The start of the interval in microseconds since EPOCH
+    :param end: The end of the interval in microseconds since EPOCH
+    :param by: One of PERIODS
+    :return: (period start, duration) in microseconds for each period
+    :rtype: iterator
+
+    """
+    period = period_start(from_us(start), by)
+    while start < end:
+        boundary = to_us(next_period(period, by))
+        yield to_us(period), min(end, boundary) - start
+        start = boundary
+        period = next_period(period, by)
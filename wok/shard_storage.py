@@ -0,0 +1,368 @@
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
+
+from wok.job import Job
+from wok.period import from_us, period_label, period_start, to_us
+from wok.storage import Commit, IntervalRow, SortedRow, Storage
+from wok.task import Task
+from wok.trace import traced
+
+if TYPE_CHECKING:
+    from wok.wok import Wok
+
+# month label: [intervals, total duration, last end], durations in microseconds
+Manifest = Dict[str, List[int]]
+
+
+class ShardStorage(Storage):
+    """A folder per job and a folder per task in dir/.shards, the intervals of a
+    task being split into a file per month of their start, named as 2020-01.
+
+    The manifest of a task lists its shards with their number of intervals,
+    total duration and last end, after its 'C:start' and 'S:archive' records
+    if any (see Task.replay). Starting or ending a task only rewrites the shard
+    of the month and the manifest, and iter_intervals and load_range only open
+    the shards overlapping the requested range. A save is applied all or
+    nothing (see Commit).
+    """
+
+    folder_name: str = ".shards"
+    manifest_name: str = "manifest"
+
+    def __init__(self, dir: Path):
+        self.dir: Path = dir
+        self.root: Path = dir / ShardStorage.folder_name
+
+    @staticmethod
+    def __entries(dir: Path) -> List[Path]:
+        # not the leftover temporary files
+        return [entry for entry in dir.iterdir() if not entry.name.startswith(".")]
+
+    @traced("load")
+    def load(self, wok: "Wok") -> Tuple[bool, str]:
+        return self.__load(wok, self.__load_tasks)
+
+    def load_range(
+        self, wok: "Wok", since: Optional[int], until: Optional[int]
+    ) -> bool:
+        """Only read the shards overlapping [since, until) with the manifests"""
+        ok, _ = self.__load(wok, lambda job: self.__load_tasks(job, since, until))
+        wok.source = None
+        return ok
+
+    def __load(
+        self, wok: "Wok", loader: Callable[[Job], List[Task]]
+    ) -> Tuple[bool, str]:
+        if self.root.exists() and not self.root.is_dir():
+            return False, f"{self.root} exists and is not a dir"
+        Commit.replay(self.dir)
+        self.root.mkdir(parents=True, exist_ok=True)
+        current_job_name = None
+        for entry in ShardStorage.__entries(self.root):
+            if entry.is_dir():
+                job = Job(entry.name, loader=loader)
+                job.saved_name = job.name
+                wok.add_job(job)
+            elif entry.name == "current_job":
+                current_job_name = entry.read_text().strip()
+        wok.saved_current_job = current_job_name
+        wok.set_current_job(current_job_name)
+        wok.source = self
+        return True, "Loaded successfully"
+
+    @staticmethod
+    def __read_manifest(task_dir: Path) -> Tuple[List[str], Manifest]:
+        """
+
+        :param task_dir: The folder of a task
+        :return: the records of the manifest and its shards
+        :rtype: [string], Manifest
+
+        """
+        records, shards = [], {}
+        for line in (task_dir / ShardStorage.manifest_name).read_text().split("\n"):
+            if line[1:2] == ":":
+                records.append(line)
+            elif line != "":
+                month, *counts = line.split(" ")
+                shards[month] = [int(count) for count in counts]
+        return records, shards
+
+    @staticmethod
+    def __write_manifest(
+        commit: Commit, task_dir: Path, records: List[str], shards: Manifest
+    ) -> None:
+        commit.write(
+            task_dir / ShardStorage.manifest_name,
+            "\n".join(
+                records
+                + [
+                    " ".join([month] + [str(count) for count in shards[month]])
+                    for month in sorted(shards)
+                ]
+            ),
+        )
+
+    @staticmethod
+    def month(us: int) -> str:
+        """
+
+        :param us: A date in microseconds since EPOCH
+        :return: the name of the shard holding the intervals starting then
+        :rtype: string
+
+        """
+        return period_label(period_start(from_us(us), "month"), "month")
+
+    @staticmethod
+    def __overlaps(
+        month: str, counts: List[int], since: Optional[int], until: Optional[int]
+    ) -> bool:
+        # the shard starts with its month and ends with its last end
+        return (since is None or counts[2] >= since) and (
+            until is None or to_us(datetime.strptime(month, "%Y-%m")) < until
+        )
+
+    @traced("load_tasks")
+    def __load_tasks(
+        self, job: Job, since: Optional[int] = None, until: Optional[int] = None
+    ) -> List[Task]:
+        tasks = []
+        for task_dir in ShardStorage.__entries(self.root / job.saved_name):
+            records, shards = ShardStorage.__read_manifest(task_dir)
+            for month in sorted(shards):
+                if ShardStorage.__overlaps(month, shards[month], since, until):
+                    records += (task_dir / month).read_text().split("\n")
+            task = Task(task_dir.name)
+            task.load([record for record in records if record != ""])
+            task.saved_name = task.name
+            tasks.append(task)
+        return tasks
+
+    @staticmethod
+    def __rename_all(commit: Commit, dir: Path, renames: List[Tuple[str, str]]) -> None:
+        # Go through temporary names so that swapped names do not collide
+        for i, (old, _) in enumerate(renames):
+            commit.rename(dir / old, dir / f".rename{i}.tmp")
+        for i, (_, new) in enumerate(renames):
+            commit.rename(dir / f".rename{i}.tmp", dir / new)
+
+    @staticmethod
+    def __records(task: Task) -> List[str]:
+        records = []
+        if task.current_datetime is not None:
+            records.append("C:" + Task.encode_datetime(task.current_datetime, True))
+        if task.archive is not None:
+            records.append("S:" + task.archive)
+        return records
+
+    @staticmethod
+    def __add(lines: Dict[str, List[str]], shards: Manifest, start: int, end: int):
+        month = ShardStorage.month(start)
+        lines.setdefault(month, []).append(f"{start}->{end}")
+        counts = shards.setdefault(month, [0, 0, end])
+        counts[0] += 1
+        counts[1] += end - start
+        counts[2] = max(counts[2], end)
+
+    @staticmethod
+    def __write_task(commit: Commit, task_dir: Path, task: Task) -> None:
+        """Write all the shards of a task and its manifest"""
+        commit.remove(task_dir)
+        commit.mkdir(task_dir)
+        lines: Dict[str, List[str]] = {}
+        shards: Manifest = {}
+        for start, end in zip(task.starts, task.ends):
+            ShardStorage.__add(lines, shards, start, end)
+        for month in lines:
+            commit.write(task_dir / month, "\n".join(lines[month]) + "\n")
+        ShardStorage.__write_manifest(
+            commit, task_dir, ShardStorage.__records(task), shards
+        )
+
+    @staticmethod
+    def __append_task(
+        commit: Commit, saved_dir: Path, task_dir: Path, task: Task
+    ) -> None:
+        """Add the intervals of the pending records (see Task.replay) to the
+        shards of their month and rewrite the manifest
+
+        :param saved_dir: The folder of the task on disk, task_dir once the
+            renames of the commit are applied
+
+        """
+        records, shards = ShardStorage.__read_manifest(saved_dir)
+        current = next(
+            (Task.decode_us(record[2:]) for record in records if record[:2] == "C:"),
+            None,
+        )
+        appended: Dict[str, List[str]] = {}
+        for record in task.pending:
+            if "->" in record:
+                start, end = (Task.decode_us(us) for us in record.split("->"))
+            elif record.startswith("C:"):
+                current = Task.decode_us(record[2:])
+                continue
+            elif record.startswith("E:") and current is not None:
+                start, end, current = current, Task.decode_us(record[2:]), None
+            else:
+                continue
+            ShardStorage.__add(appended, shards, start, end)
+        for month, lines in appended.items():
+            shard = saved_dir / month
+            content = shard.read_text() if shard.exists() else ""
+            commit.write(task_dir / month, content + "\n".join(lines) + "\n")
+        ShardStorage.__write_manifest(
+            commit, task_dir, ShardStorage.__records(task), shards
+        )
+
+    @traced("save")
+    def save(self, wok: "Wok") -> Tuple[bool, str]:
+        root = self.root
+        self.dir.mkdir(parents=True, exist_ok=True)
+        commit = Commit(self.dir)
+        if wok.source is not self:
+            wok.mark_unsaved()
+            # removed by the commit rather than before it
+            commit.remove(root)
+            commit.mkdir(root)
+        elif not root.is_dir():
+            commit.mkdir(root)
+        for name in wok.removed_jobs:
+            commit.remove(root / name)
+        wok.removed_jobs.clear()
+        dirty_jobs = [job for job in wok.jobs if job.is_dirty()]
+        ShardStorage.__rename_all(
+            commit,
+            root,
+            [
+                (job.saved_name, job.name)
+                for job in dirty_jobs
+                if job.saved_name is not None and job.saved_name != job.name
+            ],
+        )
+        for job in dirty_jobs:
+            job_dir = root / job.name
+            # where the job is until the commit is applied
+            saved_job_dir = None if job.saved_name is None else root / job.saved_name
+            if saved_job_dir is None:
+                commit.mkdir(job_dir)
+            job.saved_name = job.name
+            if not job.is_loaded():
+                # only renamed
+                continue
+            for name in job.removed_tasks:
+                commit.remove(job_dir / name)
+            job.removed_tasks.clear()
+            ShardStorage.__rename_all(
+                commit,
+                job_dir,
+                [
+                    (task.saved_name, task.name)
+                    for task in job.tasks
+                    if task.saved_name is not None and task.saved_name != task.name
+                ],
+            )
+            for task in job.tasks:
+                if task.saved_name is None or task.rewrite:
+                    # new or changed without records (see Task.extend_us)
+                    ShardStorage.__write_task(commit, job_dir / task.name, task)
+                elif task.dirty and saved_job_dir is not None:
+                    ShardStorage.__append_task(
+                        commit,
+                        saved_job_dir / task.saved_name,
+                        job_dir / task.name,
+                        task,
+                    )
+                task.saved_name = task.name
+                task.dirty = False
+                task.rewrite = False
+                task.pending.clear()
+        current_job_name = wok.get_current_job_name()
+        if current_job_name != wok.saved_current_job:
+            if current_job_name is None:
+                commit.remove(root / "current_job")
+            else:
+                commit.write(root / "current_job", current_job_name)
+            wok.saved_current_job = current_job_name
+        commit.apply()
+        wok.source = self
+        return True, "Saved successfully"
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def iter_intervals(
+        self, since: datetime = None, until: datetime = None
+    ) -> Iterator[IntervalRow]:
+        first = None if since is None else to_us(since)
+        last = None if until is None else to_us(until)
+        for job_dir in ShardStorage.__entries(self.root):
+            if not job_dir.is_dir():
+                continue
+            for task_dir in ShardStorage.__entries(job_dir):
+                _, shards = ShardStorage.__read_manifest(task_dir)
+                for month in sorted(shards):
+                    if not ShardStorage.__overlaps(
+                        month, shards[month], first, None if last is None else last + 1
+                    ):
+                        continue
+                    for line in (task_dir / month).read_text().split("\n"):
+                        if line == "":
+                            continue
+                        start, end = (int(us) for us in line.split("->"))
+                        if (first is None or end >= first) and (
+                            last is None or start <= last
+                        ):
+                            yield (
+                                job_dir.name,
+                                task_dir.name,
+                                from_us(start),
+                                from_us(end),
+                            )
+
+    def iter_sorted_us(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[SortedRow]:
+        """Merge the tasks reading their shards one at a time, in month order"""
+        import heapq
+
+        def iter_task(task_dir: Path) -> Iterator[SortedRow]:
+            _, shards = ShardStorage.__read_manifest(task_dir)
+            for month in sorted(shards):
+                if not ShardStorage.__overlaps(month, shards[month], since, until):
+                    continue
+                intervals = sorted(
+                    tuple(int(us) for us in line.split("->"))
+                    for line in (task_dir / month).read_text().split("\n")
+                    if line != ""
+                )
+                for start, end in intervals:
+                    if (since is None or end >= since) and (
+                        until is None or start < until
+                    ):
+                        yield start, end, task_dir.parent.name, task_dir.name
+
+        return heapq.merge(
+            *(
+                iter_task(task_dir)
+                for job_dir in ShardStorage.__entries(self.root)
+                if job_dir.is_dir()
+                for task_dir in ShardStorage.__entries(job_dir)
+            )
+        )
+
+    def shard_totals(self, job_name: str, task_name: str) -> Dict[str, int]:
+        """The total of each shard of a task, read from its manifest alone
+
+        :param job_name: The name of the job
+        :param task_name: The name of the task
+        :return: the duration of the intervals starting each month in
+            microseconds, by month as 2020-01
+        :rtype: {string: int}
+
+        """
+        _, shards = ShardStorage.__read_manifest(self.root / job_name / task_name)
+        return {month: counts[1] for month, counts in shards.items()}
@@ -0,0 +1,360 @@
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Tuple
+
+from wok.job import Job
+from wok.period import from_us
+from wok.storage import IntervalRow, SortedRow, Storage
+from wok.task import Task
+from wok.trace import traced
+
+if TYPE_CHECKING:
+    from wok.wok import Wok
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS task (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES job(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    current TEXT,
+    archive TEXT,
+    UNIQUE (job_id, name)
+);
+CREATE TABLE IF NOT EXISTS interval (
+    task_id INTEGER NOT NULL REFERENCES task(id) ON DELETE CASCADE,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interval_task_start ON interval (task_id, start);
+CREATE INDEX IF NOT EXISTS interval_start ON interval (start);
+"""
+
+
+class SqliteStorage(Storage):
+    """A SQLite database in the dir folder.
+
+    Dates are stored as Task.isoformat strings, which sort chronologically.
+    Intervals are indexed by task and start so that saving a start or an end
+    is a single insert or update and time ranges are read with indexed queries.
+    """
+
+    file_name: str = "wok.db"
+
+    def __init__(self, dir: Path):
+        self.dir: Path = dir
+        self.__con: Optional[sqlite3.Connection] = None
+        # the database opened, replaced by a save from another source
+        self.__inode: Optional[int] = None
+
+    @staticmethod
+    def __open(path: Path) -> sqlite3.Connection:
+        con = sqlite3.connect(path)
+        con.execute("PRAGMA foreign_keys = ON")
+        con.executescript(SCHEMA)
+        columns = [row[1] for row in con.execute("PRAGMA table_info(task)")]
+        if "archive" not in columns:
+            # created before the archive column
+            con.execute("ALTER TABLE task ADD COLUMN archive TEXT")
+        return con
+
+    def __connect(self) -> sqlite3.Connection:
+        if self.__con is None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            path = self.dir / SqliteStorage.file_name
+            self.__con = SqliteStorage.__open(path)
+            self.__inode = path.stat().st_ino
+        return self.__con
+
+    def close(self) -> None:
+        if self.__con is not None:
+            self.__con.close()
+            self.__con = None
+
+    @traced("load")
+    def load(self, wok: "Wok") -> Tuple[bool, str]:
+        return self.__load(wok, self.__load_tasks)
+
+    def load_range(
+        self, wok: "Wok", since: Optional[int], until: Optional[int]
+    ) -> bool:
+        """Only read the intervals overlapping [since, until), with an indexed
+        query as iter_sorted_us"""
+        ok, _ = self.__load(wok, lambda job: self.__load_tasks(job, since, until))
+        wok.source = None
+        return ok
+
+    def __load(
+        self, wok: "Wok", loader: Callable[[Job], List[Task]]
+    ) -> Tuple[bool, str]:
+        path = self.dir / SqliteStorage.file_name
+        if self.__con is not None and (
+            not path.exists() or path.stat().st_ino != self.__inode
+        ):
+            # replaced by another process, reopen it
+            self.close()
+        con = self.__connect()
+        for (name,) in con.execute("SELECT name FROM job ORDER BY id"):
+            job = Job(name, loader=loader)
+            job.saved_name = name
+            wok.add_job(job)
+        row = con.execute("SELECT value FROM meta WHERE key = 'current_job'").fetchone()
+        wok.saved_current_job = None if row is None else row[0]
+        wok.set_current_job(wok.saved_current_job)
+        wok.source = self
+        return True, "Loaded successfully"
+
+    @traced("load_tasks")
+    def __load_tasks(
+        self, job: Job, since: Optional[int] = None, until: Optional[int] = None
+    ) -> List[Task]:
+        con = self.__connect()
+        query = "SELECT start, end FROM interval WHERE task_id = ?"
+        bounds = []
+        if since is not None:
+            query += " AND end >= ?"
+            bounds.append(Task.encode_datetime(from_us(since)))
+        if until is not None:
+            query += " AND start < ?"
+            bounds.append(Task.encode_datetime(from_us(until)))
+        tasks = []
+        for task_id, name, current, archive in con.execute(
+            "SELECT task.id, task.name, task.current, task.archive FROM task "
+            "JOIN job ON task.job_id = job.id WHERE job.name = ? ORDER BY task.id",
+            (job.saved_name,),
+        ):
+            task = Task(name)
+            for start, end in con.execute(
+                query + " ORDER BY start", (task_id, *bounds)
+            ):
+                task.append_us(Task.decode_us(start), Task.decode_us(end))
+            if current is not None:
+                task.current_datetime = Task.decode_datetime(current)
+            if archive is not None:
+                task.replay("S:" + archive)
+            task.saved_name = name
+            task.dirty = False
+            task.rewrite = False
+            tasks.append(task)
+        return tasks
+
+    @staticmethod
+    def __job_id(con: sqlite3.Connection, name: str) -> int:
+        return con.execute("SELECT id FROM job WHERE name = ?", (name,)).fetchone()[0]
+
+    @staticmethod
+    def __task_id(con: sqlite3.Connection, job_id: int, name: str) -> int:
+        return con.execute(
+            "SELECT id FROM task WHERE job_id = ? AND name = ?", (job_id, name)
+        ).fetchone()[0]
+
+    @staticmethod
+    def __rename_all(
+        con: sqlite3.Connection, query: str, renames: List[Tuple[str, str]], *args
+    ) -> None:
+        # Go through temporary names so that swapped names do not collide
+        for i, (old, _) in enumerate(renames):
+            con.execute(query, (f".rename{i}", old) + args)
+        for i, (_, new) in enumerate(renames):
+            con.execute(query, (new, f".rename{i}") + args)
+
+    @staticmethod
+    def __insert_intervals(con: sqlite3.Connection, task_id: int, task: Task) -> None:
+        con.executemany(
+            "INSERT INTO interval (task_id, start, end) VALUES (?, ?, ?)",
+            (
+                (task_id, Task.encode_datetime(start), Task.encode_datetime(end))
+                for start, end in task.datetimes
+            ),
+        )
+
+    @staticmethod
+    def __apply_record(con: sqlite3.Connection, task_id: int, record: str) -> None:
+        """Apply a record (see Task.replay) with a single statement or two"""
+        if "->" in record:
+            con.execute(
+                "INSERT INTO interval (task_id, start, end) VALUES (?, ?, ?)",
+                (task_id, *record.split("->")),
+            )
+        elif record.startswith("C:"):
+            con.execute(
+                "UPDATE task SET current = ? WHERE id = ?", (record[2:], task_id)
+            )
+        elif record.startswith("E:"):
+            con.execute(
+                "INSERT INTO interval (task_id, start, end) "
+                "SELECT id, current, ? FROM task WHERE id = ? AND current NOT NULL",
+                (record[2:], task_id),
+            )
+            con.execute("UPDATE task SET current = NULL WHERE id = ?", (task_id,))
+
+    @traced("save")
+    def save(self, wok: "Wok") -> Tuple[bool, str]:
+        if wok.source is self:
+            SqliteStorage.__write(self.__connect(), wok)
+            return True, "Saved successfully"
+        wok.mark_unsaved()
+        # a new database built aside, the stored one is kept until it is complete
+        self.close()
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self.dir / SqliteStorage.file_name
+        tmp = self.dir / f".{SqliteStorage.file_name}.{os.getpid()}.tmp"
+        SqliteStorage.__unlink(tmp)
+        try:
+            con = SqliteStorage.__open(tmp)
+            try:
+                SqliteStorage.__write(con, wok)
+            finally:
+                con.close()
+            os.replace(tmp, path)
+        except BaseException:
+            SqliteStorage.__unlink(tmp)
+            raise
+        wok.source = self
+        return True, "Saved successfully"
+
+    @staticmethod
+    def __write(con: sqlite3.Connection, wok: "Wok") -> None:
+        """Write the changes made to wok in a single transaction"""
+        with con:
+            for name in wok.removed_jobs:
+                con.execute("DELETE FROM job WHERE name = ?", (name,))
+            wok.removed_jobs.clear()
+            dirty_jobs = [job for job in wok.jobs if job.is_dirty()]
+            SqliteStorage.__rename_all(
+                con,
+                "UPDATE job SET name = ? WHERE name = ?",
+                [
+                    (job.saved_name, job.name)
+                    for job in dirty_jobs
+                    if job.saved_name is not None and job.saved_name != job.name
+                ],
+            )
+            for job in dirty_jobs:
+                if job.saved_name is None:
+                    job_id = con.execute(
+                        "INSERT INTO job (name) VALUES (?)", (job.name,)
+                    ).lastrowid
+                else:
+                    job_id = SqliteStorage.__job_id(con, job.name)
+                job.saved_name = job.name
+                if not job.is_loaded():
+                    # only renamed
+                    continue
+                for name in job.removed_tasks:
+                    con.execute(
+                        "DELETE FROM task WHERE job_id = ? AND name = ?", (job_id, name)
+                    )
+                job.removed_tasks.clear()
+                SqliteStorage.__rename_all(
+                    con,
+                    "UPDATE task SET name = ? WHERE name = ? AND job_id = ?",
+                    [
+                        (task.saved_name, task.name)
+                        for task in job.tasks
+                        if task.saved_name is not None and task.saved_name != task.name
+                    ],
+                    job_id,
+                )
+                for task in job.tasks:
+                    current = (
+                        None
+                        if task.current_datetime is None
+                        else Task.encode_datetime(task.current_datetime)
+                    )
+                    if task.saved_name is None:
+                        task_id = con.execute(
+                            "INSERT INTO task (job_id, name, current, archive) "
+                            + "VALUES (?, ?, ?, ?)",
+                            (job_id, task.name, current, task.archive),
+                        ).lastrowid
+                        SqliteStorage.__insert_intervals(con, task_id, task)
+                    elif task.dirty:
+                        task_id = SqliteStorage.__task_id(con, job_id, task.name)
+                        if task.rewrite:
+                            # changed without records, rewrite it
+                            con.execute(
+                                "DELETE FROM interval WHERE task_id = ?", (task_id,)
+                            )
+                            SqliteStorage.__insert_intervals(con, task_id, task)
+                            con.execute(
+                                "UPDATE task SET current = ?, archive = ? WHERE id = ?",
+                                (current, task.archive, task_id),
+                            )
+                        else:
+                            for record in task.pending:
+                                SqliteStorage.__apply_record(con, task_id, record)
+                    task.saved_name = task.name
+                    task.dirty = False
+                    task.rewrite = False
+                    task.pending.clear()
+            current_job_name = wok.get_current_job_name()
+            if current_job_name != wok.saved_current_job:
+                con.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) "
+                    + "VALUES ('current_job', ?)",
+                    (current_job_name,),
+                )
+                wok.saved_current_job = current_job_name
+
+    @staticmethod
+    def __unlink(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        self.close()
+        SqliteStorage.__unlink(self.dir / SqliteStorage.file_name)
+
+    def iter_intervals(
+        self, since: datetime = None, until: datetime = None
+    ) -> Iterator[IntervalRow]:
+        query = (
+            "SELECT job.name, task.name, interval.start, interval.end FROM interval "
+            "JOIN task ON interval.task_id = task.id "
+            "JOIN job ON task.job_id = job.id WHERE 1"
+        )
+        args = []
+        if since is not None:
+            query += " AND interval.end >= ?"
+            args.append(Task.encode_datetime(since))
+        if until is not None:
+            query += " AND interval.start <= ?"
+            args.append(Task.encode_datetime(until))
+        for job_name, task_name, start, end in self.__connect().execute(
+            query + " ORDER BY interval.start", args
+        ):
+            yield (
+                job_name,
+                task_name,
+                Task.decode_datetime(start),
+                Task.decode_datetime(end),
+            )
+
+    def iter_sorted_us(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[SortedRow]:
+        query = (
+            "SELECT interval.start, interval.end, job.name, task.name FROM interval "
+            "JOIN task ON interval.task_id = task.id "
+            "JOIN job ON task.job_id = job.id WHERE 1"
+        )
+        args = []
+        if since is not None:
+            query += " AND interval.end >= ?"
+            args.append(Task.encode_datetime(from_us(since)))
+        if until is not None:
+            query += " AND interval.start < ?"
+            args.append(Task.encode_datetime(from_us(until)))
+        for start, end, job_name, task_name in self.__connect().execute(
+            query + " ORDER BY interval.start", args
+        ):
+            yield Task.decode_us(start), Task.decode_us(end), job_name, task_name
@@ -0,0 +1,214 @@
+from array import array
+from bisect import bisect_right
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from wok.period import DAY_US
+
+if TYPE_CHECKING:
+    from wok.job import Job
+
+HOUR_US: int = DAY_US // 24
+WEEK_HOURS: int = 7 * 24
+# EPOCH is a thursday and weeks start on mondays
+EPOCH_HOUR: int = 3 * 24
+# lower bounds of the session length bins, in minutes
+SESSION_BINS: Tuple[int, ...] = (0, 5, 15, 30, 60, 120, 240)
+PERCENTILES: Tuple[int, ...] = (50, 90, 99)
+
+# sessions by length bin (see SESSION_BINS), time by hour of week from monday 0:00
+# and by job index its number of sessions then the PERCENTILES of their lengths,
+# durations in microseconds
+Stats = Tuple[List[int], List[int], Dict[int, List[int]]]
+
+
+def flatten(jobs: Iterable["Job"]) -> Tuple[array, array, array, List[str]]:
+    """The closed intervals of all tasks as flat arrays, archived intervals
+    being only kept as daily totals are left out
+
+    :param jobs: The jobs
+    :return: the starts and the ends in microseconds since EPOCH, the index of
+        the job of each interval and the job names
+    :rtype: array, array, array, [string]
+
+    """
+    starts, ends, job_ids, names = array("q"), array("q"), array("q"), []
+    for job in jobs:
+        for task in job.tasks:
+            starts.extend(task.starts)
+            ends.extend(task.ends)
+            job_ids.extend(array("q", [len(names)]) * len(task.starts))
+        names.append(job.name)
+    return starts, ends, job_ids, names
+
+
+def load_numpy():
+    """NumPy if it is installed, else None"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def compute(
+    starts: Sequence[int],
+    ends: Sequence[int],
+    job_ids: Sequence[int],
+    vectorized: Optional[bool] = None,
+) -> Stats:
+    """Session statistics of flat intervals (see flatten), the intervals ending
+    before they start being left out
+
+    :param starts: The starts in microseconds since EPOCH
+    :param ends: The ends in microseconds since EPOCH
+    :param job_ids: The job index of each interval
+    :param vectorized: Default value = None, with NumPy if it is installed,
+        True to require it, False for the pure Python loop
+    :return: the statistics, the same for both ways
+    :rtype: Stats
+
+    """
+    if vectorized is False:
+        return compute_loop(starts, ends, job_ids)
+    numpy = load_numpy()
+    if numpy is None:
+        if vectorized:
+            raise ImportError("NumPy is not installed")
+        return compute_loop(starts, ends, job_ids)
+    return compute_numpy(numpy, starts, ends, job_ids)
+
+
+def percentile(values: List[int], p: int) -> int:
+    """The p-th percentile of sorted values, interpolated linearly between the
+    closest ranks as numpy.percentile does"""
+    k = (len(values) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return round(values[f] + (values[c] - values[f]) * (k - f))
+
+
+def compute_loop(
+    starts: Sequence[int], ends: Sequence[int], job_ids: Sequence[int]
+) -> Stats:
+    bounds = [minutes * 60000000 for minutes in SESSION_BINS]
+    sessions = [0] * len(bounds)
+    heatmap = [0] * WEEK_HOURS
+    lengths: Dict[int, List[int]] = {}
+    for start, end, job_id in zip(starts, ends, job_ids):
+        if end < start:
+            continue
+        sessions[bisect_right(bounds, end - start) - 1] += 1
+        lengths.setdefault(job_id, []).append(end - start)
+        # split at the hours
+        hour = start // HOUR_US
+        while start < end:
+            stop = min(end, (hour + 1) * HOUR_US)
+            heatmap[(hour + EPOCH_HOUR) % WEEK_HOURS] += stop - start
+            start, hour = stop, hour + 1
+    percentiles = {}
+    for job_id in sorted(lengths):
+        values = sorted(lengths[job_id])
+        percentiles[job_id] = [len(values)] + [
+            percentile(values, p) for p in PERCENTILES
+        ]
+    return sessions, heatmap, percentiles
+
+
+def compute_numpy(
+    np, starts: Sequence[int], ends: Sequence[int], job_ids: Sequence[int]
+) -> Stats:
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    job_ids = np.asarray(job_ids, dtype=np.int64)
+    valid = ends >= starts
+    starts, ends, job_ids = starts[valid], ends[valid], job_ids[valid]
+    lengths = ends - starts
+    bounds = np.array(SESSION_BINS, dtype=np.int64) * 60000000
+    sessions = np.bincount(
+        np.searchsorted(bounds, lengths, side="right") - 1, minlength=len(bounds)
+    )
+    # split at the hours: a piece per hour overlapped by an interval
+    first = starts // HOUR_US
+    counts = np.maximum((ends - 1) // HOUR_US - first + 1, 0)
+    owners = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    hours = first[owners] + offsets
+    pieces = np.minimum((hours + 1) * HOUR_US, ends[owners]) - np.maximum(
+        hours * HOUR_US, starts[owners]
+    )
+    # the time of an hour of week is exact as a float up to 2**53 us, 285 years
+    heatmap = np.rint(
+        np.bincount(
+            (hours + EPOCH_HOUR) % WEEK_HOURS, weights=pieces, minlength=WEEK_HOURS
+        )
+    ).astype(np.int64)
+    # lengths grouped by job (already the case after flatten) then sorted in
+    # each group, the percentiles of all jobs at once
+    order = np.argsort(job_ids, kind="stable")
+    lengths, job_ids = lengths[order], job_ids[order]
+    ids, firsts, sizes = np.unique(job_ids, return_index=True, return_counts=True)
+    for first, size in zip(firsts.tolist(), sizes.tolist()):
+        lengths[slice(first, first + size)].sort()
+    k = (sizes[:, None] - 1) * np.array(PERCENTILES) / 100
+    f = k.astype(np.int64)
+    c = np.minimum(f + 1, sizes[:, None] - 1)
+    low = lengths[firsts[:, None] + f]
+    high = lengths[firsts[:, None] + c]
+    values = np.rint(low + (high - low) * (k - f)).astype(np.int64)
+    percentiles = {
+        job_id: [size] + row
+        for job_id, size, row in zip(ids.tolist(), sizes.tolist(), values.tolist())
+    }
+    return sessions.tolist(), heatmap.tolist(), percentiles
+
+
+def stats_str(stats: Stats, names: List[str]) -> str:
+    """The session length histogram, the hour of week heatmap and the session
+    length percentiles by job
+
+    :param stats: The statistics (see compute)
+    :param names: The job names by job index
+    :return: the tables
+    :rtype: string
+
+    """
+    from datetime import timedelta
+
+    from tabulate import tabulate
+
+    from wok.period import duration_to_str
+
+    sessions, heatmap, percentiles = stats
+    total = sum(sessions)
+    bins = [
+        f"{low}-{high} min" for low, high in zip(SESSION_BINS, SESSION_BINS[1:])
+    ] + [f"{SESSION_BINS[-1]}+ min"]
+    histogram = tabulate(
+        [
+            [label, count, "#" * round(40 * count / total) if total > 0 else ""]
+            for label, count in zip(bins, sessions)
+        ],
+        ["session", "count", ""],
+        tablefmt="fancy_grid",
+    )
+    # a character per hour, darker when more time was spent
+    shades = " .:-=+*#%@"
+    most = max(max(heatmap), 1)
+    rows = ["hour 0     6     12    18"]
+    for day, name in enumerate(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]):
+        first = day * 24
+        hours = heatmap[slice(first, first + 24)]
+        cells = "".join(
+            shades[((len(shades) - 1) * us + most - 1) // most] for us in hours
+        )
+        rows.append(f"{name}  {cells} {duration_to_str(timedelta(0, 0, sum(hours)))}")
+    table = tabulate(
+        [
+            [names[job_id], values[0]]
+            + [duration_to_str(timedelta(0, 0, us)) for us in values[1:]]
+            for job_id, values in percentiles.items()
+        ],
+        ["job", "sessions"] + [f"p{p}" for p in PERCENTILES],
+        tablefmt="fancy_grid",
+    )
+    return "\n\n".join([histogram, "\n".join(rows), table])
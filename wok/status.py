@@ -0,0 +1,94 @@
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+from wok.period import duration_to_str, from_us
+
+# (current job name, [(running task name, start in microseconds since EPOCH)])
+Status = Tuple[Optional[str], List[Tuple[str, int]]]
+
+# Only depends on light standard modules so that the status can be displayed
+# without importing the rest of wok, pathlib included.
+STATUS_NAME: str = ".status"
+
+
+def encode_status(status: Status) -> str:
+    """The status file content: the current job name, empty if there is none,
+    then a 'task<TAB>start' line per running task of the current job.
+
+    :param status: The status to encode
+    :return: the file content
+    :rtype: string
+
+    """
+    job_name, running = status
+    return "\n".join([job_name or ""] + [f"{name}\t{us}" for name, us in running])
+
+
+def read_status(dir: Union[str, os.PathLike]) -> Optional[Status]:
+    """
+
+    :param dir: The wok folder
+    :return: the status stored in dir, None if there is none or it is invalid
+    :rtype: Status
+
+    """
+    try:
+        with open(os.path.join(dir, STATUS_NAME)) as f:
+            lines = f.read().split("\n")
+        running = []
+        for line in lines[1:]:
+            name, us = line.split("\t")
+            running.append((name, int(us)))
+    except (OSError, ValueError):
+        return None
+    return lines[0] or None, running
+
+
+def status_str(status: Status, now: datetime) -> str:
+    job_name, running = status
+    if job_name is None:
+        j, t = "No current job", ["No running task"]
+    else:
+        j = f"Job '{job_name}'"
+        t = [
+            f"Task '{name}' ({duration_to_str(now - from_us(us))})"
+            for name, us in running
+        ] or ["No running task"]
+    out = "Current job:\n"
+    out += "\t" + j + "\n"
+    out += "Running task(s):\n"
+    out += "\n".join(["\t" + tt for tt in t])
+    return out
+
+
+def prompt_str(status: Status) -> str:
+    """A short status for shell prompts: 'job', 'job:task1,task2' when tasks are
+    running, empty without a current job.
+
+    :param status: The status to display
+    :rtype: string
+
+    """
+    job_name, running = status
+    if job_name is None:
+        return ""
+    if len(running) == 0:
+        return job_name
+    return job_name + ":" + ",".join(name for name, _ in running)
+
+
+def fast_status(dir: Union[str, os.PathLike], prompt: bool = False) -> bool:
+    """Print the status from the status file alone
+
+    :param dir: The wok folder
+    :param prompt: Default value = False, print the prompt_str instead
+    :return: False if there is no valid status file, nothing was printed
+    :rtype: boolean
+
+    """
+    status = read_status(dir)
+    if status is None:
+        return False
+    print(prompt_str(status) if prompt else status_str(status, datetime.now()))
+    return True
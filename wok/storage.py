@@ -0,0 +1,722 @@
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set, Tuple
+
+from wok.job import Job
+from wok.task import Task
+from wok.trace import traced
+
+if TYPE_CHECKING:
+    from wok.wok import Wok
+
+IntervalRow = Tuple[str, str, datetime, datetime]
+# start, end in microseconds since EPOCH, job name, task name
+SortedRow = Tuple[int, int, str, str]
+
+LOCK_NAME = ".lock"
+
+
+class Storage:
+    """Where a Wok is loaded from and saved to, inside the dir folder.
+
+    A storage only writes what changed since the Wok was loaded from it or last
+    saved to it. Saving a Wok coming from elsewhere replaces the stored one.
+    """
+
+    dir: Path
+
+    def load(self, wok: "Wok") -> Tuple[bool, str]:
+        """Load the jobs in wok, their tasks may be loaded on first access
+
+        :param wok: The Wok to fill
+        :return: True if success + message
+        :rtype: boolean, string
+
+        """
+        raise NotImplementedError
+
+    def save(self, wok: "Wok") -> Tuple[bool, str]:
+        """Save the changes made to wok
+
+        :param wok: The Wok to save
+        :return: True if success + message
+        :rtype: boolean, string
+
+        """
+        raise NotImplementedError
+
+    def load_range(
+        self, wok: "Wok", since: Optional[int], until: Optional[int]
+    ) -> bool:
+        """Load the jobs in wok with only what their tasks need to answer for
+        [since, until), the records of a task (see Task.replay) and its
+        intervals overlapping the range. Such a wok must not be saved.
+
+        :param wok: The Wok to fill
+        :param since: First date in microseconds since EPOCH, None for no bound
+        :param until: End date in microseconds since EPOCH, None for no bound
+        :return: False if the storage can only load everything, wok being
+            left empty
+        :rtype: boolean
+
+        """
+        return False
+
+    def prefetch(self, wok: "Wok") -> None:
+        """Read ahead the tasks of the jobs of wok not loaded yet, before they
+        are all accessed (see Wok.load_all)
+
+        :param wok: The Wok loaded from this storage
+
+        """
+
+    def clear(self) -> None:
+        """Remove everything stored"""
+        raise NotImplementedError
+
+    def iter_intervals(
+        self, since: datetime = None, until: datetime = None
+    ) -> Iterator[IntervalRow]:
+        """Iterate over the closed intervals overlapping [since, until]
+
+        :param since: Default value = None, no lower bound
+        :param until: Default value = None, no upper bound
+        :return: (job name, task name, start, end) tuples
+        :rtype: iterator
+
+        """
+        raise NotImplementedError
+
+    def iter_sorted_us(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[SortedRow]:
+        """Iterate over the closed intervals overlapping [since, until) sorted by
+        start, merging the sorted intervals of the tasks of a fresh load
+
+        :param since: Default value = None, no lower bound, in microseconds
+        :param until: Default value = None, no upper bound, in microseconds
+        :return: (start, end, job name, task name) tuples
+        :rtype: iterator
+
+        """
+        import heapq
+
+        from wok.wok import Wok
+
+        # a fresh load so that the state of self is left untouched
+        wok = Wok()
+        type(self)(self.dir).load(wok)
+        return heapq.merge(
+            *(
+                iter_task_us(job.name, task, since, until)
+                for job in wok.jobs
+                for task in job.tasks
+            )
+        )
+
+
+def iter_task_us(
+    job_name: str, task: Task, since: Optional[int], until: Optional[int]
+) -> Iterator[SortedRow]:
+    """The sorted intervals of a task overlapping [since, until), see
+    Storage.iter_sorted_us"""
+    for start, end in zip(task.starts, task.ends):
+        if until is not None and start >= until:
+            break
+        if since is None or end >= since:
+            yield start, end, job_name, task.name
+
+
+def open_storage(
+    dir: Path, journal: bool = False, epoch: bool = False, workers: int = 0
+) -> Storage:
+    """Open the storage found in dir, the file layout if there is none yet
+
+    :param dir: The wok folder
+    :param journal: Default value = False, see FileStorage
+    :param epoch: Default value = False, see FileStorage
+    :param workers: Default value = 0, see FileStorage
+    :return: The storage
+
+    """
+    from wok.shard_storage import ShardStorage
+    from wok.sqlite_storage import SqliteStorage
+
+    if (dir / SqliteStorage.file_name).exists():
+        return SqliteStorage(dir)
+    if (dir / ShardStorage.folder_name).exists():
+        return ShardStorage(dir)
+    return FileStorage(dir, journal=journal, epoch=epoch, workers=workers)
+
+
+def write_atomic(path: Path, content: str) -> None:
+    """Write content to path through a temporary file and a rename so that path
+    never holds partially written data. The temporary file has a unique name so
+    that concurrent writers, as readers updating the status file under a shared
+    lock, do not rename each other's partial files.
+
+    :param path: The file to write
+    :param content: The content to write
+
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_text(content)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# the locks held by each thread: [fd, exclusive] by (folder, thread), see lock
+_held: Dict[Tuple[str, int], List] = {}
+
+
+@contextmanager
+def lock(
+    dir: Path, exclusive: bool = True
+) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+    """Hold an advisory lock on the dir/.lock file for a load-modify-save cycle,
+    shared by the readers and exclusive for a writer. Nothing is locked where
+    fcntl is missing (Windows) or when dir cannot be created.
+
+    The lock file holds the generation of the folder, a new one being written
+    by each writer, so that a process keeping the folder loaded can tell
+    whether another one may have changed it since (see WokApi.lock). A shared
+    lock is upgraded by exclusive_lock.
+
+    :param dir: The wok folder
+    :param exclusive: Default value = True, False for a shared lock
+    :return: the generation found when locking and the one while locked, both
+        None when nothing is locked
+    :rtype: (string, string)
+
+    """
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    fd = None
+    key = (os.path.abspath(dir), threading.get_ident())
+    if fcntl is not None:
+        try:
+            dir.mkdir(parents=True, exist_ok=True)
+            fd = os.open(dir / LOCK_NAME, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            # not a folder, the load reports it
+            pass
+    try:
+        if fd is None:
+            yield None, None
+            return
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        before = after = os.pread(fd, 64, 0).decode()
+        if exclusive:
+            after = _new_generation(fd)
+        _held[key] = [fd, exclusive]
+        try:
+            yield before, after
+        finally:
+            del _held[key]
+    finally:
+        if fd is not None:
+            # also releases the lock
+            os.close(fd)
+
+
+def _new_generation(fd: int) -> str:
+    generation = f"{os.getpid()}:{time.time_ns()}"
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, generation.encode(), 0)
+    return generation
+
+
+@contextmanager
+def exclusive_lock(dir: Path) -> Iterator[None]:
+    """Hold the exclusive lock on dir to change it outside of a save, as a load
+    finishing an interrupted save (see Commit.replay). A shared lock held by the
+    thread is upgraded and kept exclusive until it is released, other readers
+    being let through first, and an exclusive one is kept as it is.
+
+    :param dir: The wok folder
+
+    """
+    held = _held.get((os.path.abspath(dir), threading.get_ident()))
+    if held is None:
+        with lock(dir):
+            yield
+        return
+    fd, exclusive = held
+    if not exclusive:
+        import fcntl
+
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        _new_generation(fd)
+        held[1] = True
+    yield
+
+
+class Commit:
+    """The file changes of a save, applied all or nothing.
+
+    The new contents and the list of operations are written to a staging folder
+    which is renamed to the commit folder once complete, then the operations are
+    applied. A commit folder left by an interrupted save is applied again by the
+    next load (see replay), the operations marked as done being skipped. A
+    single write goes through write_atomic instead.
+    """
+
+    staging_name: str = ".staging"
+    commit_name: str = ".commit"
+
+    def __init__(self, dir: Path):
+        self.dir: Path = dir
+        # [operation, paths relative to dir...]
+        self.ops: List[List[str]] = []
+        self.contents: List[str] = []
+
+    def __relative(self, path: Path) -> str:
+        return str(path.relative_to(self.dir))
+
+    def write(self, path: Path, content: str) -> None:
+        self.ops.append(["write", self.__relative(path), str(len(self.contents))])
+        self.contents.append(content)
+
+    def rename(self, src: Path, dst: Path) -> None:
+        self.ops.append(["rename", self.__relative(src), self.__relative(dst)])
+
+    def remove(self, path: Path) -> None:
+        """Remove a file or a folder, if it exists"""
+        self.ops.append(["remove", self.__relative(path)])
+
+    def mkdir(self, path: Path) -> None:
+        self.ops.append(["mkdir", self.__relative(path)])
+
+    def apply(self) -> None:
+        if len(self.ops) == 0:
+            return
+        if len(self.ops) == 1 and self.ops[0][0] == "write":
+            write_atomic(self.dir / self.ops[0][1], self.contents[0])
+            return
+        import json
+
+        staging = self.dir / Commit.staging_name
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        for i, content in enumerate(self.contents):
+            (staging / str(i)).write_text(content)
+        (staging / "ops").write_text(json.dumps(self.ops))
+        # the commit point
+        os.replace(staging, self.dir / Commit.commit_name)
+        # a save already holds the exclusive lock
+        Commit.redo(self.dir)
+
+    @staticmethod
+    def replay(dir: Path) -> None:
+        """Apply the commit folder of dir if any, drop an incomplete staging folder.
+        That changes the folder, so it is done under the exclusive lock (see
+        exclusive_lock).
+
+        :param dir: The wok folder
+
+        """
+        staging, commit = dir / Commit.staging_name, dir / Commit.commit_name
+        if not staging.exists() and not commit.exists():
+            return
+        with exclusive_lock(dir):
+            # another reader may have applied it while the lock was upgraded
+            shutil.rmtree(staging, ignore_errors=True)
+            Commit.redo(dir)
+
+    @staticmethod
+    def redo(dir: Path) -> None:
+        """Apply the commit folder of dir if any, the exclusive lock being held
+
+        :param dir: The wok folder
+
+        """
+        commit = dir / Commit.commit_name
+        if not commit.exists():
+            return
+        import json
+
+        done_file = commit / "done"
+        done = set(done_file.read_text().split()) if done_file.exists() else set()
+        with done_file.open("a") as f:
+            for i, (op, *paths) in enumerate(json.loads((commit / "ops").read_text())):
+                if str(i) in done:
+                    continue
+                path = dir / paths[0]
+                try:
+                    if op == "write":
+                        os.replace(commit / paths[1], path)
+                    elif op == "rename":
+                        os.rename(path, dir / paths[1])
+                    elif op == "remove":
+                        if path.is_dir():
+                            shutil.rmtree(path)
+                        else:
+                            path.unlink()
+                    elif op == "mkdir":
+                        path.mkdir(exist_ok=True)
+                except FileNotFoundError:
+                    # done but interrupted before being marked as done
+                    pass
+                f.write(f"{i}\n")
+                f.flush()
+        shutil.rmtree(commit, ignore_errors=True)
+
+
+class FileStorage(Storage):
+    """A folder with a current_job file and a folder per job holding a file per
+    task (see Task.save).
+
+    In journal mode, starts, ends and registrations are appended to the journal
+    as long as no job or task was created, renamed or removed and the journal
+    is smaller than journal_max_size. Otherwise the journal is compacted into
+    the task files.
+    The other saves go through a Commit so that an interrupted save leaves
+    either the previous content or the new one.
+    With epoch, the task files are written with the compact date encoding (see
+    Task.encode_datetime). Both encodings are always read.
+    With more than one worker, prefetch lists the job folders and reads all the
+    task files with a pool of that many threads, for file systems where each
+    access waits on the network. The tasks are still parsed when first accessed.
+    """
+
+    journal_name: str = ".journal"
+    # size in bytes above which the journal is compacted into the task files
+    journal_max_size: int = 64 * 1024
+
+    def __init__(
+        self, dir: Path, journal: bool = False, epoch: bool = False, workers: int = 0
+    ):
+        self.dir: Path = dir
+        self.journal: bool = journal
+        self.epoch: bool = epoch
+        self.workers: int = workers
+        # (task name, file content) read by the workers, by job name on disk
+        self.prefetched: Dict[str, List[Tuple[str, str]]] = {}
+        self.journal_gen: Optional[int] = None
+        # journal records not applied yet, by job name on disk
+        self.journal_records: Dict[str, List[Tuple[str, str]]] = {}
+        # names on disk of the jobs with records in the journal
+        self.journal_jobs: Set[str] = set()
+
+    @staticmethod
+    def check_dir(dir: Path) -> bool:
+        if dir.exists() and not dir.is_dir():
+            print(f"ERROR: {dir} exists and is not a dir!")
+            return False
+        if not dir.exists():
+            dir.mkdir()
+        return True
+
+    @traced("load")
+    def load(self, wok: "Wok") -> Tuple[bool, str]:
+        if not FileStorage.check_dir(self.dir):
+            return False, "Could not load (see previous error)"
+        # Now dir exists and is a directory
+        Commit.replay(self.dir)
+        current_job_name = None
+        for entry in self.dir.iterdir():
+            if entry.name.startswith("."):
+                # journal or leftover temporary file
+                continue
+            if entry.is_dir():
+                job = Job(entry.name, loader=self.__load_tasks)
+                job.saved_name = job.name
+                wok.add_job(job)
+            elif entry.name == "current_job":
+                current_job_name = entry.read_text().strip()
+        wok.saved_current_job = current_job_name
+        self.journal_gen = None
+        self.journal_records.clear()
+        self.journal_jobs.clear()
+        if (self.dir / FileStorage.journal_name).exists():
+            wok.saved_current_job = self.__read_journal(current_job_name)
+        self.prefetched.clear()
+        wok.set_current_job(wok.saved_current_job)
+        wok.source = self
+        return True, "Loaded successfully"
+
+    def __task_files(self, job_name: str) -> List[Path]:
+        return [
+            task_file
+            for task_file in (self.dir / job_name).iterdir()
+            # not a leftover temporary file
+            if not task_file.name.startswith(".")
+        ]
+
+    def prefetch(self, wok: "Wok") -> None:
+        """With more than one worker, read the task files of the jobs not loaded
+        yet with that many threads"""
+        if self.workers > 1:
+            self.__prefetch(
+                [
+                    job.saved_name
+                    for job in wok.jobs
+                    if not job.is_loaded()
+                    and job.saved_name is not None
+                    and job.saved_name not in self.prefetched
+                ]
+            )
+
+    @traced("prefetch")
+    def __prefetch(self, job_names: List[str]) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            listings = list(pool.map(self.__task_files, job_names))
+            # map keeps the order of the files
+            contents = iter(
+                pool.map(Path.read_text, [f for files in listings for f in files])
+            )
+        for job_name, task_files in zip(job_names, listings):
+            self.prefetched[job_name] = [(f.name, next(contents)) for f in task_files]
+
+    @traced("load_tasks")
+    def __load_tasks(self, job: Job) -> List[Task]:
+        files = self.prefetched.pop(job.saved_name, None)
+        if files is None:
+            files = (
+                (task_file.name, task_file.read_text())
+                for task_file in self.__task_files(job.saved_name)
+            )
+        tasks = []
+        for name, content in files:
+            task = Task(name)
+            task.load(content.split("\n"))
+            task.saved_name = task.name
+            tasks.append(task)
+        records = self.journal_records.pop(job.saved_name, [])
+        if len(records) > 0:
+            by_name = {task.name: task for task in tasks}
+            for task_name, record in records:
+                task = by_name.get(task_name)
+                if task is None or task.journal_gen >= self.journal_gen:
+                    # already compacted into the task file
+                    continue
+                task.replay(record)
+        return tasks
+
+    def __read_journal(self, current_job_name: Optional[str]) -> Optional[str]:
+        """Read the journal records, they are applied when the tasks of their job
+        are loaded.
+
+        The first line is 'G:gen' where gen identifies the journal, then each
+        line is 'job<TAB>task<TAB>record' (see Task.replay) or 'job<TAB>*<TAB>'
+        when the current job changed.
+
+        :return: the current job name once the journal is applied
+
+        """
+        lines = (self.dir / FileStorage.journal_name).read_text().split("\n")
+        if len(lines) < 2 or lines[0][:2] != "G:" or not lines[0][2:].isdigit():
+            # empty or cut off during its first append, ignored as a stale journal
+            return current_job_name
+        self.journal_gen = int(lines[0][2:])
+        # the last element is empty unless the last append was interrupted
+        for line in lines[1:-1]:
+            fields = line.split("\t", 2)
+            if len(fields) != 3:
+                continue
+            job_name, task_name, record = fields
+            if task_name == "*":
+                current_job_name = job_name or None
+            else:
+                self.journal_records.setdefault(job_name, []).append(
+                    (task_name, record)
+                )
+                self.journal_jobs.add(job_name)
+        return current_job_name
+
+    def __can_append_journal(self, wok: "Wok") -> bool:
+        if wok.source is not self or len(wok.removed_jobs) > 0:
+            return False
+        for job in wok.jobs:
+            if job.saved_name != job.name or len(job.removed_tasks) > 0:
+                return False
+            if job.is_loaded() and any(
+                task.saved_name != task.name
+                # changed without records (see Task.extend_us)
+                or task.rewrite
+                for task in job.tasks
+            ):
+                return False
+        journal = self.dir / FileStorage.journal_name
+        return (
+            not journal.exists()
+            or journal.stat().st_size < FileStorage.journal_max_size
+        )
+
+    def __append_journal(self, wok: "Wok") -> None:
+        records = [
+            f"{job.name}\t{task.name}\t{record}"
+            for job in wok.jobs
+            if job.is_loaded()
+            for task in job.tasks
+            for record in task.pending
+        ]
+        current_job_name = wok.get_current_job_name()
+        if current_job_name != wok.saved_current_job:
+            records.append(f"{current_job_name or ''}\t*\t")
+        if len(records) == 0:
+            return
+        journal = self.dir / FileStorage.journal_name
+        mode = "a"
+        if self.journal_gen is None or not journal.exists():
+            # a new journal, replacing a stale one
+            self.journal_gen = time.time_ns()
+            records.insert(0, f"G:{self.journal_gen}")
+            mode = "w"
+        with journal.open(mode) as f:
+            f.write("\n".join(records) + "\n")
+        for job in wok.jobs:
+            if job.is_loaded():
+                for task in job.tasks:
+                    if len(task.pending) > 0:
+                        self.journal_jobs.add(job.name)
+                        task.pending.clear()
+                        # saved, the journal is compacted into its file later
+                        task.dirty = False
+        wok.saved_current_job = current_job_name
+
+    @traced("save")
+    def save(self, wok: "Wok") -> Tuple[bool, str]:
+        if self.journal and self.__can_append_journal(wok):
+            self.__append_journal(wok)
+            return True, "Saved successfully"
+        commit = Commit(self.dir)
+        if wok.source is not self:
+            wok.mark_unsaved()
+            self.journal_gen = None
+            self.journal_records.clear()
+            self.journal_jobs.clear()
+            if self.dir.is_dir():
+                # removed by the commit rather than before it
+                for path in self.__stored():
+                    commit.remove(path)
+        if not FileStorage.check_dir(self.dir):
+            return False, "Could not save (see previous error)"
+        dir = self.dir
+        if self.journal_gen is not None:
+            # the tasks of the jobs with records in the journal are rewritten
+            for job in wok.jobs:
+                if job.saved_name in self.journal_jobs:
+                    for task in job.tasks:
+                        task.dirty = True
+            self.journal_records.clear()
+            self.journal_jobs.clear()
+        # 1. removed jobs
+        for name in wok.removed_jobs:
+            commit.remove(dir / name)
+        wok.removed_jobs.clear()
+        dirty_jobs = [job for job in wok.jobs if job.is_dirty()]
+        # 2. renamed jobs
+        FileStorage.__rename_all(
+            commit,
+            dir,
+            [
+                (job.saved_name, job.name)
+                for job in dirty_jobs
+                if job.saved_name is not None and job.saved_name != job.name
+            ],
+        )
+        for job in dirty_jobs:
+            if not job.is_loaded():
+                # only renamed
+                job.saved_name = job.name
+                continue
+            job_dir = dir / job.name
+            if job.saved_name is None:
+                commit.mkdir(job_dir)
+            else:
+                # 3. removed and renamed tasks
+                for name in job.removed_tasks:
+                    commit.remove(job_dir / name)
+                FileStorage.__rename_all(
+                    commit,
+                    job_dir,
+                    [
+                        (task.saved_name, task.name)
+                        for task in job.tasks
+                        if task.saved_name is not None and task.saved_name != task.name
+                    ],
+                )
+            job.saved_name = job.name
+            job.removed_tasks.clear()
+            # 4. task contents
+            for task in job.tasks:
+                if task.dirty or task.saved_name is None:
+                    if self.journal_gen is not None:
+                        task.journal_gen = self.journal_gen
+                    commit.write(job_dir / task.name, task.save(epoch=self.epoch))
+                task.saved_name = task.name
+                task.dirty = False
+                task.rewrite = False
+                task.pending.clear()
+        # 5. current job marker
+        current_job_name = wok.get_current_job_name()
+        if current_job_name != wok.saved_current_job or self.journal_gen is not None:
+            if current_job_name is None:
+                commit.remove(dir / "current_job")
+            else:
+                commit.write(dir / "current_job", current_job_name)
+            wok.saved_current_job = current_job_name
+        if self.journal_gen is not None:
+            # everything is now in the task files
+            commit.remove(dir / FileStorage.journal_name)
+            self.journal_gen = None
+        commit.apply()
+        wok.source = self
+        return True, "Saved successfully"
+
+    @staticmethod
+    def __rename_all(commit: Commit, dir: Path, renames: List[Tuple[str, str]]) -> None:
+        # Go through temporary names so that swapped names do not collide
+        for i, (old, _) in enumerate(renames):
+            commit.rename(dir / old, dir / f".rename{i}.tmp")
+        for i, (_, new) in enumerate(renames):
+            commit.rename(dir / f".rename{i}.tmp", dir / new)
+
+    def __stored(self) -> Iterator[Path]:
+        # Only the jobs, other storages may share the folder
+        for entry in self.dir.iterdir():
+            if entry.name.startswith("."):
+                if entry.name == FileStorage.journal_name:
+                    yield entry
+            elif entry.is_dir() or entry.name == "current_job":
+                yield entry
+
+    @traced("clear")
+    def clear(self) -> None:
+        for entry in list(self.__stored()):
+            if entry.is_dir():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+
+    def iter_intervals(
+        self, since: datetime = None, until: datetime = None
+    ) -> Iterator[IntervalRow]:
+        from wok.wok import Wok
+
+        # a fresh load so that the journal state of self is left untouched
+        wok = Wok()
+        FileStorage(self.dir).load(wok)
+        for job in wok.jobs:
+            for task in job.tasks:
+                for start, end in task.datetimes:
+                    if (since is None or end >= since) and (
+                        until is None or start <= until
+                    ):
+                        yield job.name, task.name, start, end
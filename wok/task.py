@@ -1,21 +1,560 @@
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
-from typing import List, Tuple, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-from tabulate import tabulate
+from wok.period import (
+    DAY_US,
+    EPOCH,
+    duration_to_str,
+    from_us,
+    period_start,
+    split_us,
+    to_us,
+)
+from wok.trace import traced
+
+
+class Intervals(Sequence):
+    """Read-only view of the intervals of a task as (start, end) datetimes"""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, starts: array, ends: array):
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [
+                (from_us(start), from_us(end))
+                for start, end in zip(self.starts[i], self.ends[i])
+            ]
+        return from_us(self.starts[i]), from_us(self.ends[i])
+
+    def __iter__(self) -> Iterator[Tuple[datetime, datetime]]:
+        for start, end in zip(self.starts, self.ends):
+            yield from_us(start), from_us(end)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
 
 
 class Task:
-    """A Task has a name and datetimes when the user worked on it."""
+    """A Task has a name and datetimes when the user worked on it.
+    The intervals are stored as microseconds since EPOCH in two arrays, starts
+    and ends, datetimes gives them as (start, end) datetimes. closed_us is the
+    running total of the intervals, also added to the job rollup.
+    The intervals moved out by archive_before are kept as daily totals in
+    archive (see encode_archive), decoded only when reports need them.
+    """
+
+    __slots__ = (
+        "name",
+        "starts",
+        "ends",
+        "closed_us",
+        "buckets",
+        "cumulative",
+        "archive",
+        "archived_us",
+        "archive_index",
+        "job",
+        "current_datetime",
+        "saved_name",
+        "dirty",
+        "rewrite",
+        "pending",
+        "journal_gen",
+    )
 
     isoformat: str = "%Y-%m-%dT%H:%M:%S.%f"
     niceformat: str = "%H:%M:%S (%Y-%m-%d)"
+    # origin of the compact encoding, dates are naive local times
+    epoch: datetime = EPOCH
 
     def __init__(self, name: str):
         self.name: str = name
-        self.datetimes: List[Tuple[datetime, datetime]] = []
+        self.starts: array = array("q")
+        self.ends: array = array("q")
+        self.closed_us: int = 0
+        # closed intervals split by period: {by: {period start: duration}}
+        self.buckets: Dict[str, Dict[int, int]] = {}
+        # prefix sums of the durations, cumulative[i] is the duration of the
+        # first i intervals, built by the first range query
+        self.cumulative: Optional[array] = None
+        # the encoded daily totals of the archived intervals, in closed_us too
+        self.archive: Optional[str] = None
+        self.archived_us: int = 0
+        # the decoded archive: day starts and prefix sums of their totals
+        self.archive_index: Optional[Tuple[array, array]] = None
+        # the job holding the task, its rollup is kept up to date
+        self.job = None
         self.current_datetime: datetime = None
+        # name of the file on disk, None until saved once
+        self.saved_name: Optional[str] = None
+        # True when the content differs from what is on disk
+        self.dirty: bool = True
+        # True when records cannot describe the changes, the task is saved whole
+        self.rewrite: bool = False
+        # records not yet written to disk (see replay)
+        self.pending: List[str] = []
+        # generation of the last journal compacted into this task's file
+        self.journal_gen: int = 0
+
+    @property
+    def datetimes(self) -> Intervals:
+        return Intervals(self.starts, self.ends)
+
+    def add_interval(self, start: datetime, end: datetime) -> None:
+        """Adds an interval without recording it, to load a task
+
+        :param start: The start of the interval
+        :param end: The end of the interval
+
+        """
+        self.append_us(to_us(start), to_us(end))
+
+    def append_us(self, start: int, end: int) -> None:
+        """Adds an interval in microseconds since EPOCH without recording it
+
+        :param start: The start of the interval
+        :param end: The end of the interval
+
+        """
+        if len(self.starts) > 0 and start < self.starts[-1]:
+            # keep the intervals sorted by start
+            i = bisect_right(self.starts, start)
+            self.starts.insert(i, start)
+            self.ends.insert(i, end)
+            self.cumulative = None
+        else:
+            if self.cumulative is not None:
+                if end < start or (len(self.ends) > 0 and start < self.ends[-1]):
+                    self.cumulative = None
+                else:
+                    self.cumulative.append(self.cumulative[-1] + end - start)
+            self.starts.append(start)
+            self.ends.append(end)
+        self.__add_closed(end - start)
+        for by, buckets in self.buckets.items():
+            for period, duration in split_us(start, end, by):
+                buckets[period] = buckets.get(period, 0) + duration
+
+    def extend_us(
+        self, starts: Sequence[int], ends: Sequence[int], merge: bool = False
+    ) -> List[Tuple[int, int]]:
+        """Adds intervals in microseconds since EPOCH in bulk, the task is then
+        saved whole rather than through records (see replay). As with
+        register_dates, the intervals overlapping the running one, or another
+        one unless merged, are refused.
+
+        :param starts: The starts of the intervals
+        :param ends: The ends of the intervals, as many as starts
+        :param merge: Default value = False, merge the overlapping or touching
+            intervals (see merge_overlaps) instead of refusing them
+        :return: the refused intervals
+        :rtype: [(int, int)]
+
+        """
+        intervals: Iterable[Tuple[int, int]] = zip(starts, ends)
+        if any(a > b for a, b in zip(starts, starts[1:])):
+            intervals = sorted(intervals)
+        current = (
+            None if self.current_datetime is None else to_us(self.current_datetime)
+        )
+        refused: List[Tuple[int, int]] = []
+        added_starts, added_ends = array("q"), array("q")
+        for start, end in intervals:
+            if (current is not None and end > current) or (
+                not merge
+                and (
+                    (len(added_ends) > 0 and start < added_ends[-1])
+                    or self.find_overlap(start, end) is not None
+                )
+            ):
+                refused.append((start, end))
+            else:
+                added_starts.append(start)
+                added_ends.append(end)
+        if len(added_starts) == 0:
+            return refused
+        starts, ends = added_starts, added_ends
+        ordered = len(self.starts) == 0 or starts[0] >= self.starts[-1]
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        if not ordered:
+            # keep the intervals sorted by start
+            intervals = sorted(zip(self.starts, self.ends))
+            self.starts = array("q", (start for start, _ in intervals))
+            self.ends = array("q", (end for _, end in intervals))
+        self.__add_closed(sum(ends) - sum(starts))
+        self.cumulative = None
+        for by, buckets in self.buckets.items():
+            for start, end in zip(starts, ends):
+                for period, duration in split_us(start, end, by):
+                    buckets[period] = buckets.get(period, 0) + duration
+        if merge:
+            self.merge_overlaps()
+        self.__changed()
+        return refused
+
+    def __changed(self) -> None:
+        """The intervals changed in a way records cannot describe (see replay),
+        the task is saved whole even if records are added afterwards"""
+        self.pending.clear()
+        self.rewrite = True
+        self.dirty = True
+
+    def find_overlap(self, start: int, end: int) -> Optional[Tuple[int, int]]:
+        """Find an interval overlapping [start, end] in O(log n), the intervals
+        being sorted and not overlapping each other
+
+        :param start: The start in microseconds since EPOCH
+        :param end: The end in microseconds since EPOCH
+        :return: the overlapping interval, up to now for the running one, None
+            if there is none
+        :rtype: int, int
+
+        """
+        i = bisect_right(self.starts, start)
+        if i > 0 and self.ends[i - 1] > start:
+            return self.starts[i - 1], self.ends[i - 1]
+        if i < len(self.starts) and self.starts[i] < end:
+            return self.starts[i], self.ends[i]
+        if self.current_datetime is not None:
+            current = to_us(self.current_datetime)
+            if end > current:
+                return current, max(end, Task.__now())
+        return None
+
+    def merge_us(self, start: int, end: int) -> Optional[Tuple[int, int]]:
+        """Adds an interval merged with the intervals it overlaps or touches,
+        unless it overlaps the running one
 
-    def register_dates(self, started: str, ended: str) -> Tuple[bool, str]:
+        :param start: The start in microseconds since EPOCH
+        :param end: The end in microseconds since EPOCH
+        :return: the resulting interval, None if it overlaps the running one
+        :rtype: int, int
+
+        """
+        if self.current_datetime is not None and end > to_us(self.current_datetime):
+            return None
+        i = bisect_right(self.starts, start)
+        lo, hi = i, i
+        while lo > 0 and self.ends[lo - 1] >= start:
+            lo -= 1
+        while hi < len(self.starts) and self.starts[hi] <= end:
+            hi += 1
+        if lo == hi:
+            self.append_us(start, end)
+            self.__changed()
+            return start, end
+        merged = min(start, self.starts[lo]), max([end] + list(self.ends[lo:hi]))
+        removed = sum(self.ends[lo:hi]) - sum(self.starts[lo:hi])
+        del self.starts[lo:hi]
+        del self.ends[lo:hi]
+        self.starts.insert(lo, merged[0])
+        self.ends.insert(lo, merged[1])
+        self.__add_closed(merged[1] - merged[0] - removed)
+        self.buckets.clear()
+        self.cumulative = None
+        self.__changed()
+        return merged
+
+    def check(self) -> List[str]:
+        """Validate the intervals in O(n) as they are sorted
+
+        :return: a message for each interval ending before it starts or
+            overlapping a previous one, the running one included
+        :rtype: [string]
+
+        """
+        issues = []
+        # the interval ending last so far
+        last: Optional[Tuple[int, int]] = None
+        for start, end in zip(self.starts, self.ends):
+            if end < start:
+                issues.append(
+                    f"{Task.interval_str(start, end)} ends before it starts"
+                )
+                continue
+            if last is not None and start < last[1]:
+                issues.append(
+                    f"{Task.interval_str(start, end)} overlaps "
+                    + Task.interval_str(*last)
+                )
+            if last is None or end > last[1]:
+                last = start, end
+        if self.current_datetime is not None and last is not None:
+            if to_us(self.current_datetime) < last[1]:
+                issues.append(
+                    f"running since {self.current_datetime.strftime(Task.niceformat)} "
+                    + f"overlaps {Task.interval_str(*last)}"
+                )
+        return issues
+
+    def merge_overlaps(self) -> int:
+        """Merge the overlapping or touching intervals, those ending before they
+        start are left as is
+
+        :return: the number of intervals merged into others
+        :rtype: int
+
+        """
+        starts, ends = array("q"), array("q")
+        # index in starts of the interval merging the next ones
+        current = None
+        for start, end in zip(self.starts, self.ends):
+            if end < start:
+                starts.append(start)
+                ends.append(end)
+            elif current is not None and start <= ends[current]:
+                ends[current] = max(ends[current], end)
+            else:
+                current = len(starts)
+                starts.append(start)
+                ends.append(end)
+        merged = len(self.starts) - len(starts)
+        if merged > 0:
+            self.__add_closed(
+                sum(ends) - sum(starts) - (sum(self.ends) - sum(self.starts))
+            )
+            self.starts, self.ends = starts, ends
+            self.buckets.clear()
+            self.cumulative = None
+            self.__changed()
+        return merged
+
+    @staticmethod
+    def interval_str(start: int, end: int) -> str:
+        """An interval in microseconds since EPOCH as 'start -> end'"""
+        return (
+            f"{from_us(start).strftime(Task.niceformat)} -> "
+            + from_us(end).strftime(Task.niceformat)
+        )
+
+    def get_buckets(self, by: str) -> Dict[int, int]:
+        """The closed intervals split by period, computed once then maintained
+
+        :param by: One of period.PERIODS
+        :return: the duration by period start, in microseconds since EPOCH
+        :rtype: {int: int}
+
+        """
+        if by not in self.buckets:
+            buckets = {}
+            if self.archive is not None:
+                days, totals = self.__archive_index()
+                for i, day in enumerate(days):
+                    period = to_us(period_start(from_us(day), by))
+                    duration = totals[i + 1] - totals[i]
+                    buckets[period] = buckets.get(period, 0) + duration
+            for start, end in zip(self.starts, self.ends):
+                for period, duration in split_us(start, end, by):
+                    buckets[period] = buckets.get(period, 0) + duration
+            self.buckets[by] = buckets
+        return self.buckets[by]
+
+    def __cumulative(self) -> Optional[array]:
+        if self.cumulative is None:
+            cumulative = array("q", [0])
+            last_end = None
+            for start, end in zip(self.starts, self.ends):
+                if end < start or (last_end is not None and start < last_end):
+                    # invalid intervals (see check), no prefix sums
+                    return None
+                cumulative.append(cumulative[-1] + end - start)
+                last_end = end
+            self.cumulative = cumulative
+        return self.cumulative
+
+    def get_range_us(
+        self, since: Optional[int], until: Optional[int], now: int = None
+    ) -> int:
+        """The time spent between since and until in O(log n), the intervals
+        being sorted, with the prefix sums of their durations. The intervals
+        crossing since or until are clipped. The archived days count when
+        they start in the range, which is exact for ranges of whole days.
+
+        :param since: The first microsecond since EPOCH, None for no lower bound
+        :param until: The microsecond since EPOCH ending the range, None for no
+            upper bound
+        :param now: Default value = None, the end of the running interval, now
+        :return: the duration in microseconds, the running interval included, 0
+            for an empty range
+        :rtype: int
+
+        """
+        if since is not None and until is not None and since >= until:
+            return 0
+        total = 0
+        cumulative = self.__cumulative()
+        if cumulative is None:
+            for start, end in zip(self.starts, self.ends):
+                total += Task.__clipped_us(start, end, since, until)
+        else:
+            # the intervals ending after since and starting before until
+            i = 0 if since is None else bisect_right(self.ends, since)
+            j = len(self.starts) if until is None else bisect_left(self.starts, until)
+            if i < j:
+                total = cumulative[j] - cumulative[i]
+                if since is not None:
+                    total -= max(0, since - self.starts[i])
+                if until is not None:
+                    total -= max(0, self.ends[j - 1] - until)
+        if self.archive is not None:
+            # the archived days starting in the range
+            days, totals = self.__archive_index()
+            i = 0 if since is None else bisect_left(days, since)
+            j = len(days) if until is None else bisect_left(days, until)
+            total += totals[j] - totals[i]
+        if self.current_datetime is not None:
+            total += Task.__clipped_us(
+                to_us(self.current_datetime), now or Task.__now(), since, until
+            )
+        return total
+
+    @staticmethod
+    def __clipped_us(
+        start: int, end: int, since: Optional[int], until: Optional[int]
+    ) -> int:
+        if since is not None:
+            start = max(start, since)
+        if until is not None:
+            end = min(end, until)
+        return max(0, end - start)
+
+    def get_range_duration(
+        self, since: datetime = None, until: datetime = None, now: datetime = None
+    ) -> timedelta:
+        """
+
+        :param since: Default value = None, no lower bound
+        :param until: Default value = None, no upper bound, excluded
+        :param now: Default value = None, datetime.now()
+        :return: the time spent between since and until, see get_range_us
+        :rtype: timedelta
+
+        """
+        return timedelta(
+            0,
+            0,
+            self.get_range_us(
+                None if since is None else to_us(since),
+                None if until is None else to_us(until),
+                None if now is None else to_us(now),
+            ),
+        )
+
+    def __archive_index(self) -> Tuple[array, array]:
+        if self.archive_index is None:
+            days = Task.decode_archive(self.archive or "0:")
+            totals = array("q", [0])
+            for day in sorted(days):
+                totals.append(totals[-1] + days[day])
+            self.archive_index = array("q", sorted(days)), totals
+        return self.archive_index
+
+    def archive_before(self, before: int) -> int:
+        """Moves the intervals before a day into the daily totals of the archive,
+        an interval crossing before is split. Totals and reports are unchanged.
+
+        :param before: The start of a day in microseconds since EPOCH
+        :return: the number of intervals archived, whole or split
+        :rtype: int
+
+        """
+        days, totals = self.__archive_index()
+        archive = {day: totals[i + 1] - totals[i] for i, day in enumerate(days)}
+        starts, ends = array("q"), array("q")
+        archived = 0
+        for start, end in zip(self.starts, self.ends):
+            if start >= before or end < start:
+                starts.append(start)
+                ends.append(end)
+                continue
+            if end > before:
+                starts.append(before)
+                ends.append(end)
+            for day, duration in split_us(start, min(end, before), "day"):
+                archive[day] = archive.get(day, 0) + duration
+            archived += 1
+        if archived > 0:
+            self.starts, self.ends = starts, ends
+            self.archive = Task.encode_archive(archive)
+            self.archived_us = sum(archive.values())
+            self.archive_index = None
+            self.buckets.clear()
+            self.cumulative = None
+            self.__changed()
+        return archived
+
+    @staticmethod
+    def encode_archive(days: Dict[int, int]) -> str:
+        """Encodes daily totals as 'total:data', data being the base64 of the
+        zlib compressed 'day duration' lines where day counts the days since
+        EPOCH and duration is in microseconds
+
+        :param days: The totals by day start in microseconds since EPOCH
+        :return: The encoded totals
+        :rtype: string
+
+        """
+        import base64
+        import zlib
+
+        text = "\n".join(f"{day // DAY_US} {days[day]}" for day in sorted(days))
+        data = base64.b64encode(zlib.compress(text.encode(), 9)).decode()
+        return f"{sum(days.values())}:{data}"
+
+    @staticmethod
+    def decode_archive(s: str) -> Dict[int, int]:
+        """
+
+        :param s: Daily totals encoded by encode_archive
+        :return: the totals by day start in microseconds since EPOCH
+        :rtype: {int: int}
+
+        """
+        import base64
+        import zlib
+
+        data = s.partition(":")[2]
+        days = {}
+        if data != "":
+            for line in zlib.decompress(base64.b64decode(data)).decode().split("\n"):
+                if line != "":
+                    day, duration = line.split(" ")
+                    days[int(day) * DAY_US] = int(duration)
+        return days
+
+    def __add_closed(self, delta: int) -> None:
+        self.closed_us += delta
+        if self.job is not None:
+            self.job.closed_us += delta
+
+    def register_dates(
+        self, started: str, ended: str, merge: bool = False
+    ) -> Tuple[bool, str]:
+        """Register a start, an end or a whole interval
+
+        :param started: The start date, may be empty
+        :param ended: The end date, may be empty
+        :param merge: Default value = False, merge an interval with those it
+            overlaps instead of refusing it
+        :return: True for success + message
+        :rtype: boolean, string
+
+        """
         if started:
             if self.is_running():
                 return False, f"{self} is already started"
@@ -23,7 +562,12 @@ class Task:
             if not res:
                 return False, start
             if not ended:
+                start_us = to_us(start)
+                overlap = self.find_overlap(start_us, max(start_us + 1, self.__now()))
+                if overlap is not None:
+                    return False, f"{self} has {Task.interval_str(*overlap)}"
                 self.current_datetime = start
+                self.__record("C:" + Task.encode_datetime(start))
                 return (
                     True,
                     f"{self} registered as started at "
@@ -33,11 +577,33 @@ class Task:
                 res, end = Task.__parse_datetime(ended)
                 if not res:
                     return False, end
-                self.datetimes.append((start, end))
+                if end <= start:
+                    return False, "The end must be after the start"
+                start_us, end_us = to_us(start), to_us(end)
+                if merge:
+                    merged = self.merge_us(start_us, end_us)
+                    if merged is None:
+                        return (
+                            False,
+                            f"{self} is running since "
+                            + self.current_datetime.strftime(Task.niceformat),
+                        )
+                    start_us, end_us = merged
+                else:
+                    overlap = self.find_overlap(start_us, end_us)
+                    if overlap is not None:
+                        return (
+                            False,
+                            f"{self} has {Task.interval_str(*overlap)}"
+                            + " (use merge)",
+                        )
+                    self.add_interval(start, end)
+                    self.__record(
+                        Task.encode_datetime(start) + "->" + Task.encode_datetime(end)
+                    )
                 return (
                     True,
-                    f"{self} registered "
-                    + f"{start.strftime(Task.niceformat)} -> {end.strftime(Task.niceformat)}",
+                    f"{self} registered {Task.interval_str(start_us, end_us)}",
                 )
         elif ended and self.is_running():
             res, end = Task.__parse_datetime(ended)
@@ -46,6 +612,10 @@ class Task:
             return self.end(dt=end)
         return False, ""
 
+    @staticmethod
+    def __now() -> int:
+        return to_us(datetime.now())
+
     @staticmethod
     def __parse_datetime(s: str) -> Tuple[bool, Union[datetime, str]]:
         now = datetime.now()
@@ -71,25 +641,61 @@ class Task:
                     return False, f"Unrecognized date {s}"
 
     @staticmethod
-    def duration_to_str(duration: timedelta) -> str:
-        sec = duration.total_seconds()
-        hours = sec // 3600
-        sec = sec - hours * 3600
-        minutes = sec // 60
-        sec = sec - minutes * 60
-        return f"{int(hours):02}:{int(minutes):02}:{int(sec):02}"
+    def encode_datetime(dt: datetime, epoch: bool = False) -> str:
+        """Encodes a date for task files, journals and databases.
+
+        :param dt: The date
+        :param epoch: Default value = False, True for the compact encoding, the
+            number of microseconds since Task.epoch, instead of Task.isoformat
+        :return: The encoded date
+        :rtype: string
+
+        """
+        if epoch:
+            return str(to_us(dt))
+        return dt.isoformat(timespec="microseconds")
+
+    @staticmethod
+    def decode_datetime(s: str) -> datetime:
+        """Decodes a date encoded by encode_datetime, whatever the encoding.
+
+        :param s: The encoded date
+        :return: The date
+        :rtype: datetime
+
+        """
+        if "T" in s:
+            return datetime.fromisoformat(s)
+        return from_us(int(s))
+
+    @staticmethod
+    def decode_us(s: str) -> int:
+        """Decodes a date encoded by encode_datetime to microseconds since EPOCH
+
+        :param s: The encoded date
+        :return: The date
+        :rtype: int
 
-    def start(self, dt: datetime = datetime.now()) -> Tuple[bool, str]:
         """
+        if "T" in s:
+            return to_us(datetime.fromisoformat(s))
+        return int(s)
 
-        :param dt:  (Default value = datetime.now())
+    duration_to_str = staticmethod(duration_to_str)
+
+    def start(self, dt: datetime = None) -> Tuple[bool, str]:
+        """
+
+        :param dt: Default value = None, datetime.now()
         :return: True for success + message
         :rtype: boolean, string
 
         """
+        dt = dt or datetime.now()
         if self.current_datetime:
             return False, f"{self} is already started"
         self.current_datetime = dt
+        self.__record("C:" + Task.encode_datetime(dt))
         return (
             True,
             f"{self} started at {self.current_datetime.strftime(Task.niceformat)}",
@@ -104,20 +710,24 @@ class Task:
         """
         return self.current_datetime is not None
 
-    def end(self, dt: datetime = datetime.now()) -> Tuple[bool, str]:
+    def end(self, dt: datetime = None) -> Tuple[bool, str]:
         """
 
-        :param dt:  (Default value = datetime.now())
+        :param dt: Default value = None, datetime.now()
         :return: True for success + message
         :rtype: boolean, string
 
         """
+        dt = dt or datetime.now()
         if not self.is_running():
             return False, f"{self} not yet started"
+        if dt < self.current_datetime:
+            return False, "The end must be after the start"
         duration = dt - self.current_datetime
-        self.datetimes.append((self.current_datetime, dt))
+        self.add_interval(self.current_datetime, dt)
         last_started = self.current_datetime
         self.current_datetime = None
+        self.__record("E:" + Task.encode_datetime(dt))
         sduration = Task.duration_to_str(duration)
         return (
             True,
@@ -125,6 +735,7 @@ class Task:
             + f"\n\tDuration={sduration} ({last_started.strftime(Task.niceformat)})",
         )
 
+    @traced("parse")
     def load(self, input: List[str]) -> None:
         """Loads a task from the content of its file.
 
@@ -137,52 +748,106 @@ class Task:
                 f"ERROR: {self} current datetime will be lost: {self.current_datetime}"
             )
             self.current_datetime = None
-        self.datetimes.clear()
+        del self.starts[:]
+        del self.ends[:]
+        self.buckets.clear()
+        self.cumulative = None
+        self.archive = None
+        self.archived_us = 0
+        self.archive_index = None
+        self.__add_closed(-self.closed_us)
         for line in input:
-            if "->" in line:
-                self.datetimes.append(
-                    tuple(
-                        datetime.strptime(x, Task.isoformat) for x in line.split("->")
-                    )
+            self.replay(line)
+        self.pending.clear()
+        self.rewrite = False
+        self.dirty = False
+
+    def replay(self, record: str) -> None:
+        """Applies a record, either a line of a task file or of a journal.
+
+        Records are 'start->end' for a closed interval, 'C:start' for a start,
+        'E:end' for the end of the current interval, 'J:gen' for the last
+        journal generation compacted into the file and 'S:archive' for the
+        archived daily totals (see encode_archive).
+
+        :param record: The record to apply
+        :type record: string
+
+        """
+        if "->" in record:
+            start, end = record.split("->")
+            self.append_us(Task.decode_us(start), Task.decode_us(end))
+        elif record.startswith("C:"):
+            self.current_datetime = Task.decode_datetime(record[2:])
+        elif record.startswith("E:"):
+            if self.current_datetime is not None:
+                self.append_us(
+                    to_us(self.current_datetime), Task.decode_us(record[2:])
                 )
-            elif line.startswith("C:"):
-                self.current_datetime = datetime.strptime(line[2:], Task.isoformat)
+                self.current_datetime = None
+        elif record.startswith("J:"):
+            self.journal_gen = int(record[2:])
+        elif record.startswith("S:"):
+            archived_us = int(record[2:].partition(":")[0])
+            self.__add_closed(archived_us - self.archived_us)
+            self.archive = record[2:]
+            self.archived_us = archived_us
+            self.archive_index = None
+            self.buckets.clear()
+
+    def __record(self, record: str) -> None:
+        self.pending.append(record)
+        self.dirty = True
 
-    def save(self) -> str:
+    def save(self, epoch: bool = False) -> str:
         """Saves the task to a string to be written to its file.
 
+        :param epoch: Default value = False, see encode_datetime
         :return: The content of the file to be written
         :rtype: string
 
         """
-        output = "\n".join(
-            [
-                "->".join([d.strftime(Task.isoformat) for d in dt])
-                for dt in self.datetimes
-            ]
-        )
+        if epoch:
+            output = "\n".join(
+                [f"{start}->{end}" for start, end in zip(self.starts, self.ends)]
+            )
+        else:
+            output = "\n".join(
+                [
+                    from_us(start).isoformat(timespec="microseconds")
+                    + "->"
+                    + from_us(end).isoformat(timespec="microseconds")
+                    for start, end in zip(self.starts, self.ends)
+                ]
+            )
         if self.current_datetime:
             if len(output) > 0:
                 output += "\n"
-            output += "C:" + self.current_datetime.strftime(Task.isoformat)
+            output += "C:" + Task.encode_datetime(self.current_datetime, epoch)
+        if self.journal_gen:
+            if len(output) > 0:
+                output += "\n"
+            output += f"J:{self.journal_gen}"
+        if self.archive is not None:
+            if len(output) > 0:
+                output += "\n"
+            output += f"S:{self.archive}"
         return output
 
     def __str__(self):
         return f"Task '{self.name}'"
 
-    def get_total_duration(self, now: datetime = datetime.now()) -> timedelta:
-        duration = sum(
-            [dt[1] - dt[0] for dt in self.datetimes],
-            timedelta(0)
-            if self.current_datetime is None
-            else now - self.current_datetime,
-        )
+    def get_total_duration(self, now: datetime = None) -> timedelta:
+        now = now or datetime.now()
+        duration = timedelta(0, 0, self.closed_us)
+        if self.current_datetime is not None:
+            duration += now - self.current_datetime
         return duration
 
-    def get_current_duration(self, now: datetime = datetime.now()) -> timedelta:
+    def get_current_duration(self, now: datetime = None) -> timedelta:
         if self.current_datetime is None:
             return timedelta(0)
-        return now - self.current_datetime
+        return (now or datetime.now()) - self.current_datetime
 
     def detailed_str(self) -> Tuple[str]:
         now = datetime.now()
@@ -194,7 +859,10 @@ class Task:
             )
         return out
 
+    @traced("render")
     def detailed_table(self, suffix: List[str] = [], time: bool = True) -> str:
+        from tabulate import tabulate
+
         now = datetime.now()
         time_data = [
             [fro_m.strftime(Task.niceformat), to.strftime(Task.niceformat)]
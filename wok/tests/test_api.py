@@ -0,0 +1,270 @@
+import tempfile
+import unittest
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+from wok.api import WokApi
+from wok.period import to_us
+
+
+class TestApi(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / ".wok"
+        self.api = WokApi(dir=self.path)
+        self.api.load()
+
+    def tearDown(self):
+        WokApi.import_chunk = 4096
+        self.tmp.cleanup()
+
+    def test_parse_op(self):
+        self.assertEqual(
+            WokApi.parse_op("start job.task create=true"),
+            {"op": "start", "args": ["job.task"], "create": True},
+        )
+        self.assertEqual(
+            WokApi.parse_op('{"op": "switch", "job_name": "job"}'),
+            {"op": "switch", "job_name": "job"},
+        )
+        self.assertEqual(
+            WokApi.parse_op("register_task t '2020-01-01 08:00' end=2020-01-01T09:00"),
+            {
+                "op": "register_task",
+                "args": ["t", "2020-01-01 08:00"],
+                "end": "2020-01-01T09:00",
+            },
+        )
+
+    def test_batch(self):
+        res, results = self.api.apply_batch(
+            [
+                "add_job job1 current=true",
+                {"op": "start", "path": "task1", "create": True},
+                "unknown",
+                "start",
+                "end task1",
+            ]
+        )
+        self.assertFalse(res)
+        self.assertEqual([ok for ok, _ in results], [True, True, False, False, True])
+        self.assertIn("Unknown operation", results[2][1])
+        self.assertIn("Invalid arguments", results[3][1])
+        self.api.save()
+        res, results = self.api.apply_batch(
+            ["add_job job2", "start task2", "add_job job3"], atomic=True
+        )
+        self.assertFalse(res)
+        self.assertEqual(len(results), 2)
+        # the changes since the last save are forgotten
+        self.assertEqual([job.name for job in self.api.wok.jobs], ["job1"])
+        res, _ = self.api.apply_batch(
+            ["switch job2 create=true", "start t create=true"]
+        )
+        self.assertTrue(res)
+        self.api.save()
+        api = WokApi(dir=self.path)
+        api.load()
+        self.assertTrue(api.get_current_job().get_task("t").is_running())
+
+    def test_import_export(self):
+        lines = [
+            "task,job,start,end,comment",
+            "task1,job1,2020-01-01T08:00:00,2020-01-01T09:00:00,",
+            "task2,job1,2020-01-02 08:00,2020-01-02 08:30,",
+            "task1,job1,1577869200000000,1577872800000000,",
+            "task1,job2,2020-01-01T09:00:00,2020-01-01T08:00:00,",
+            "task1,job.2,2020-01-01T08:00:00,2020-01-01T09:00:00,",
+        ]
+        WokApi.import_chunk = 1
+        res, msg = self.api.import_intervals(StringIO("\n".join(lines)))
+        self.assertFalse(res)
+        self.assertIn("Imported 3 intervals in 2 tasks", msg)
+        self.assertIn("2 invalid records skipped: 5, 6", msg)
+        self.api.save()
+        # the imported intervals are saved whole, even in journal mode
+        api = WokApi(dir=self.path, journal=True)
+        api.load()
+        res, msg = api.import_intervals(
+            StringIO(
+                '{"job": "job1", "task": "task2", "start": 0, "end": 60000000}\n'
+            ),
+            "jsonl",
+        )
+        self.assertTrue(res)
+        api.save()
+        api = WokApi(dir=self.path)
+        api.load()
+        task = api.wok.get_job("job1").get_task("task2")
+        self.assertEqual(len(task.datetimes), 2)
+        out = StringIO()
+        res, msg = api.export_intervals(out, since="2020-01-01", until="2020-01-01")
+        self.assertEqual(msg, "Exported 2 intervals")
+        self.assertEqual(
+            out.getvalue().split("\n")[:2],
+            [
+                "job,task,start,end",
+                "job1,task1,2020-01-01T08:00:00.000000,2020-01-01T09:00:00.000000",
+            ],
+        )
+        out.seek(0)
+        api = WokApi(dir=Path(self.tmp.name) / "other")
+        api.load()
+        self.assertTrue(api.import_intervals(out)[0])
+        self.assertEqual(api.wok.get_job("job1").closed_us, 2 * 3600000000)
+
+    def test_check(self):
+        self.api.migrate("sqlite")
+        self.api.add_job("job1", current=True)
+        self.api.add_task("task1")
+        res, _ = self.api.register_task(
+            "task1", "2020-01-01T08:00:00", "2020-01-01T09:00:00"
+        )
+        self.assertTrue(res)
+        # the overlapping intervals are skipped when imported
+        lines = StringIO(
+            "job,task,start,end\njob1,task1,2020-01-01T08:30:00,2020-01-01T10:00:00\n"
+        )
+        res, msg = self.api.import_intervals(lines)
+        self.assertFalse(res)
+        self.assertEqual(
+            msg,
+            "Imported 0 intervals in 1 tasks\n1 overlapping intervals skipped "
+            + "(use merge): job1.task1 08:30:00 (2020-01-01) -> 10:00:00 (2020-01-01)",
+        )
+        # as saved by an older version
+        self.api.wok.get_job("job1").get_task("task1").append_us(
+            to_us(datetime(2020, 1, 1, 8, 30)), to_us(datetime(2020, 1, 1, 10))
+        )
+        res, msg = self.api.check()
+        self.assertFalse(res)
+        self.assertTrue(
+            msg.startswith("job1.task1: 08:30:00 (2020-01-01) -> 10:00:00 (2020-01-01)")
+        )
+        res, msg = self.api.check(merge=True)
+        self.assertTrue(res)
+        self.assertEqual(msg, "job1.task1: merged 1 intervals")
+        self.api.save()
+        api = WokApi(dir=self.path)
+        api.load()
+        task = api.wok.get_job("job1").get_task("task1")
+        self.assertEqual(len(task.datetimes), 1)
+        self.assertEqual(task.closed_us, 2 * 3600000000)
+        self.assertEqual(api.check(), (True, "No issue found"))
+
+    def test_time(self):
+        self.api.add_job("job1", current=True)
+        self.api.add_task("task1")
+        self.api.add_task("task2")
+        self.api.register_task("task1", "2020-01-01T23:00:00", "2020-01-02T01:00:00")
+        self.api.register_task("task1", "2020-01-02T08:00:00", "2020-01-02T09:00:00")
+        self.api.register_task("task2", "2020-01-03T08:00:00", "2020-01-03T08:30:00")
+        self.assertEqual(
+            self.api.time("job1.task1", since="2020-01-02", until="2020-01-02"),
+            (True, "job1.task1 02:00:00\ntotal 02:00:00"),
+        )
+        self.assertEqual(
+            self.api.time("job1", since="2020-01-02"),
+            (True, "job1.task1 02:00:00\njob1.task2 00:30:00\ntotal 02:30:00"),
+        )
+        self.assertFalse(self.api.time(since="2020-01-03", until="2020-01-02")[0])
+        self.assertEqual(self.api.time(), (True, "job1 03:30:00\ntotal 03:30:00"))
+        self.assertFalse(self.api.time("job2")[0])
+        self.assertFalse(self.api.time(since="2020-13-01")[0])
+
+    def test_archive(self):
+        self.api.add_job("job1", current=True)
+        self.api.add_task("task1")
+        self.api.register_task("task1", "2020-01-01T23:00:00", "2020-01-02T01:00:00")
+        self.api.register_task("task1", "2020-02-01T08:00:00", "2020-02-01T09:00:00")
+        self.api.save()
+        report = self.api.report("day")
+        self.assertFalse(self.api.archive("2019-12-01")[0])
+        self.assertEqual(
+            self.api.archive("2020-01-02"),
+            (True, "Archived 1 intervals of 1 tasks before 2020-01-02"),
+        )
+        self.api.save()
+        for backend in ("files", "sqlite"):
+            if backend == "sqlite":
+                self.api.migrate("sqlite")
+            api = WokApi(dir=self.path)
+            api.load()
+            task = api.wok.get_job("job1").get_task("task1")
+            self.assertEqual(len(task.datetimes), 2)
+            self.assertEqual(api.report("day"), report)
+            self.assertEqual(
+                api.time(since="2020-01-01", until="2020-01-01"),
+                (True, "job1 01:00:00\ntotal 01:00:00"),
+            )
+
+    def test_stats(self):
+        self.assertFalse(self.api.stats()[0])
+        self.api.add_job("job1", current=True)
+        self.api.add_task("task1")
+        self.api.register_task("task1", "2020-01-06T09:00:00", "2020-01-06T10:30:00")
+        self.api.register_task("task1", "2020-01-07T09:00:00", "2020-01-07T09:10:00")
+        res, out = self.api.stats(vectorized=False)
+        self.assertTrue(res)
+        self.assertIn("Mon           @+ ", out)
+        self.assertIn("job1", out)
+
+    def test_merge_report(self):
+        root = Path(self.tmp.name)
+        records = {
+            "alice": "job1,task1,2020-01-01T08:00:00,2020-01-01T10:00:00\n"
+            + "job1,task2,2020-01-02T08:00:00,2020-01-02T09:00:00\n",
+            "bob": "job1,task1,2020-01-01T09:00:00,2020-01-01T09:30:00\n"
+            + "job2,task1,2020-01-02T08:30:00,2020-01-02T09:00:00\n",
+            # two tasks at the same time
+            "carol": "job1,task1,2020-01-01T08:00:00,2020-01-01T09:00:00\n"
+            + "job1,task2,2020-01-01T08:30:00,2020-01-01T10:00:00\n",
+        }
+        for name, backend in (("alice", None), ("bob", "sqlite"), ("carol", "shards")):
+            (root / name).mkdir()
+            api = WokApi(dir=root / name / ".wok")
+            api.load()
+            if backend is not None:
+                api.migrate(backend)
+            api.import_intervals(StringIO("job,task,start,end\n" + records[name]))
+            if name == "carol":
+                # overlapping intervals of a task, as saved by an older version
+                task = api.wok.get_job("job1").get_task("task1")
+                start, end = datetime(2020, 1, 1, 8, 30), datetime(2020, 1, 1, 9, 30)
+                task.append_us(to_us(start), to_us(end))
+            api.save()
+        dirs = [str(root / "alice" / ".wok"), "bob=" + str(root / "bob" / ".wok")]
+        self.assertEqual(
+            WokApi.merge_report(dirs),
+            (
+                True,
+                "alice job1.task1 02:00:00\nalice job1.task2 01:00:00\n"
+                + "bob job1.task1 00:30:00\nbob job2.task1 00:30:00\n"
+                + "total 04:00:00",
+            ),
+        )
+        self.assertEqual(
+            WokApi.merge_report(dirs, since="2020-01-02", until="2020-01-02"),
+            (
+                True,
+                "alice job1.task2 01:00:00\nbob job2.task1 00:30:00\n"
+                + "total 01:30:00",
+            ),
+        )
+        res, msg = WokApi.merge_report(dirs + [str(root / "carol" / ".wok")])
+        self.assertFalse(res)
+        self.assertEqual(
+            msg.split("\n")[-2:],
+            [
+                "total 07:30:00",
+                "carol: job1.task1 08:30:00 (2020-01-01) -> 09:30:00 (2020-01-01) "
+                + "overlaps job1.task1 08:00:00 (2020-01-01) -> 09:00:00 (2020-01-01)",
+            ],
+        )
+        self.assertFalse(WokApi.merge_report(dirs + dirs[:1])[0])
+        self.assertFalse(WokApi.merge_report([str(root / "dave")])[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
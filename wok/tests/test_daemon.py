@@ -0,0 +1,74 @@
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from wok.api import WokApi
+from wokcli.cli import WokCli
+from wokcli.client import SOCKET_NAME, request
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / ".wok"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_daemon(self):
+        self.assertEqual(request(self.path, {"ping": True}), None)
+        api = WokApi(dir=self.path)
+        api.load()
+        daemon = threading.Thread(
+            target=WokCli, args=(["wok", "daemon"], api), daemon=True
+        )
+        with redirect_stdout(StringIO()):
+            daemon.start()
+            deadline = time.monotonic() + 10
+            while not (self.path / SOCKET_NAME).exists():
+                # a daemon failing to start fails the test rather than hanging
+                self.assertTrue(daemon.is_alive(), "the daemon stopped")
+                self.assertLess(time.monotonic(), deadline, "no socket")
+                time.sleep(0.01)
+        for argv in [["job", "-c", "job1"], ["switch", "job1"], ["start", "-c", "t"]]:
+            response = request(self.path, {"argv": ["wok"] + argv})
+            self.assertEqual(response["code"], 0)
+        response = request(self.path, {"argv": ["wok", "prompt"]})
+        self.assertEqual(response["out"], "job1:t\n")
+        response = request(self.path, {"argv": ["wok", "job", "--bogus"]})
+        self.assertEqual(response["code"], 2)
+        self.assertIn("--bogus", response["err"])
+        # the changes are saved as they come
+        api = WokApi(dir=self.path)
+        api.load()
+        self.assertTrue(api.get_current_job().get_task("t").is_running())
+        # the changes of another process are loaded before the next command
+        with api.lock():
+            api.end("t")
+            api.register_task("t", "2020-01-01T08:00:00", "2020-01-01T09:00:00")
+            api.save()
+        response = request(self.path, {"argv": ["wok", "start", "t"]})
+        self.assertEqual(response["code"], 0)
+        api = WokApi(dir=self.path)
+        api.load()
+        task = api.get_current_job().get_task("t")
+        self.assertTrue(task.is_running())
+        self.assertEqual(len(task.datetimes), 2)
+        # a failed switch suspends the tasks without saving, that is forgotten
+        request(self.path, {"argv": ["wok", "switch", "typo"]})
+        response = request(self.path, {"argv": ["wok", "job", "-c", "job2"]})
+        self.assertEqual(response["code"], 0)
+        api = WokApi(dir=self.path)
+        api.load()
+        self.assertTrue(api.get_current_job().get_task("t").is_running())
+        self.assertEqual(request(self.path, {"stop": True})["code"], 0)
+        daemon.join()
+        self.assertFalse((self.path / SOCKET_NAME).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
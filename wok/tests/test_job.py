@@ -1,4 +1,6 @@
+import random
 import unittest
+from datetime import datetime, timedelta
 
 from wok.job import Job
 from wok.task import Task
@@ -11,7 +13,7 @@ class TestJob(unittest.TestCase):
 
     def test_init(self):
         self.assertEqual(self.job.name, "tested_job")
-        self.assertEqual(self.job.tasks, [])
+        self.assertEqual(self.job.tasks, ())
 
     def test_add(self):
         self.assertTrue(self.job.add_task(self.task))
@@ -29,3 +31,50 @@ class TestJob(unittest.TestCase):
         self.job.add_task(self.task)
         self.assertTrue(self.job.remove_task(self.task))
         self.assertEqual(self.job.get_task(self.task.name), None)
+
+    def test_rename_task(self):
+        self.job.add_task(self.task)
+        other = Task("other")
+        self.job.add_task(other)
+        self.assertFalse(self.job.rename_task(self.task, "other")[0])
+        self.assertTrue(self.job.rename_task(self.task, "renamed")[0])
+        self.assertEqual(self.job.get_task("renamed"), self.task)
+        self.assertEqual(self.job.get_task("task"), None)
+        self.assertFalse(self.job.add_task(Task("renamed"))[0])
+        self.assertTrue(self.job.add_task(Task("task"))[0])
+
+    def test_rollup(self):
+        rng = random.Random(42)
+        now = datetime(2020, 1, 1)
+        for i in range(500):
+            op = rng.randrange(6)
+            now += timedelta(minutes=rng.randrange(1, 60))
+            tasks = self.job.tasks
+            if op == 0 or len(tasks) == 0:
+                self.job.add_task(Task(f"task{i}"))
+            elif op == 1:
+                self.job.remove_task(rng.choice(tasks))
+            elif op == 2:
+                rng.choice(tasks).start(dt=now)
+            elif op == 3:
+                rng.choice(tasks).end(dt=now)
+            elif op == 4:
+                rng.choice(tasks).register_dates(
+                    (now - timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M:%S"),
+                    (now - timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M:%S"),
+                    merge=rng.random() < 0.5,
+                )
+            else:
+                task = rng.choice(tasks)
+                if not task.is_running():
+                    task.load(task.save().split("\n"))
+            for task in self.job.tasks:
+                self.assertEqual(task.closed_us, sum(task.ends) - sum(task.starts))
+            self.assertEqual(
+                self.job.closed_us,
+                sum(sum(t.ends) - sum(t.starts) for t in self.job.tasks),
+            )
+            self.assertEqual(
+                self.job.get_total_duration(now),
+                sum((t.get_total_duration(now) for t in self.job.tasks), timedelta(0)),
+            )
@@ -0,0 +1,37 @@
+import unittest
+
+from wok.merge import merge_intervals
+
+
+class TestMerge(unittest.TestCase):
+    def test_merge_intervals(self):
+        sources = {
+            "a": iter(
+                [
+                    (0, 10, "j", "t1"),
+                    (5, 8, "j", "t2"),
+                    (6, 20, "j", "t1"),
+                    (7, 9, "j", "t2"),
+                ]
+            ),
+            "b": iter([(2, 4, "j", "t1"), (4, 30, "k", "t1")]),
+        }
+        totals, overlaps, count = merge_intervals(
+            sources, since=3, until=25, max_overlaps=1
+        )
+        self.assertEqual(
+            totals,
+            {
+                ("a", "j", "t1"): 7 + 14,
+                ("a", "j", "t2"): 3 + 2,
+                ("b", "j", "t1"): 1,
+                ("b", "k", "t1"): 21,
+            },
+        )
+        # only within a task, the tasks of a person may run at the same time
+        self.assertEqual(count, 2)
+        self.assertEqual(overlaps, [("a", (6, 20, "j", "t1"), (0, 10, "j", "t1"))])
+
+
+if __name__ == "__main__":
+    unittest.main()
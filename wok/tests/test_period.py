@@ -0,0 +1,49 @@
+import unittest
+from datetime import datetime
+
+from wok.period import from_us, period_label, period_start, split_us, to_us
+from wok.task import Task
+
+
+class TestPeriod(unittest.TestCase):
+    def test_period_start(self):
+        dt = datetime(2020, 1, 31, 15, 30)
+        self.assertEqual(period_start(dt, "day"), datetime(2020, 1, 31))
+        self.assertEqual(period_start(dt, "week"), datetime(2020, 1, 27))
+        self.assertEqual(period_start(dt, "month"), datetime(2020, 1, 1))
+        self.assertEqual(period_start(dt, "year"), datetime(2020, 1, 1))
+        self.assertEqual(period_label(datetime(2020, 1, 27), "week"), "2020-W05")
+        self.assertEqual(period_label(datetime(2020, 1, 1), "month"), "2020-01")
+
+    def test_split(self):
+        start = to_us(datetime(2019, 12, 31, 23))
+        end = to_us(datetime(2020, 1, 1, 2))
+        self.assertEqual(
+            [(from_us(p), d // 3600000000) for p, d in split_us(start, end, "day")],
+            [(datetime(2019, 12, 31), 1), (datetime(2020, 1, 1), 2)],
+        )
+        self.assertEqual(len(list(split_us(start, end, "week"))), 1)
+        self.assertEqual(len(list(split_us(start, end, "year"))), 2)
+
+    def test_buckets(self):
+        task = Task("task")
+        task.add_interval(datetime(2020, 1, 31, 22), datetime(2020, 2, 1, 1))
+        self.assertEqual(
+            task.get_buckets("month"),
+            {
+                to_us(datetime(2020, 1, 1)): 2 * 3600000000,
+                to_us(datetime(2020, 2, 1)): 3600000000,
+            },
+        )
+        # cached buckets follow the new intervals
+        task.add_interval(datetime(2020, 2, 3, 8), datetime(2020, 2, 3, 9))
+        self.assertEqual(
+            task.get_buckets("month")[to_us(datetime(2020, 2, 1))], 2 * 3600000000
+        )
+        self.assertEqual(len(task.get_buckets("day")), 3)
+        task.load([])
+        self.assertEqual(task.get_buckets("month"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import random
+import unittest
+from datetime import datetime
+
+from wok.period import to_us
+from wok.stats import HOUR_US, compute, load_numpy
+
+MINUTE_US = 60000000
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        # monday 2020-01-06
+        monday = to_us(datetime(2020, 1, 6))
+        self.starts = [monday + 9 * HOUR_US + 30 * MINUTE_US, monday, monday]
+        self.ends = [monday + 11 * HOUR_US, monday + 3 * MINUTE_US, monday - 1]
+        self.job_ids = [0, 1, 1]
+
+    def test_compute_loop(self):
+        sessions, heatmap, percentiles = compute(
+            self.starts, self.ends, self.job_ids, vectorized=False
+        )
+        # the interval ending before it starts is left out
+        self.assertEqual(sessions, [1, 0, 0, 0, 1, 0, 0])
+        self.assertEqual(heatmap[0], 3 * MINUTE_US)
+        self.assertEqual(heatmap[9:12], [30 * MINUTE_US, HOUR_US, 0])
+        self.assertEqual(sum(heatmap), 93 * MINUTE_US)
+        self.assertEqual(
+            percentiles, {0: [1] + [90 * MINUTE_US] * 3, 1: [1] + [3 * MINUTE_US] * 3}
+        )
+        values = [10, 20, 30, 40]
+        _, _, percentiles = compute(values, [2 * v for v in values], [0] * 4, False)
+        self.assertEqual(percentiles, {0: [4, 25, 37, 40]})
+
+    @unittest.skipIf(load_numpy() is None, "NumPy is not installed")
+    def test_compute_numpy(self):
+        self.assertEqual(
+            compute(self.starts, self.ends, self.job_ids, vectorized=True),
+            compute(self.starts, self.ends, self.job_ids, vectorized=False),
+        )
+        rand = random.Random(0)
+        starts = [rand.randrange(0, 1000 * HOUR_US) for _ in range(2000)]
+        ends = [start + rand.randrange(-HOUR_US, 30 * HOUR_US) for start in starts]
+        job_ids = [rand.randrange(0, 5) for _ in starts]
+        self.assertEqual(
+            compute(starts, ends, job_ids, vectorized=True),
+            compute(starts, ends, job_ids, vectorized=False),
+        )
+        self.assertEqual(compute([], [], [], True), ([0] * 7, [0] * 168, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
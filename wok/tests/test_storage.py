@@ -0,0 +1,537 @@
+import json
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from wok.api import WokApi
+from wok.job import Job
+from wok.period import to_us
+from wok.shard_storage import ShardStorage
+from wok.sqlite_storage import SqliteStorage
+from wok.status import prompt_str, read_status, status_str
+from wok.storage import (
+    LOCK_NAME,
+    Commit,
+    FileStorage,
+    lock,
+    open_storage,
+    write_atomic,
+)
+from wok.task import Task
+from wok.wok import Wok
+
+ITERATIONS = 25
+
+
+def start_end(path: Path, task: str) -> None:
+    # small journals to also compact them concurrently
+    FileStorage.journal_max_size = 256
+    for _ in range(ITERATIONS):
+        for method in ("start", "end"):
+            api = WokApi(dir=path, journal=True)
+            with api.lock():
+                api.load()
+                getattr(api, method)(task)
+                api.save()
+        api = WokApi(dir=path)
+        with api.lock(exclusive=False):
+            api.load()
+            api.status()
+
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / ".wok"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_journal(self):
+        path = self.path
+        wok1 = Wok()
+        storage = FileStorage(path, journal=True)
+        job = Job("job1")
+        job.add_task(Task("task1"))
+        wok1.add_job(job)
+        wok1.current_job_idx = 0
+        storage.save(wok1)
+        task_file = path / "job1" / "task1"
+        wok1.jobs[0].tasks[0].start(dt=datetime(2019, 1, 10, 11, 11))
+        storage.save(wok1)
+        wok1.jobs[0].tasks[0].end(dt=datetime(2019, 1, 10, 11, 22))
+        storage.save(wok1)
+        self.assertEqual(task_file.read_text(), "")
+        self.assertEqual(
+            (path / FileStorage.journal_name).read_text().split("\n")[1:],
+            [
+                "job1\ttask1\tC:2019-01-10T11:11:00.000000",
+                "job1\ttask1\tE:2019-01-10T11:22:00.000000",
+                "",
+            ],
+        )
+        wok2 = Wok()
+        storage = FileStorage(path, journal=True)
+        storage.load(wok2)
+        task = wok2.jobs[0].tasks[0]
+        self.assertEqual(
+            task.datetimes,
+            [(datetime(2019, 1, 10, 11, 11), datetime(2019, 1, 10, 11, 22))],
+        )
+        # compaction
+        gen = storage.journal_gen
+        wok2.rename_job(wok2.jobs[0], "job2")
+        storage.save(wok2)
+        self.assertFalse((path / FileStorage.journal_name).exists())
+        self.assertEqual(
+            (path / "job2" / "task1").read_text(),
+            "2019-01-10T11:11:00.000000->2019-01-10T11:22:00.000000\n"
+            + f"J:{gen}",
+        )
+        # a journal already compacted is not applied twice
+        (path / FileStorage.journal_name).write_text(
+            f"G:{gen}\njob2\ttask1\t"
+            + "2019-01-10T11:11:00.000000->2019-01-10T11:22:00.000000\n"
+        )
+        wok3 = Wok()
+        wok3.load(dir=path)
+        self.assertEqual(len(wok3.jobs[0].tasks[0].datetimes), 1)
+        # an empty journal or one cut off in its first append is ignored
+        for content in ("", "G:1", "G:12", "G:1job2\ttask1\tC:1\n"):
+            (path / FileStorage.journal_name).write_text(content)
+            wok4 = Wok()
+            storage = FileStorage(path, journal=True)
+            self.assertTrue(storage.load(wok4)[0])
+            task = wok4.jobs[0].tasks[0]
+            self.assertEqual(len(task.datetimes), 1)
+            self.assertFalse(task.is_running())
+            # and replaced by the next one
+            task.start(dt=datetime(2019, 1, 11, 8))
+            storage.save(wok4)
+            wok4 = Wok()
+            wok4.load(dir=path)
+            self.assertTrue(wok4.jobs[0].tasks[0].is_running())
+            self.assertEqual(len(wok4.jobs[0].tasks[0].datetimes), 1)
+
+    def test_rewrite(self):
+        # a merged interval is saved whole even when records follow it
+        for backend in ("files", "sqlite", "shards"):
+            path = Path(self.tmp.name) / backend
+            api = WokApi(dir=path, journal=True)
+            api.load()
+            if backend != "files":
+                api.migrate(backend)
+            api.add_job("job1", current=True)
+            api.add_task("task1")
+            api.register_task("task1", "2020-01-01T09:00:00", "2020-01-01T10:00:00")
+            api.save()
+            api.register_task(
+                "task1", "2020-01-01T09:30:00", "2020-01-01T11:00:00", merge=True
+            )
+            api.register_task("task1", "2020-01-01T12:00:00", "2020-01-01T13:00:00")
+            api.save()
+            api = WokApi(dir=path, journal=True)
+            api.load()
+            self.assertEqual(
+                api.get_current_job().get_task("task1").datetimes,
+                [
+                    (datetime(2020, 1, 1, 9), datetime(2020, 1, 1, 11)),
+                    (datetime(2020, 1, 1, 12), datetime(2020, 1, 1, 13)),
+                ],
+                backend,
+            )
+
+    def test_journal_replayed(self):
+        # the tasks replayed from the journal do not compact it
+        exists = []
+        for op in ("create", "a", "b", "a"):
+            api = WokApi(dir=self.path, journal=True)
+            api.load()
+            if op == "create":
+                api.add_job("job1", current=True)
+                api.add_task("a")
+                api.add_task("b")
+            elif api.get_current_job().get_task(op).is_running():
+                api.end(op)
+            else:
+                api.start(op)
+            api.save()
+            self.assertFalse(api.wok.is_dirty())
+            exists.append((self.path / FileStorage.journal_name).exists())
+        self.assertEqual(exists, [False, True, True, True])
+        api = WokApi(dir=self.path, journal=True)
+        api.load()
+        api.wok.load_all()
+        self.assertFalse(api.wok.is_dirty())
+        # compacted with the replayed tasks
+        api.add_task("c")
+        api.save()
+        self.assertFalse((self.path / FileStorage.journal_name).exists())
+        api = WokApi(dir=self.path)
+        api.load()
+        job = api.get_current_job()
+        self.assertEqual(len(job.get_task("a").datetimes), 1)
+        self.assertTrue(job.get_task("b").is_running())
+
+    def test_archive_then_start(self):
+        # the archive and the import are saved with the records following them
+        for backend in ("files", "sqlite", "shards"):
+            path = Path(self.tmp.name) / backend
+            api = WokApi(dir=path, journal=True)
+            api.load()
+            if backend != "files":
+                api.migrate(backend)
+            api.add_job("job1", current=True)
+            api.add_task("task1")
+            api.register_task("task1", "2020-01-01T09:00:00", "2020-01-01T10:00:00")
+            api.register_task("task1", "2020-02-01T09:00:00", "2020-02-01T10:00:00")
+            api.save()
+            api.archive("2020-01-02")
+            api.import_intervals(
+                StringIO("job,task,start,end\n" + "job1,task1,2020-03-01,2020-03-02\n")
+            )
+            api.start("task1")
+            api.save()
+            api = WokApi(dir=path, journal=True)
+            api.load()
+            task = api.get_current_job().get_task("task1")
+            self.assertTrue(task.is_running(), backend)
+            self.assertIsNotNone(task.archive, backend)
+            self.assertEqual(len(task.datetimes), 2, backend)
+            self.assertEqual(task.closed_us, 26 * 3600000000, backend)
+
+    def test_sqlite(self):
+        start = datetime(2019, 1, 10, 11, 11)
+        end = datetime(2019, 1, 10, 11, 22)
+        wok1 = Wok()
+        for name in ["job1", "job2"]:
+            job = Job(name)
+            task = Task("task1")
+            task.start(dt=start)
+            task.end(dt=end)
+            job.add_task(task)
+            job.add_task(Task("task2"))
+            wok1.add_job(job)
+        wok1.current_job_idx = 0
+        storage = SqliteStorage(self.path)
+        storage.save(wok1)
+        # incremental changes
+        job1, job2 = wok1.jobs
+        job1.get_task("task2").start(dt=end)
+        job1.rename_task(job1.get_task("task1"), "task3")
+        wok1.rename_job(job1, "job2")
+        wok1.rename_job(job2, "job1")
+        job2.remove_task_name("task2")
+        wok1.current_job_idx = 1
+        storage.save(wok1)
+        storage.close()
+        wok2 = Wok()
+        self.assertIsInstance(open_storage(self.path), SqliteStorage)
+        wok2.load(dir=self.path)
+        # the renamed jobs keep their order
+        self.assertEqual([job.name for job in wok2.jobs], ["job2", "job1"])
+        self.assertEqual(wok2.get_current_job_name(), "job1")
+        job2, job1 = wok2.jobs
+        self.assertEqual([task.name for task in job1.tasks], ["task1"])
+        self.assertEqual([task.name for task in job2.tasks], ["task3", "task2"])
+        self.assertEqual(job2.get_task("task3").datetimes, [(start, end)])
+        self.assertEqual(job2.get_task("task2").current_datetime, end)
+        job2.get_task("task2").end(dt=datetime(2019, 1, 10, 12))
+        wok2.save(dir=self.path)
+        self.assertEqual(
+            list(wok2.source.iter_intervals(since=datetime(2019, 1, 10, 11, 30))),
+            [("job2", "task2", end, datetime(2019, 1, 10, 12))],
+        )
+        # a range only reads the intervals overlapping it
+        partial = Wok()
+        self.assertTrue(
+            SqliteStorage(self.path).load_range(
+                partial, to_us(datetime(2019, 1, 10, 11, 30)), None
+            )
+        )
+        self.assertIsNone(partial.source)
+        job2 = partial.get_job("job2")
+        self.assertEqual(job2.get_task("task3").datetimes, [])
+        self.assertEqual(len(job2.get_task("task2").datetimes), 1)
+        # a save from elsewhere keeps the stored wok until it is complete
+        wok3 = Wok()
+        wok3.add_job(Job("job3"))
+        with mock.patch("wok.sqlite_storage.os.replace", side_effect=OSError):
+            with self.assertRaises(OSError):
+                SqliteStorage(self.path).save(wok3)
+        self.assertEqual([path.name for path in self.path.glob(".wok.db*")], [])
+        wok2 = Wok()
+        wok2.load(dir=self.path)
+        self.assertEqual([job.name for job in wok2.jobs], ["job2", "job1"])
+        self.assertTrue(SqliteStorage(self.path).save(wok3)[0])
+        wok2 = Wok()
+        wok2.load(dir=self.path)
+        self.assertEqual([job.name for job in wok2.jobs], ["job3"])
+
+    def test_migrate(self):
+        api = WokApi(dir=self.path)
+        api.load()
+        api.add_job("job1", current=True)
+        api.start("task1", create=True)
+        api.save()
+        self.assertTrue(api.migrate("sqlite")[0])
+        self.assertFalse((self.path / "job1").exists())
+        api = WokApi(dir=self.path)
+        api.load()
+        self.assertIsInstance(api.storage, SqliteStorage)
+        self.assertTrue(api.get_current_job().get_task("task1").is_running())
+        self.assertFalse(api.migrate("sqlite")[0])
+        self.assertTrue(api.migrate("files")[0])
+        self.assertFalse((self.path / SqliteStorage.file_name).exists())
+        self.assertEqual((self.path / "current_job").read_text(), "job1")
+
+    def test_status(self):
+        api = WokApi(dir=self.path)
+        api.load()
+        api.add_job("job1", current=True)
+        api.start("task1", create=True)
+        api.start("task2", create=True)
+        api.save()
+        status = read_status(self.path)
+        self.assertEqual([name for name, _ in status[1]], ["task1", "task2"])
+        self.assertEqual(prompt_str(status), "job1:task1,task2")
+        self.assertEqual(api.prompt()[1], "job1:task1,task2")
+        self.assertIn("Task 'task2'", status_str(status, datetime.now()))
+        # renaming the current job without loading its tasks first
+        api = WokApi(dir=self.path)
+        api.load()
+        api.wok.rename_job(api.get_current_job(), "job2")
+        api.save()
+        self.assertEqual(prompt_str(read_status(self.path)), "job2:task1,task2")
+        api.suspend()
+        api.save()
+        self.assertEqual(read_status(self.path), ("job2", []))
+        api.delete_job("job2")
+        api.save()
+        self.assertEqual(read_status(self.path), (None, []))
+        self.assertEqual(status_str((None, []), datetime.now()), api.status()[1])
+        # readers write the status file concurrently under a shared lock
+        contents = [str(i) * 10000 for i in range(8)]
+
+        def write(content):
+            for _ in range(20):
+                write_atomic(self.path / "file", content)
+
+        threads = [threading.Thread(target=write, args=(c,)) for c in contents]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn((self.path / "file").read_text(), contents)
+        self.assertEqual(list(self.path.glob(".file*")), [])
+
+    def test_commit(self):
+        api = WokApi(dir=self.path)
+        api.load()
+        api.add_job("job1", current=True)
+        api.add_task("task1")
+        api.add_job("job2")
+        api.save()
+        # swap the jobs and start a task, interrupted after the commit point
+        api.rename_job("job1", "job3")
+        api.rename_job("job2", "job1")
+        api.rename_job("job3", "job2")
+        api.start("job2.task1")
+        with mock.patch.object(Commit, "redo"):
+            api.save()
+        commit = self.path / Commit.commit_name
+        self.assertTrue(commit.exists())
+        self.assertTrue((self.path / "job1" / "task1").exists())
+        shutil.copytree(commit, self.path.parent / "commit")
+        # a reader applies it under the exclusive lock, once the others left
+        locked, released = threading.Event(), threading.Event()
+
+        def read():
+            with lock(self.path, exclusive=False):
+                locked.set()
+                time.sleep(0.2)
+                released.set()
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        locked.wait()
+        generation = (self.path / LOCK_NAME).read_text()
+        api = WokApi(dir=self.path)
+        with api.lock(exclusive=False):
+            api.load()
+            self.assertTrue(released.is_set())
+        reader.join()
+        self.assertNotEqual((self.path / LOCK_NAME).read_text(), generation)
+        self.assertFalse(commit.exists())
+        self.assertTrue(api.wok.get_job("job2").get_task("task1").is_running())
+        self.assertEqual(api.wok.get_job("job1").tasks, ())
+        # interrupted before removing the commit folder
+        shutil.copytree(self.path.parent / "commit", commit)
+        ops = json.loads((commit / "ops").read_text())
+        (commit / "done").write_text("".join(f"{i}\n" for i in range(len(ops))))
+        api = WokApi(dir=self.path)
+        api.load()
+        self.assertTrue(api.wok.get_job("job2").get_task("task1").is_running())
+        self.assertEqual(api.wok.get_job("job1").tasks, ())
+        self.assertEqual(api.get_current_job().name, "job2")
+
+    def test_lock(self):
+        api = WokApi(dir=self.path)
+        api.load()
+        api.add_job("job1", current=True)
+        for i in range(8):
+            api.add_task(f"task{i}")
+        api.save()
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=start_end, args=(self.path, f"job1.task{i}"))
+            for i in range(8)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        api = WokApi(dir=self.path)
+        api.load()
+        for task in api.wok.get_job("job1").tasks:
+            self.assertFalse(task.is_running())
+            self.assertEqual(len(task.datetimes), ITERATIONS)
+
+    def test_workers(self):
+        api = WokApi(dir=self.path, journal=True)
+        api.load()
+        for j in range(5):
+            api.add_job(f"job{j}", current=True)
+            for t in range(4):
+                api.add_task(f"task{t}")
+                api.register_task(f"task{t}", f"2020-01-0{t + 1}T08:00:00")
+        api.switch("job3")
+        api.save()
+        api.end("job2.task1")
+        api.save()
+        self.assertTrue((self.path / FileStorage.journal_name).exists())
+        serial = Wok()
+        serial.load(dir=self.path)
+        parallel = Wok()
+        parallel.load(dir=self.path, workers=4)
+        # only load_all reads ahead, a single job is read on its own
+        self.assertEqual(parallel.source.prefetched, {})
+        parallel.current_job.tasks
+        self.assertEqual(parallel.source.prefetched, {})
+        parallel.source.prefetch(parallel)
+        self.assertEqual(
+            sorted(parallel.source.prefetched),
+            sorted(j.name for j in parallel.jobs if j is not parallel.current_job),
+        )
+        self.assertEqual(parallel.current_job_idx, serial.current_job_idx)
+        self.assertEqual(len(parallel.jobs), 5)
+        for serial_job, parallel_job in zip(serial.jobs, parallel.jobs):
+            self.assertEqual(parallel_job.name, serial_job.name)
+            self.assertEqual(
+                [(t.name, t.datetimes, t.current_datetime) for t in parallel_job.tasks],
+                [(t.name, t.datetimes, t.current_datetime) for t in serial_job.tasks],
+            )
+        self.assertEqual(len(parallel.get_job("job2").get_task("task1").datetimes), 1)
+
+    def test_shards(self):
+        api = WokApi(dir=self.path)
+        api.load()
+        api.add_job("job1", current=True)
+        api.add_task("task1")
+        for day in ("2020-01-01", "2020-01-31", "2020-02-03", "2020-04-01"):
+            api.register_task("task1", f"{day}T23:00:00", f"{day}T23:30:00")
+        api.archive("2020-01-02")
+        api.register_task("task1", "2020-04-02T08:00:00")
+        api.save()
+        self.assertTrue(api.migrate("shards")[0])
+        self.assertFalse((self.path / "job1").exists())
+        task_dir = self.path / ShardStorage.folder_name / "job1" / "task1"
+        self.assertEqual(
+            sorted(entry.name for entry in task_dir.iterdir()),
+            ["2020-01", "2020-02", "2020-04", ShardStorage.manifest_name],
+        )
+        api = WokApi(dir=self.path)
+        api.load()
+        self.assertIsInstance(api.storage, ShardStorage)
+        task = api.get_current_job().get_task("task1")
+        self.assertTrue(task.is_running())
+        self.assertEqual(len(task.datetimes), 3)
+        self.assertEqual(task.closed_us, 4 * 1800000000)
+        # only the shard of the month is written
+        shards = {month: (task_dir / month).read_text() for month in ("2020-01",)}
+        task.end(dt=datetime(2020, 4, 2, 9))
+        api.register_task("task1", "2020-02-04T08:00:00", "2020-02-04T09:00:00")
+        api.save()
+        self.assertEqual((task_dir / "2020-01").read_text(), shards["2020-01"])
+        self.assertEqual(
+            api.storage.shard_totals("job1", "task1"),
+            {
+                "2020-01": 1800000000,
+                "2020-02": 5400000000,
+                "2020-04": 1800000000 + 3600000000,
+            },
+        )
+        api = WokApi(dir=self.path)
+        api.load()
+        task = api.get_current_job().get_task("task1")
+        self.assertFalse(task.is_running())
+        self.assertEqual(len(task.datetimes), 5)
+        # a range only opens the shards overlapping it
+        read_text = Path.read_text
+        opened = []
+
+        def counting_read_text(path, *args, **kwargs):
+            opened.append(path.name)
+            return read_text(path, *args, **kwargs)
+
+        with mock.patch.object(Path, "read_text", counting_read_text):
+            rows = list(
+                api.storage.iter_intervals(datetime(2020, 2, 1), datetime(2020, 2, 29))
+            )
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            [name for name in opened if name != ShardStorage.manifest_name],
+            ["2020-02"],
+        )
+        # so do the reports over a range, which give the same answers
+        loaded = WokApi(dir=self.path)
+        loaded.load()
+        loaded.wok.load_all()
+        for query in (
+            lambda api: api.report("month", "2020-02-01", "2020-02-29"),
+            lambda api: api.time(None, "2020-02-04", "2020-02-04"),
+            lambda api: api.time("job1.task1", None, "2020-01-31"),
+        ):
+            api = WokApi(dir=self.path)
+            api.load()
+            opened.clear()
+            with mock.patch.object(Path, "read_text", counting_read_text):
+                self.assertEqual(query(api), query(loaded))
+            self.assertNotIn("2020-04", opened)
+        # a save is applied all or nothing, even interrupted
+        api.rename_job("job1", "job2")
+        api.start("job2.task1")
+        api.add_task("task2")
+        with mock.patch.object(Commit, "redo"):
+            api.save()
+        self.assertTrue((self.path / Commit.commit_name).exists())
+        self.assertTrue(task_dir.exists())
+        api = WokApi(dir=self.path)
+        api.load()
+        self.assertFalse((self.path / Commit.commit_name).exists())
+        self.assertFalse(task_dir.exists())
+        job = api.get_current_job()
+        self.assertEqual(job.name, "job2")
+        self.assertEqual(sorted(task.name for task in job.tasks), ["task1", "task2"])
+        self.assertTrue(job.get_task("task1").is_running())
+        self.assertEqual(len(job.get_task("task1").datetimes), 5)
+        self.assertTrue(api.migrate("files")[0])
+        self.assertFalse((self.path / ShardStorage.folder_name).exists())
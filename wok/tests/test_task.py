@@ -1,6 +1,8 @@
+import random
 import unittest
 from datetime import datetime
 
+from wok.period import from_us, to_us
 from wok.task import Task
 
 
@@ -28,6 +30,11 @@ class TestTask(unittest.TestCase):
         res, _ = self.task.start(dt=now)
         self.assertFalse(res)
 
+    def test_start_now(self):
+        before = datetime.now()
+        self.task.start()
+        self.assertGreaterEqual(self.task.current_datetime, before)
+
     def test_end(self):
         res, _ = self.task.end()
         self.assertFalse(res)
@@ -52,9 +59,186 @@ class TestTask(unittest.TestCase):
             "2019-01-10T11:11:00.000000->2019-01-10T11:22:00.000000\nC:2019-01-10T11:23:00.000000",
         )
 
+    def test_intervals(self):
+        start = datetime(2019, 1, 10, 11, 11)
+        end = datetime(2019, 1, 10, 11, 22)
+        self.task.add_interval(start, end)
+        self.task.add_interval(end, datetime(2019, 1, 10, 12))
+        self.assertEqual(len(self.task.datetimes), 2)
+        self.assertEqual(self.task.datetimes[0], (start, end))
+        self.assertEqual(self.task.datetimes[-1][1], datetime(2019, 1, 10, 12))
+        self.assertEqual(self.task.get_total_duration().total_seconds(), 49 * 60)
+        self.assertFalse(hasattr(self.task, "__dict__"))
+
     def test_load(self):
         start = datetime(2019, 1, 10, 11, 11)
         end = datetime(2019, 1, 10, 11, 22)
         self.task.load(["2019-01-10T11:11:00.000000->2019-01-10T11:22:00.000000"])
         self.assertEqual(self.task.datetimes, [(start, end)])
         self.assertEqual(self.task.current_datetime, None)
+
+    def test_epoch_encoding(self):
+        start = datetime(2019, 1, 10, 11, 11, 0, 123456)
+        end = datetime(2019, 1, 10, 11, 22)
+        self.task.start(dt=start)
+        self.task.end(dt=end)
+        self.task.start(dt=end)
+        out = self.task.save(epoch=True)
+        self.assertEqual(out, "1547118660123456->1547119320000000\nC:1547119320000000")
+        # both encodings are read
+        task = Task("loaded")
+        task.load(out.split("\n") + ["2019-01-10T11:23:00.000000->1547119440000000"])
+        self.assertEqual(
+            task.datetimes,
+            [
+                (start, end),
+                (datetime(2019, 1, 10, 11, 23), datetime(2019, 1, 10, 11, 24)),
+            ],
+        )
+        self.assertEqual(task.current_datetime, end)
+
+    def test_sorted_overlap(self):
+        self.task.add_interval(datetime(2019, 1, 10, 14), datetime(2019, 1, 10, 15))
+        self.task.add_interval(datetime(2019, 1, 10, 9), datetime(2019, 1, 10, 10))
+        self.assertEqual(list(self.task.starts), sorted(self.task.starts))
+        res, _ = self.task.register_dates("2019-01-10T12:00:00", "2019-01-10T11:00:00")
+        self.assertFalse(res)
+        res, msg = self.task.register_dates(
+            "2019-01-10T09:30:00", "2019-01-10T11:00:00"
+        )
+        self.assertFalse(res)
+        self.assertIn("09:00", msg)
+        res, _ = self.task.register_dates("2019-01-10T11:00:00", "2019-01-10T12:00:00")
+        self.assertTrue(res)
+        self.assertEqual(len(self.task.datetimes), 3)
+        self.assertEqual(self.task.check(), [])
+        # merged with the intervals it overlaps or touches
+        res, _ = self.task.register_dates(
+            "2019-01-10T09:30:00", "2019-01-10T11:00:00", merge=True
+        )
+        self.assertTrue(res)
+        self.assertEqual(
+            self.task.datetimes,
+            [
+                (datetime(2019, 1, 10, 9), datetime(2019, 1, 10, 12)),
+                (datetime(2019, 1, 10, 14), datetime(2019, 1, 10, 15)),
+            ],
+        )
+        self.assertEqual(self.task.get_total_duration().total_seconds(), 4 * 3600)
+        # the running interval
+        self.task.start(dt=datetime(2019, 1, 10, 16))
+        self.assertFalse(self.task.end(dt=datetime(2019, 1, 10, 15))[0])
+        self.task.end(dt=datetime(2019, 1, 10, 17))
+        res, _ = self.task.register_dates("2019-01-10T14:30:00", "")
+        self.assertFalse(res)
+
+    def test_check_merge(self):
+        for start, end in ((9, 11), (8, 10), (12, 13), (11, 12)):
+            self.task.append_us(
+                to_us(datetime(2019, 1, 10, start)), to_us(datetime(2019, 1, 10, end))
+            )
+        self.assertEqual(list(self.task.starts), sorted(self.task.starts))
+        self.assertEqual(len(self.task.check()), 1)
+        self.assertEqual(self.task.merge_overlaps(), 3)
+        # the touching intervals are merged too
+        self.assertEqual(
+            self.task.datetimes, [(datetime(2019, 1, 10, 8), datetime(2019, 1, 10, 13))]
+        )
+        self.assertEqual(
+            self.task.closed_us, sum(self.task.ends) - sum(self.task.starts)
+        )
+        self.assertEqual(self.task.check(), [])
+        self.assertTrue(self.task.dirty)
+        self.assertEqual(self.task.pending, [])
+
+    def test_extend(self):
+        def us(*hours):
+            return [to_us(datetime(2019, 1, 10, h)) for h in hours]
+
+        self.task.extend_us(us(9, 13), us(10, 14))
+        self.task.start(dt=datetime(2019, 1, 10, 18))
+        # the overlapping intervals are refused, those imported twice included
+        refused = self.task.extend_us(us(11, 9, 12, 13, 17), us(12, 10, 13, 15, 19))
+        self.assertEqual(refused, list(zip(us(9, 13, 17), us(10, 15, 19))))
+        self.assertEqual(len(self.task.datetimes), 4)
+        self.assertEqual(self.task.closed_us, 4 * 3600000000)
+        self.assertEqual(self.task.check(), [])
+        # or merged, but never with the running one
+        refused = self.task.extend_us(us(12, 15), us(14, 19), merge=True)
+        self.assertEqual(refused, list(zip(us(15), us(19))))
+        self.assertEqual(
+            self.task.datetimes,
+            [
+                (datetime(2019, 1, 10, 9), datetime(2019, 1, 10, 10)),
+                (datetime(2019, 1, 10, 11), datetime(2019, 1, 10, 14)),
+            ],
+        )
+        self.assertIsNone(self.task.merge_us(*us(16, 19)))
+        self.assertEqual(self.task.check(), [])
+
+    def test_range(self):
+        rng = random.Random(0)
+        start = 0
+        for _ in range(200):
+            start += rng.randrange(1, 100)
+            end = start + rng.randrange(0, 100)
+            self.task.append_us(start, end)
+            start = end
+
+        def scan(since, until):
+            return sum(
+                max(0, min(end, until) - max(start, since))
+                for start, end in zip(self.task.starts, self.task.ends)
+            )
+
+        for _ in range(200):
+            since = rng.randrange(-10, start + 10)
+            until = since + rng.randrange(0, 2000)
+            self.assertEqual(self.task.get_range_us(since, until), scan(since, until))
+            if rng.random() < 0.1:
+                # the prefix sums follow the appends
+                self.task.append_us(start + 1, start + 5)
+                start += 5
+        self.assertEqual(self.task.get_range_us(None, None), self.task.closed_us)
+        # an empty range within a single interval
+        self.task.append_us(start + 10, start + 100)
+        start += 100
+        for since, until in ((start - 40, start - 60), (start - 50, start - 50)):
+            self.assertEqual(self.task.get_range_us(since, until), 0)
+        # overlapping intervals are scanned
+        self.task.append_us(2, 50)
+        self.assertEqual(self.task.get_range_us(0, 100), scan(0, 100))
+        self.assertEqual(self.task.get_range_us(40, 20), 0)
+        self.task.start(dt=from_us(start + 100))
+        self.assertEqual(
+            self.task.get_range_us(start, start + 200, now=start + 150),
+            50 + scan(start, start + 200),
+        )
+
+    def test_archive(self):
+        self.task.add_interval(datetime(2019, 1, 6, 22), datetime(2019, 1, 7, 2))
+        self.task.add_interval(datetime(2019, 1, 8, 9), datetime(2019, 1, 8, 10))
+        self.task.add_interval(datetime(2019, 1, 9, 23), datetime(2019, 1, 10, 1))
+        self.task.start(dt=datetime(2019, 1, 10, 8))
+        now = datetime(2019, 1, 10, 9)
+        weeks = dict(self.task.get_buckets("week"))
+        total = self.task.get_total_duration(now)
+        ranges = [
+            (datetime(2019, 1, d), datetime(2019, 1, d + 1)) for d in range(5, 11)
+        ]
+        durations = [self.task.get_range_duration(*r, now=now) for r in ranges]
+        self.assertEqual(self.task.archive_before(to_us(datetime(2019, 1, 10))), 3)
+        # the interval crossing the day is split
+        self.assertEqual(
+            self.task.datetimes, [(datetime(2019, 1, 10), datetime(2019, 1, 10, 1))]
+        )
+        self.assertEqual(self.task.archived_us, 6 * 3600000000)
+        loaded = Task("loaded")
+        loaded.load(self.task.save().split("\n"))
+        for task in (self.task, loaded):
+            self.assertEqual(task.get_total_duration(now), total)
+            self.assertEqual(task.get_buckets("week"), weeks)
+            self.assertEqual(
+                [task.get_range_duration(*r, now=now) for r in ranges], durations
+            )
+        self.assertEqual(self.task.archive_before(to_us(datetime(2019, 1, 9))), 0)
@@ -0,0 +1,45 @@
+import unittest
+from io import StringIO
+
+from wok import trace
+
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        self.enabled = trace.enabled
+        trace.totals.clear()
+
+    def tearDown(self):
+        trace.enabled = self.enabled
+        trace.totals.clear()
+
+    def test_disabled(self):
+        trace.enabled = False
+        with trace.span("phase"):
+            pass
+        self.assertIs(trace.span("phase"), trace.NO_SPAN)
+        self.assertEqual(trace.totals, {})
+
+    def test_spans(self):
+        trace.enable()
+
+        @trace.traced("inner")
+        def inner(x):
+            return x + 1
+
+        with trace.span("outer"):
+            self.assertEqual(inner(1), 2)
+            inner(2)
+        inner(3)
+        self.assertEqual(list(trace.totals), ["outer", "outer/inner", "inner"])
+        self.assertEqual(trace.totals["outer/inner"][0], 2)
+        self.assertGreaterEqual(
+            trace.totals["outer"][1], trace.totals["outer/inner"][1]
+        )
+        out = StringIO()
+        trace.report(out)
+        self.assertEqual(out.getvalue().split("\n")[2].split()[:2], ["inner", "2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,5 @@
+import json
+import tempfile
 import unittest
 from datetime import datetime
 from pathlib import Path
@@ -34,10 +36,10 @@ class TestWok(unittest.TestCase):
         task3 = Task("task3")
         wok1 = Wok()
         job1 = Job("job1")
-        wok1.jobs.append(job1)
+        wok1.add_job(job1)
         wok1.current_job_idx = 0
         job2 = Job("job2")
-        wok1.jobs.append(job2)
+        wok1.add_job(job2)
         job1.add_task(task1)
         job1.add_task(task2)
         job2.add_task(task3)
@@ -50,6 +52,131 @@ class TestWok(unittest.TestCase):
         out = (path / "job1" / "task1").read_text()
         self.assertEqual(out, "2019-01-10T11:11:00.000000->2019-01-10T11:22:00.000000")
 
+    def test_incremental_save(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / ".wok"
+            wok1 = Wok()
+            for name in ["job1", "job2"]:
+                job = Job(name)
+                job.add_task(Task("task1"))
+                job.add_task(Task("task2"))
+                wok1.add_job(job)
+            wok1.current_job_idx = 0
+            wok1.save(dir=path)
+            wok2 = Wok()
+            wok2.load(dir=path)
+            untouched = path / "job2" / "task1"
+            mtime = untouched.stat().st_mtime_ns
+            job1, job2 = wok2.jobs if wok2.jobs[0].name == "job1" else wok2.jobs[::-1]
+            self.assertFalse(job1.is_dirty())
+            job1.get_task("task1").start(dt=datetime(2019, 1, 10, 11, 11))
+            job1.rename_task(job1.get_task("task2"), "task3")
+            wok2.rename_job(job1, "job3")
+            job2.remove_task_name("task2")
+            wok2.current_job_idx = wok2.jobs.index(job2)
+            self.assertTrue(job1.is_dirty())
+            wok2.save(dir=path)
+            self.assertEqual(untouched.stat().st_mtime_ns, mtime)
+            self.assertEqual(
+                sorted(p.name for p in path.iterdir()), ["current_job", "job2", "job3"]
+            )
+            self.assertEqual(
+                sorted(p.name for p in (path / "job3").iterdir()), ["task1", "task3"]
+            )
+            self.assertFalse((path / "job2" / "task2").exists())
+            self.assertEqual((path / "current_job").read_text(), "job2")
+            self.assertEqual(
+                (path / "job3" / "task1").read_text(), "C:2019-01-10T11:11:00.000000"
+            )
+            wok2.remove_job(job1)
+            wok2.save(dir=path)
+            self.assertFalse((path / "job3").exists())
+
+    def test_lazy_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / ".wok"
+            wok1 = Wok()
+            for name in ["job1", "job2", "job3"]:
+                job = Job(name)
+                job.add_task(Task("task1"))
+                wok1.add_job(job)
+            wok1.current_job_idx = 1
+            wok1.save(dir=path)
+            wok2 = Wok()
+            wok2.load(dir=path)
+            self.assertFalse(any(job.is_loaded() for job in wok2.jobs))
+            current = wok2.jobs[wok2.current_job_idx]
+            current.tasks[0].start(dt=datetime(2019, 1, 10, 11, 11))
+            wok2.save(dir=path)
+            self.assertEqual([job.is_loaded() for job in wok2.jobs].count(True), 1)
+            job3 = next(job for job in wok2.jobs if job.name == "job3")
+            wok2.rename_job(job3, "job4")
+            wok2.save(dir=path)
+            wok3 = Wok()
+            wok3.load(dir=path)
+            self.assertEqual(
+                sorted(j.name for j in wok3.jobs if j.tasks[0].is_running()), ["job2"]
+            )
+            self.assertEqual(
+                sorted(j.name for j in wok3.jobs), ["job1", "job2", "job4"]
+            )
+
+    def test_job_index(self):
+        wok = Wok()
+        jobs = [Job(f"job{i}") for i in range(3)]
+        for job in jobs:
+            self.assertTrue(wok.add_job(job))
+        self.assertFalse(wok.add_job(Job("job1")))
+        wok.current_job = jobs[2]
+        wok.remove_job(jobs[0])
+        self.assertEqual(wok.current_job, jobs[2])
+        self.assertEqual(wok.current_job_idx, 1)
+        self.assertEqual(wok.get_job("job0"), None)
+        wok.rename_job(jobs[2], "job0")
+        self.assertEqual(wok.get_job("job0"), jobs[2])
+        self.assertEqual(wok.get_job("job2"), None)
+        wok.remove_job(jobs[2])
+        self.assertEqual(wok.current_job, None)
+        self.assertEqual(wok.current_job_idx, -1)
+
+    def test_report(self):
+        wok = Wok()
+        for name in ["job1", "job2"]:
+            job = Job(name)
+            task = Task("task")
+            task.add_interval(datetime(2020, 1, 31, 22), datetime(2020, 2, 1, 1))
+            job.add_task(task)
+            wok.add_job(job)
+        table = wok.report_table("month")
+        self.assertIn("2020-01", table)
+        self.assertIn("2020-02", table)
+        self.assertIn("04:00:00", table)
+        table = wok.report_table("day", since=datetime(2020, 2, 1))
+        self.assertNotIn("2020-01-31", table)
+        self.assertIn("2020-02-01", table)
+
+    def test_details(self):
+        wok = Wok()
+        for name in ["job1", "job2"]:
+            job = Job(name)
+            for task_name in ["task1", "task2"]:
+                task = Task(task_name)
+                task.add_interval(datetime(2020, 1, 1, 8), datetime(2020, 1, 1, 9))
+                job.add_task(task)
+            wok.add_job(job)
+        wok.current_job = wok.get_job("job2")
+        self.assertEqual(
+            list(wok.iter_details("plain", limit=3)),
+            ["job2.task1 01:00:00", "job2.task2 01:00:00", "job1.task1 01:00:00"],
+        )
+        lines = list(wok.iter_details("tsv"))
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[1], "job2\ttask1\tno\t01:00:00")
+        row = json.loads(next(wok.iter_details("jsonl")))
+        self.assertEqual(row["duration"], 3600)
+        self.assertEqual(len(list(wok.iter_details(limit=1))), 2)
+        self.assertIn("current job", wok.detailed_table())
+
     def tearDown(self):
         # print("tearing down test")
         pass
@@ -0,0 +1,92 @@
+"""Timing spans around the slow phases of wok commands.
+
+``with span("load"):`` or the traced("load") decorator adds the time spent in
+the block to the "load" phase, nested in the enclosing spans. Tracing is
+enabled by the WOK_TRACE environment variable or enable(), otherwise span
+returns a shared no-op context manager.
+"""
+import os
+import time
+from functools import wraps
+from typing import Callable, Dict, List, TextIO
+
+enabled: bool = os.environ.get("WOK_TRACE", "") != ""
+# [calls, seconds] by span path, in the order the spans were first entered
+totals: Dict[str, List[float]] = {}
+stack: List[str] = []
+
+
+class Span:
+    __slots__ = ("path", "begin")
+
+    def __init__(self, name: str):
+        self.path = name if len(stack) == 0 else stack[-1] + "/" + name
+
+    def __enter__(self) -> "Span":
+        stack.append(self.path)
+        totals.setdefault(self.path, [0, 0.0])
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        total = totals[self.path]
+        total[0] += 1
+        total[1] += time.perf_counter() - self.begin
+        stack.pop()
+
+
+class NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "NoSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NO_SPAN: NoSpan = NoSpan()
+
+
+def span(name: str):
+    """
+
+    :param name: The phase name
+    :return: a context manager timing its block when tracing is enabled
+
+    """
+    return Span(name) if enabled else NO_SPAN
+
+
+def traced(name: str) -> Callable:
+    """Decorator timing each call of a function as a span"""
+
+    def decorate(fun: Callable) -> Callable:
+        @wraps(fun)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fun(*args, **kwargs)
+            with Span(name):
+                return fun(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+
+def report(f: TextIO) -> None:
+    """Write the phases as an indented tree with their calls and total time
+
+    :param f: The file to write to
+
+    """
+    f.write(f"{'phase':<40} {'calls':>7} {'total (ms)':>11}\n")
+    for path, (calls, seconds) in totals.items():
+        depth = path.count("/")
+        name = "  " * depth + path.rsplit("/", 1)[-1]
+        f.write(f"{name:<40} {calls:>7} {seconds * 1000:>11.3f}\n")
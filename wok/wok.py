@@ -1,15 +1,21 @@
-import shutil
+import json
+from datetime import datetime, timedelta
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from tabulate import tabulate
 from wok.job import Job
+from wok.period import from_us, period_label, period_start, split_us, to_us
+from wok.storage import Storage, open_storage
 from wok.task import Task
+from wok.trace import traced
+
+DETAIL_FORMATS: Tuple[str, ...] = ("grid", "plain", "tsv", "jsonl")
 
 
 class Wok:
     """The Work Kounter main object.
-    It has a jobs list and a current_job_idx index.
+    It has a jobs tuple, indexed by name, and a current_job.
     It defines default_dir to $HOME/.wok
 
 
@@ -18,94 +24,168 @@ class Wok:
     default_dir: Path = Path.home() / ".wok"
 
     def __init__(self):
-        self.jobs: List[Job] = []
-        self.current_job_idx: int = -1
+        self.__jobs: Tuple[Job, ...] = ()
+        # jobs by name, kept up to date by add_job, remove_job and rename_job
+        self.__by_name: Dict[str, Job] = {}
+        self.current_job: Optional[Job] = None
+        # storage state used to only save what changed
+        self.source: Optional[Storage] = None
+        self.saved_current_job: Optional[str] = None
+        self.removed_jobs: List[str] = []
+
+    @property
+    def jobs(self) -> Tuple[Job, ...]:
+        """The jobs, a tuple only changed by add_job and remove_job so that the
+        index by name cannot go stale"""
+        return self.__jobs
+
+    def __index(self) -> Dict[str, Job]:
+        return self.__by_name
+
+    @property
+    def current_job_idx(self) -> int:
+        """Index of the current job in jobs, -1 if there is none"""
+        if self.current_job is None:
+            return -1
+        return self.jobs.index(self.current_job)
 
-    @staticmethod
-    def check_dir(dir: Path) -> bool:
-        if dir.exists() and not dir.is_dir():
-            print(f"ERROR: {dir} exists and is not a dir!")
+    @current_job_idx.setter
+    def current_job_idx(self, idx: int) -> None:
+        self.current_job = None if idx == -1 else self.jobs[idx]
+
+    def get_job(self, name: str) -> Optional[Job]:
+        return self.__index().get(name)
+
+    def add_job(self, job: Job) -> bool:
+        index = self.__index()
+        if job.name in index:
             return False
-        if not dir.exists():
-            dir.mkdir()
+        self.__jobs += (job,)
+        index[job.name] = job
         return True
 
-    def load(self, dir: Path = default_dir) -> Tuple[bool, str]:
+    def remove_job(self, job: Job) -> None:
+        index = self.__index()
+        self.__jobs = tuple(j for j in self.__jobs if j is not job)
+        del index[job.name]
+        if job is self.current_job:
+            self.current_job = None
+        if job.saved_name is not None:
+            self.removed_jobs.append(job.saved_name)
+
+    def rename_job(self, job: Job, name: str) -> None:
+        index = self.__index()
+        del index[job.name]
+        job.name = name
+        index[name] = job
+
+    def get_current_job_name(self) -> Optional[str]:
+        if self.current_job is None:
+            return None
+        return self.current_job.name
+
+    def set_current_job(self, name: Optional[str]) -> None:
+        self.current_job = None if name is None else self.get_job(name)
+
+    def load(self, dir: Path = default_dir, workers: int = 0) -> Tuple[bool, str]:
         """Load the WoK from the dir folder
 
+        Only the job names are read, the tasks of a job are loaded the first
+        time they are accessed.
+
         :param dir: Default value = default_dir
+        :param workers: Default value = 0, with more than one load_all reads the
+            task files with that many threads (see FileStorage)
         :return: True if success + message
         :rtype: boolean, string
 
         """
-        if not Wok.check_dir(dir):
-            return False, "Could not load (see previous error)"
-        # Now dir exists and is a directory
-        current_job_name = None
-        try:
-            current_job_file = [
-                x for x in dir.iterdir() if not x.is_dir() and x.name == "current_job"
-            ][0]
-            current_job_name = current_job_file.read_text().strip()
-        except IndexError:
-            pass
-        for job_file in [x for x in dir.iterdir() if x.is_dir()]:
-            job = Job(job_file.name)
-            for task_file in job_file.iterdir():
-                task = Task(task_file.name)
-                task.load(task_file.read_text().split("\n"))
-                job.add_task(task)
-            self.jobs.append(job)
-            if job.name == current_job_name:
-                self.current_job_idx = len(self.jobs) - 1
-        return True, "Loaded successfully"
+        return open_storage(dir, workers=workers).load(self)
 
     def save(self, dir=default_dir) -> Tuple[bool, str]:
         """Save the WoK to the dir folder
 
+        Only the jobs and tasks modified since the last load or save are
+        written when saving to the folder the WoK was loaded from. Anything
+        else triggers a full rewrite.
+
         :param dir: Default value = default_dir)
         :return: True if success + message
         :rtype: boolean, string
 
         """
-        if dir.exists():
-            shutil.rmtree(dir)
-        if not Wok.check_dir(dir):
-            return False, "Could not load (see previous error)"
-        for i, job in enumerate(self.jobs):
-            if i == self.current_job_idx:
-                (dir / "current_job").write_text(job.name)
-            job_dir = dir / job.name
-            try:
-                job_dir.mkdir()
-            except FileExistsError:
-                [f.unlink() for f in job_dir.iterdir()]
+        storage = self.source
+        if storage is None or storage.dir != dir:
+            storage = open_storage(dir)
+        return storage.save(self)
+
+    def load_all(self) -> None:
+        """Load the tasks of all the jobs, read ahead by the storage if it can
+        (see Storage.prefetch)"""
+        if self.source is not None:
+            self.source.prefetch(self)
+        for job in self.jobs:
+            job.tasks
+
+    def is_dirty(self) -> bool:
+        """True when some changes are not saved"""
+        return (
+            len(self.removed_jobs) > 0
+            or self.get_current_job_name() != self.saved_current_job
+            or any(job.is_dirty() for job in self.jobs)
+        )
+
+    def mark_unsaved(self) -> None:
+        """Forget what was saved so that the next save writes everything"""
+        self.load_all()
+        for job in self.jobs:
+            job.saved_name = None
+            job.removed_tasks.clear()
             for task in job.tasks:
-                (job_dir / task.name).write_text(task.save())
-        return True, "Loaded successfully"
+                task.saved_name = None
+                task.dirty = True
+                task.rewrite = True
+                task.pending.clear()
+                task.journal_gen = 0
+        self.removed_jobs.clear()
+        self.saved_current_job = None
+        self.source = None
 
     def detailed_table(self) -> str:
-        out = tabulate([["***** Wok details *****"]], tablefmt="fancy_grid")
-        out += "\n"
-        if self.current_job_idx != -1:
-            out += self.jobs[self.current_job_idx].detailed_table(
-                title="current job",
-                suffix=[
-                    [
-                        "detailed tasks",
-                        "\n".join(
-                            [
-                                task.detailed_table(time=False)
-                                for task in self.jobs[self.current_job_idx].tasks
-                            ]
-                        ),
-                    ]
-                ],
+        return "".join(table + "\n" for table in self.iter_details())
+
+    def iter_details(self, format: str = "grid", limit: int = None) -> Iterator[str]:
+        """Render the details job by job, the current job first, so that the
+        output can be printed as it is produced.
+
+        The grid format nests the job and task tables, the other formats give a
+        line per task: plain 'job.task duration [running]', tsv with a header
+        line, or jsonl with the duration in seconds.
+
+        :param format: Default value = "grid", one of DETAIL_FORMATS
+        :param limit: Default value = None, maximum number of jobs (grid) or
+            tasks (other formats) to render
+        :return: the output chunks, without trailing new lines
+        :rtype: iterator
+
+        """
+        if format not in DETAIL_FORMATS:
+            raise ValueError(f"Unknown format '{format}'")
+        if limit is None:
+            self.load_all()
+        jobs = self.jobs
+        if self.current_job is not None:
+            jobs = chain(
+                [self.current_job], (j for j in self.jobs if j is not self.current_job)
             )
-            out += "\n"
-        for i, job in enumerate(self.jobs):
-            if i != self.current_job_idx:
-                out += job.detailed_table(
+        if format == "grid":
+            # only loaded when rendering tables, it is slow to import
+            from tabulate import tabulate
+
+            yield tabulate([["***** Wok details *****"]], tablefmt="fancy_grid")
+            for job in islice(jobs, limit):
+                yield job.detailed_table(
+                    title="current job" if job is self.current_job else "Job",
                     suffix=[
                         [
                             "detailed tasks",
@@ -115,5 +195,78 @@ class Wok:
                         ]
                     ],
                 )
-                out += "\n"
-        return out
+            return
+        if format == "tsv":
+            yield "job\ttask\trunning\tduration"
+        now = datetime.now()
+        rows = ((job, task) for job in jobs for task in job.tasks)
+        for job, task in islice(rows, limit):
+            duration = task.get_total_duration(now)
+            if format == "jsonl":
+                yield json.dumps(
+                    {
+                        "job": job.name,
+                        "task": task.name,
+                        "running": task.is_running(),
+                        "duration": duration.total_seconds(),
+                    }
+                )
+            elif format == "tsv":
+                running = "yes" if task.is_running() else "no"
+                yield (
+                    f"{job.name}\t{task.name}\t{running}\t"
+                    + Task.duration_to_str(duration)
+                )
+            else:
+                yield f"{job.name}.{task.name} {Task.duration_to_str(duration)}" + (
+                    " running" if task.is_running() else ""
+                )
+
+    @traced("render")
+    def report_table(
+        self, by: str, since: datetime = None, until: datetime = None
+    ) -> str:
+        """Table of the durations by period and job
+
+        :param by: One of period.PERIODS
+        :param since: Default value = None, first date to report
+        :param until: Default value = None, last date to report
+        :return: The table
+        :rtype: string
+
+        """
+        from tabulate import tabulate
+
+        self.load_all()
+        now = datetime.now()
+        first = None if since is None else to_us(period_start(since, by))
+        last = None if until is None else to_us(until)
+        totals: Dict[int, Dict[str, int]] = {}
+        for job in self.jobs:
+            for task in job.tasks:
+                periods = task.get_buckets(by).items()
+                if task.is_running():
+                    periods = chain(
+                        periods, split_us(to_us(task.current_datetime), to_us(now), by)
+                    )
+                for period, duration in periods:
+                    if (first is None or period >= first) and (
+                        last is None or period <= last
+                    ):
+                        durations = totals.setdefault(period, {})
+                        durations[job.name] = durations.get(job.name, 0) + duration
+        jobs = [
+            job.name
+            for job in self.jobs
+            if any(job.name in durations for durations in totals.values())
+        ]
+        rows = [
+            [period_label(from_us(period), by)]
+            + [
+                Task.duration_to_str(timedelta(0, 0, totals[period].get(job, 0)))
+                for job in jobs
+            ]
+            + [Task.duration_to_str(timedelta(0, 0, sum(totals[period].values())))]
+            for period in sorted(totals)
+        ]
+        return tabulate(rows, [by] + jobs + ["total"], tablefmt="fancy_grid")
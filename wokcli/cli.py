@@ -0,0 +1,634 @@
+import json
+import os
+import sys
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from typing import List
+
+from wok.api import WokApi
+from wok.bulk import FORMATS, guess_format
+from wok.period import PERIODS
+from wok.trace import span
+from wok.wok import DETAIL_FORMATS
+from wokcli.client import request
+
+
+class WokCli:
+    def __init__(self, argv: List[str] = None, api: WokApi = None):
+        """Run the command line argv
+
+        :param argv: Default value = None, sys.argv
+        :param api: Default value = None, a WokApi loaded from Wok.default_dir
+
+        """
+        self.argv = sys.argv if argv is None else argv
+        load = api is None
+        if api is None:
+            api = WokApi(
+                journal="WOK_JOURNAL" in os.environ,
+                epoch="WOK_EPOCH" in os.environ,
+                workers=int(os.environ.get("WOK_WORKERS", "0")),
+            )
+        self.api = api
+        self.save = False
+        command = self.argv[1] if len(self.argv) > 1 else "status"
+        # from the load to the save, other wok processes wait
+        with self.api.lock(exclusive=command not in WokCli.read_only):
+            if load:
+                self.api.load()
+            if command != "daemon":
+                try:
+                    self.run()
+                    if self.save:
+                        self.api.save()
+                finally:
+                    if not load and self.api.wok.is_dirty():
+                        # run by the daemon, forget the changes left unsaved
+                        # as the process running the command would
+                        self.api.reload()
+        if command == "daemon":
+            # serves until stopped, each command it runs takes the lock
+            self.run()
+
+    commands: List[str] = [
+        "status",
+        "prompt",
+        "switch",
+        "job",
+        "task",
+        "end",
+        "start",
+        "details",
+        "report",
+        "time",
+        "stats",
+        "check",
+        "archive",
+        "merge-report",
+        "batch",
+        "import",
+        "export",
+        "migrate",
+        "daemon",
+    ]
+
+    # the commands only reading, run under a shared lock
+    read_only: List[str] = [
+        "status",
+        "prompt",
+        "details",
+        "report",
+        "time",
+        "stats",
+        "merge-report",
+        "export",
+    ]
+
+    def run(self):
+        command = self.argv[1] if len(self.argv) > 1 else "status"
+        if command not in WokCli.commands:
+            # only build the main parser for help and errors
+            parser = ArgumentParser(
+                epilog="""Available commands are:
+* status  : display current job and running task(s)
+* prompt  : display a short status for shell prompts
+* switch  : switch between jobs
+* job     : handle jobs (list, create, delete, ...)
+* task    : handle tasks (list, create, delete, ...)
+* end     : suspend a task or all running tasks if any
+* start   : start the given task (can be prefixed by job name 'job.task')
+* details : display details of all jobs and tasks (tables, plain, tsv, jsonl)
+* report  : display the time spent by day, week, month or year
+* time    : display the time spent between two dates on a job or a task
+* stats   : display session lengths, an hour of week heatmap and percentiles
+* check   : find the overlapping intervals and optionally merge them
+* archive : keep the old intervals as daily totals only
+* merge-report : display the time spent by several people, one wok folder each
+* batch   : apply many operations read from a file or stdin and save once
+* import  : import intervals from CSV or JSON Lines records
+* export  : export intervals as CSV or JSON Lines records
+* migrate : move the data to another storage backend
+* daemon  : keep wok loaded and run the commands of the other wok processes
+See 'wok <command> --help' for more help on each command""",
+                formatter_class=RawDescriptionHelpFormatter,
+            )
+            parser.add_argument(
+                "command", choices=WokCli.commands, nargs="?", default="status"
+            )
+            command = parser.parse_args(self.argv[1:2]).command
+        # Invoke method with command name, import is a keyword
+        with span(command):
+            if command == "import":
+                self.import_()
+            else:
+                getattr(self, command.replace("-", "_"))()
+
+    def status(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " status",
+            description="Display current job and running task(s)",
+        )
+        parser.parse_args(self.argv[2:])
+        res, out = self.api.status()
+        if res:
+            print(out)
+        # next time, wokcli.main displays it from the status file alone
+        self.api.update_status()
+
+    def prompt(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " prompt",
+            description="Display 'job' or 'job:task1,task2' when tasks are "
+            + "running, for shell prompts",
+        )
+        parser.parse_args(self.argv[2:])
+        _, out = self.api.prompt()
+        print(out)
+        self.api.update_status()
+
+    def switch(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " switch", description="Switch to a job"
+        )
+        parser.add_argument("job", help="the job to switch to")
+        parser.add_argument(
+            "-c",
+            "--create",
+            action="store_true",
+            help="Create the job if it does not exist",
+        )
+        args = parser.parse_args(self.argv[2:])
+        self.save, out = self.api.switch(args.job, create=args.create)
+        print(out)
+
+    def start(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " start", description="Start a task"
+        )
+        parser.add_argument(
+            "path",
+            help="the task to start, can be prefixed by the job as 'job.task'",
+            nargs="*",
+        )
+        parser.add_argument(
+            "-c",
+            "--create",
+            action="store_true",
+            help="Create the task if it does not exist",
+        )
+        args = parser.parse_args(self.argv[2:])
+        for path in args.path:
+            started, out = self.api.start(path, create=args.create)
+            if started:
+                # One task started might be False but save must stay True
+                self.save = True
+            print(out)
+
+    def end(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " end",
+            description="Suspend a task or all running tasks if any",
+        )
+        parser.add_argument(
+            "path",
+            help="the task to end, can be prefixed by the job as 'job.task'",
+            nargs="*",
+        )
+        args = parser.parse_args(self.argv[2:])
+        if len(args.path) == 0:
+            self.save, out = self.api.suspend()
+            print(out)
+        else:
+            for path in args.path:
+                res, msg = self.api.end(path)
+                if res:
+                    # One task res might be False but save must stay True
+                    self.save = True
+                print(msg)
+
+    def __check_args_nb(self, li, fun):
+        if not fun(len(li)):
+            print("Incorrect number of arguments")
+            return False
+        return True
+
+    def job(self):
+        description = "Handle jobs\n\n"
+        description += "Examples:\n"
+        description += (
+            f"\t- '{self.argv[0]} job my_job' : display info about 'my_job'\n"
+        )
+        description += f"\t- '{self.argv[0]} job --create my_other_job'\n"
+        description += f"\t- '{self.argv[0]} job --rename my_other_job my_newer_job'"
+        parser = ArgumentParser(
+            prog=self.argv[0] + " job",
+            description=description,
+            formatter_class=RawDescriptionHelpFormatter,
+        )
+        parser.add_argument(
+            "-t",
+            "--table",
+            action="store_true",
+            help="Display jobs details in table format",
+        )
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            "-c", "--create", action="store_true", help="Create a job",
+        )
+        group.add_argument(
+            "-d",
+            "--delete",
+            action="store_true",
+            help="Delete the specified job and all its tasks",
+        )
+        group.add_argument(
+            "-r", "--rename", action="store_true", help="Rename the specified job"
+        )
+        group.add_argument(
+            "-l", "--list", action="store_true", help="List all existing jobs"
+        )
+        parser.add_argument("job", nargs="*", help="The job(s) to handle")
+        args = parser.parse_args(self.argv[2:])
+        if args.create:
+            if not self.__check_args_nb(args.job, lambda x: x > 0):
+                return
+            for job in args.job:
+                res, msg = self.api.add_job(job)
+                if res:
+                    # One job res might be False but save must stay True
+                    self.save = True
+                print(msg)
+        elif args.delete:
+            if not self.__check_args_nb(args.job, lambda x: x == 1):
+                return
+            self.save, out = self.api.delete_job(args.job[0])
+            print(out)
+        elif args.rename:
+            if not self.__check_args_nb(args.job, lambda x: x == 2):
+                return
+            self.save, out = self.api.rename_job(*args.job[:2])
+            print(out)
+        elif len(args.job) == 0 or args.list:
+            _, out = self.api.list_jobs()
+            print(out)
+        else:
+            for job in args.job:
+                _, out = self.api.get_job_details(job, table=args.table)
+                print(out)
+
+    def task(self):
+        description = "Handle tasks\n\n"
+        description += "Examples:\n"
+        description += (
+            f"\t- '{self.argv[0]} task my_task' : display info about 'my_task'\n"
+        )
+        description += f"\t- '{self.argv[0]} task --create my_other_task'\n"
+        description += f"\t- '{self.argv[0]} task --rename my_other_task my_newer_task'"
+        parser = ArgumentParser(
+            prog=self.argv[0] + " task",
+            description=description,
+            formatter_class=RawDescriptionHelpFormatter,
+        )
+        parser.add_argument(
+            "-t",
+            "--table",
+            action="store_true",
+            help="Display tasks details in table format",
+        )
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            "-c",
+            "--create",
+            action="store_true",
+            help="Create a task in the current job",
+        )
+        group.add_argument(
+            "-d", "--delete", action="store_true", help="Delete the specified task",
+        )
+        group.add_argument(
+            "-r", "--rename", action="store_true", help="Rename the specified task"
+        )
+        group.add_argument(
+            "-l",
+            "--list",
+            action="store_true",
+            help="List all existing tasks in the current job",
+        )
+        group.add_argument(
+            "--register",
+            help="""Register starting and/or ending dates for the given task.
+Examples: "2020-01-01T09:10:11.123456->12:34", "12:34:56", "->01:02", ...""",
+        )
+        parser.add_argument(
+            "-m",
+            "--merge",
+            action="store_true",
+            help="Merge a registered interval with those it overlaps",
+        )
+        parser.add_argument(
+            "-s", "--short", action="store_true", help="Do not display previous times"
+        )
+        parser.add_argument(
+            "path",
+            help="the task(s) to handle, can be prefixed by the job as 'job.task'",
+            nargs="*",
+        )
+        args = parser.parse_args(self.argv[2:])
+        if args.create:
+            if not self.__check_args_nb(args.path, lambda x: x > 0):
+                return
+            for path in args.path:
+                res, msg = self.api.add_task(path)
+                if res:
+                    # One path res might be False but save must stay True
+                    self.save = True
+                print(msg)
+        elif args.delete:
+            if not self.__check_args_nb(args.path, lambda x: x == 1):
+                return
+            self.save, out = self.api.delete_task(args.path[0])
+            print(out)
+        elif args.rename:
+            if not self.__check_args_nb(args.path, lambda x: x == 2):
+                return
+            self.save, out = self.api.rename_task(*args.path[:2])
+            print(out)
+        elif args.register is not None:
+            if not self.__check_args_nb(args.path, lambda x: x == 1):
+                return
+            if "->" not in args.register:
+                start, end = args.register, None
+            else:
+                start, end = args.register.split("->")
+            self.save, out = self.api.register_task(
+                args.path[0], start, end, merge=args.merge
+            )
+            print(out)
+        elif len(args.path) == 0 or args.list:
+            _, out = self.api.list_current_job_tasks()
+            print(out)
+
+        else:
+            for path in args.path:
+                _, out = self.api.get_task_details(
+                    path, table=args.table, time=not args.short
+                )
+                print(out)
+
+    def details(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " details",
+            description="Display detailed tables of all jobs and tasks",
+        )
+        parser.add_argument(
+            "-f",
+            "--format",
+            choices=DETAIL_FORMATS,
+            default="grid",
+            help="'grid' for nested tables, 'plain', 'tsv' or 'jsonl' for a line "
+            + "per task, which is faster on large workspaces",
+        )
+        parser.add_argument(
+            "-n",
+            "--limit",
+            type=int,
+            help="only display the first LIMIT jobs (grid) or tasks (other formats)",
+        )
+        args = parser.parse_args(self.argv[2:])
+        _, out = self.api.iter_details(args.format, args.limit)
+        try:
+            for chunk in out:
+                print(chunk)
+        except BrokenPipeError:
+            # the reader (head, a pager) is gone, stop quietly
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+    def report(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " report",
+            description="Display the time spent on each job by period",
+        )
+        parser.add_argument(
+            "-b", "--by", choices=PERIODS, default="week", help="the period"
+        )
+        parser.add_argument("-s", "--since", help="first date, as YYYY-MM-DD")
+        parser.add_argument("-u", "--until", help="last date, as YYYY-MM-DD")
+        args = parser.parse_args(self.argv[2:])
+        _, out = self.api.report(args.by, args.since, args.until)
+        print(out)
+
+    def time(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " time",
+            description="Display the time spent between two dates",
+        )
+        parser.add_argument("-s", "--since", help="first date, as YYYY-MM-DD")
+        parser.add_argument("-u", "--until", help="last date, as YYYY-MM-DD")
+        parser.add_argument(
+            "path", nargs="?", help="a job or a task as 'job.task', all jobs if none"
+        )
+        args = parser.parse_args(self.argv[2:])
+        _, out = self.api.time(args.path, args.since, args.until)
+        print(out)
+
+    def stats(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " stats",
+            description="Display the distribution of the session lengths, the "
+            + "time spent by hour of the week and the session length percentiles "
+            + "of each job, computed with NumPy if it is installed",
+        )
+        parser.add_argument(
+            "--no-numpy",
+            action="store_true",
+            help="compute them with the pure Python loop",
+        )
+        args = parser.parse_args(self.argv[2:])
+        _, out = self.api.stats(vectorized=False if args.no_numpy else None)
+        print(out)
+
+    def check(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " check",
+            description="Find the intervals ending before they start or overlapping "
+            + "another one of the same task",
+        )
+        parser.add_argument(
+            "-m",
+            "--merge",
+            action="store_true",
+            help="merge the overlapping and touching intervals",
+        )
+        args = parser.parse_args(self.argv[2:])
+        _, out = self.api.check(merge=args.merge)
+        self.save = args.merge
+        print(out)
+
+    def archive(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " archive",
+            description="Move the intervals before a date out of the task files "
+            + "into compressed daily totals, totals and reports are unchanged",
+        )
+        parser.add_argument(
+            "-b",
+            "--before",
+            required=True,
+            help="first date kept as intervals, as YYYY-MM-DD",
+        )
+        args = parser.parse_args(self.argv[2:])
+        self.save, out = self.api.archive(args.before)
+        print(out)
+
+    def merge_report(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " merge-report",
+            description="Display the time spent by several people between two "
+            + "dates, merging the intervals of their wok folders in a single pass, "
+            + "and the overlapping intervals of each task",
+        )
+        parser.add_argument("-s", "--since", help="first date, as YYYY-MM-DD")
+        parser.add_argument("-u", "--until", help="last date, as YYYY-MM-DD")
+        parser.add_argument(
+            "dirs",
+            nargs="+",
+            metavar="DIR",
+            help="a wok folder, as DIR or NAME=DIR, the person being named after "
+            + "DIR or after its parent for a hidden folder as ~/.wok",
+        )
+        args = parser.parse_args(self.argv[2:])
+        _, out = WokApi.merge_report(args.dirs, args.since, args.until)
+        print(out)
+
+    def batch(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " batch",
+            description="Apply many operations, a line each, and save once. A line "
+            + "is a JSON object such as "
+            + '{"op": "start", "path": "job.task", "create": true} or the same '
+            + "as 'start job.task create=true'. The operations are: "
+            + ", ".join(WokApi.batch_ops),
+        )
+        parser.add_argument(
+            "file", nargs="?", default="-", help="the operations, default to stdin"
+        )
+        parser.add_argument(
+            "-a",
+            "--atomic",
+            action="store_true",
+            help="stop at the first failure and save nothing",
+        )
+        parser.add_argument(
+            "-j", "--json", action="store_true", help="print the results as JSON"
+        )
+        args = parser.parse_args(self.argv[2:])
+        f = sys.stdin if args.file == "-" else open(args.file)
+        with f:
+            lines = [
+                (i, line)
+                for i, line in enumerate(f, 1)
+                if line.strip() != "" and not line.lstrip().startswith("#")
+            ]
+        res, results = self.api.apply_batch(
+            (line for _, line in lines), atomic=args.atomic
+        )
+        for (i, _), (ok, msg) in zip(lines, results):
+            if args.json:
+                print(json.dumps({"line": i, "ok": ok, "message": msg}))
+            else:
+                print(f"{i}: {'ok' if ok else 'FAILED'}: {msg}")
+        if args.atomic and not res and not args.json:
+            print("Nothing saved")
+        self.save = any(ok for ok, _ in results) and (res or not args.atomic)
+
+    def import_(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " import",
+            description="Import intervals from a CSV file with a job,task,start,end "
+            + "header or a JSON Lines file with these keys, creating the missing jobs "
+            + "and tasks. Dates are ISO 8601 dates or microseconds since 1970-01-01.",
+        )
+        parser.add_argument("file", help="the file to read, '-' for stdin")
+        parser.add_argument(
+            "-f",
+            "--format",
+            choices=FORMATS,
+            help="default to jsonl for .jsonl and .json files, csv otherwise",
+        )
+        parser.add_argument(
+            "-m",
+            "--merge",
+            action="store_true",
+            help="merge the intervals overlapping another one instead of skipping them",
+        )
+        args = parser.parse_args(self.argv[2:])
+        format = args.format or guess_format(args.file)
+        f = sys.stdin if args.file == "-" else open(args.file, newline="")
+        with f:
+            res, out = self.api.import_intervals(f, format, args.merge)
+        # the valid records are kept
+        self.save = True
+        print(out)
+
+    def export(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " export",
+            description="Export the intervals as CSV or JSON Lines records "
+            + "(see 'wok import')",
+        )
+        parser.add_argument(
+            "file", nargs="?", default="-", help="the file to write, default to stdout"
+        )
+        parser.add_argument(
+            "-f",
+            "--format",
+            choices=FORMATS,
+            help="default to jsonl for .jsonl and .json files, csv otherwise",
+        )
+        parser.add_argument("-s", "--since", help="first date, as YYYY-MM-DD")
+        parser.add_argument("-u", "--until", help="last date, as YYYY-MM-DD")
+        args = parser.parse_args(self.argv[2:])
+        format = args.format or guess_format(args.file)
+        if args.file == "-":
+            res, out = self.api.export_intervals(
+                sys.stdout, format, args.since, args.until
+            )
+            if not res:
+                print(out, file=sys.stderr)
+            return
+        with open(args.file, "w", newline="") as f:
+            res, out = self.api.export_intervals(f, format, args.since, args.until)
+        print(out)
+
+    def migrate(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " migrate",
+            description="Move the data to another storage backend",
+        )
+        parser.add_argument(
+            "backend",
+            choices=["files", "sqlite", "shards"],
+            help="'files' for a folder per job and a file per task, "
+            + "'sqlite' for a SQLite database, "
+            + "'shards' for a folder per task and a file per month",
+        )
+        args = parser.parse_args(self.argv[2:])
+        _, out = self.api.migrate(args.backend)
+        print(out)
+
+    def daemon(self):
+        parser = ArgumentParser(
+            prog=self.argv[0] + " daemon",
+            description="Keep wok loaded and run the commands of the other wok "
+            + "processes, which fall back to running them when no daemon is running",
+        )
+        parser.add_argument(
+            "--stop", action="store_true", help="stop the running daemon"
+        )
+        args = parser.parse_args(self.argv[2:])
+        if args.stop:
+            res = request(self.api.dir, {"stop": True}) is not None
+            print("Daemon stopped" if res else "No daemon running")
+        else:
+            from wokcli.daemon import serve
+
+            serve(self.api, lambda argv: WokCli(argv, self.api))
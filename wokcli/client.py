@@ -0,0 +1,36 @@
+import json
+import socket
+from pathlib import Path
+from typing import Optional
+
+# Only depends on the standard library so that commands are forwarded to the
+# daemon without importing the rest of wok.
+SOCKET_NAME: str = ".daemon.sock"
+
+
+def request(dir: Path, message: dict) -> Optional[dict]:
+    """Send a message to the daemon listening in dir
+
+    The messages are {"argv": [...], "cwd": str, "stdin": str} to run a command,
+    where cwd and stdin are optional, {"ping": true} and {"stop": true}. The
+    responses are {"out": str, "err": str, "code": int}.
+
+    :param dir: The wok folder
+    :param message: The message to send
+    :return: the response, None if no daemon is running
+    :rtype: dict
+
+    """
+    path = dir / SOCKET_NAME
+    if not path.exists():
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(path))
+            sock.sendall(json.dumps(message).encode())
+            sock.shutdown(socket.SHUT_WR)
+            data = b"".join(iter(lambda: sock.recv(65536), b""))
+        return json.loads(data)
+    except (OSError, ValueError):
+        # stale socket or daemon stopped while answering
+        return None
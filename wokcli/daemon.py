@@ -0,0 +1,98 @@
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from typing import Callable, List
+
+from wok.api import WokApi
+from wokcli.client import SOCKET_NAME, request
+
+
+def execute(api: WokApi, run: Callable[[List[str]], None], message: dict) -> dict:
+    """Run a command with its input and output redirected
+
+    :param api: The loaded api the command runs on
+    :param run: Runs a command line on api
+    :param message: The command (see client.request)
+    :return: the response to send (see client.request)
+    :rtype: dict
+
+    """
+    out, err = StringIO(), StringIO()
+    code = 0
+    stdin = sys.stdin
+    sys.stdin = StringIO(message.get("stdin") or "")
+    cwd = os.getcwd()
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            # relative paths given to the command are the client's
+            os.chdir(message.get("cwd", cwd))
+            run(message["argv"])
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+            # the command may have stopped halfway, forget its changes
+            api.reload()
+        finally:
+            sys.stdin = stdin
+            os.chdir(cwd)
+    return {"out": out.getvalue(), "err": err.getvalue(), "code": code}
+
+
+def serve(api: WokApi, run: Callable[[List[str]], None]) -> None:
+    """Keep api loaded and run the commands received on the socket of its
+    folder, one at a time, until stopped.
+
+    :param api: The loaded api
+    :param run: Runs a command line on api, saving it if needed
+
+    """
+    if request(api.dir, {"ping": True}) is not None:
+        print("A daemon is already running")
+        return
+    path = api.dir / SOCKET_NAME
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    if threading.current_thread() is threading.main_thread():
+        # exit through the finally clause below
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(path))
+        server.listen()
+        print(f"Listening on {path}", flush=True)
+        try:
+            while True:
+                conn, _ = server.accept()
+                with conn:
+                    conn.settimeout(5)
+                    try:
+                        data = b"".join(iter(lambda: conn.recv(65536), b""))
+                        message = json.loads(data)
+                    except (OSError, ValueError):
+                        continue
+                    if "argv" in message:
+                        response = execute(api, run, message)
+                    else:
+                        response = {"out": "", "err": "", "code": 0}
+                    try:
+                        conn.sendall(json.dumps(response).encode())
+                    except OSError:
+                        pass
+                    if message.get("stop"):
+                        break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
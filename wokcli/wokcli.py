@@ -1,280 +1,84 @@
+import os
 import sys
-from argparse import ArgumentParser, RawDescriptionHelpFormatter
 
-from wok.api import WokApi
+from wok.status import fast_status
+
+
+def run(args, forward: bool = True):
+    # same folder as Wok.default_dir
+    dir = os.path.join(os.path.expanduser("~"), ".wok")
+    # status and prompt are displayed from the status file alone when it exists,
+    # without parsing arguments nor loading the jobs
+    if len(args) == 0 or (len(args) == 1 and args[0] in ["status", "prompt"]):
+        if fast_status(dir, prompt=args == ["prompt"]):
+            return
+    from io import StringIO
+    from pathlib import Path
+
+    from wok.trace import span
+    from wokcli.client import SOCKET_NAME, request
+
+    if forward and args[:1] != ["daemon"]:
+        message = {"argv": sys.argv, "cwd": os.getcwd()}
+        files = [arg for arg in args[1:] if not arg.startswith("-")]
+        if (
+            args[:1] in [["batch"], ["import"]]
+            and (files == [] or "-" in args)
+            and os.path.exists(os.path.join(dir, SOCKET_NAME))
+        ):
+            # the daemon cannot read the stdin of this process
+            message["stdin"] = sys.stdin.read()
+        response = request(Path(dir), message)
+        if response is not None:
+            sys.stdout.write(response["out"])
+            sys.stderr.write(response["err"])
+            sys.exit(response["code"])
+        if "stdin" in message:
+            sys.stdin = StringIO(message["stdin"])
+    with span("imports"):
+        from wokcli.cli import WokCli
 
+    WokCli()
 
-class WokCli:
-    def __init__(self):
-        self.api = WokApi()
-        self.api.load()
-        self.save = False
-        self.run()
-        if self.save:
-            self.api.save()
-
-    def run(self):
-        parser = ArgumentParser(
-            epilog="""Available commands are:
-* status  : display current job and running task(s)
-* switch  : switch between jobs
-* job     : handle jobs (list, create, delete, ...)
-* task    : handle tasks (list, create, delete, ...)
-* end     : suspend a task or all running tasks if any
-* start   : start the given task (can be prefixed by job name 'job.task')
-* details : display detailed tables of all jobs and tasks
-See 'wok <command> --help' for more help on each command""",
-            formatter_class=RawDescriptionHelpFormatter,
-        )
-        parser.add_argument(
-            "command",
-            choices=["status", "switch", "job", "task", "end", "start", "details"],
-            nargs="?",
-            default="status",
-        )
-        args = parser.parse_args(sys.argv[1:2])
-        # Invoke method with command name
-        getattr(self, args.command)()
-
-    def status(self):
-        parser = ArgumentParser(
-            prog=sys.argv[0] + " status",
-            description="Display current job and running task(s)",
-        )
-        parser.parse_args(sys.argv[2:])
-        res, out = self.api.status()
-        if res:
-            print(out)
-
-    def switch(self):
-        parser = ArgumentParser(
-            prog=sys.argv[0] + " switch", description="Switch to a job"
-        )
-        parser.add_argument("job", help="the job to switch to")
-        parser.add_argument(
-            "-c",
-            "--create",
-            action="store_true",
-            help="Create the job if it does not exist",
-        )
-        args = parser.parse_args(sys.argv[2:])
-        self.save, out = self.api.switch(args.job, create=args.create)
-        print(out)
-
-    def start(self):
-        parser = ArgumentParser(prog=sys.argv[0] + " start", description="Start a task")
-        parser.add_argument(
-            "path",
-            help="the task to start, can be prefixed by the job as 'job.task'",
-            nargs="*",
-        )
-        parser.add_argument(
-            "-c",
-            "--create",
-            action="store_true",
-            help="Create the task if it does not exist",
-        )
-        args = parser.parse_args(sys.argv[2:])
-        for path in args.path:
-            started, out = self.api.start(path, create=args.create)
-            if started:
-                # One task started might be False but save must stay True
-                self.save = True
-            print(out)
-
-    def end(self):
-        parser = ArgumentParser(
-            prog=sys.argv[0] + " end",
-            description="Suspend a task or all running tasks if any",
-        )
-        parser.add_argument(
-            "path",
-            help="the task to end, can be prefixed by the job as 'job.task'",
-            nargs="*",
-        )
-        args = parser.parse_args(sys.argv[2:])
-        if len(args.path) == 0:
-            self.save, out = self.api.suspend()
-            print(out)
-        else:
-            for path in args.path:
-                res, msg = self.api.end(path)
-                if res:
-                    # One task res might be False but save must stay True
-                    self.save = True
-                print(msg)
 
-    def __check_args_nb(self, li, fun):
-        if not fun(len(li)):
-            print("Incorrect number of arguments")
-            return False
-        return True
+def profile(args, dump: str):
+    """Run the command without the daemon, then print the time spent in each
+    phase (see wok.trace) to stderr
 
-    def job(self):
-        description = "Handle jobs\n\n"
-        description += "Examples:\n"
-        description += f"\t- '{sys.argv[0]} job my_job' : display info about 'my_job'\n"
-        description += f"\t- '{sys.argv[0]} job --create my_other_job'\n"
-        description += f"\t- '{sys.argv[0]} job --rename my_other_job my_newer_job'"
-        parser = ArgumentParser(
-            prog=sys.argv[0] + " job",
-            description=description,
-            formatter_class=RawDescriptionHelpFormatter,
-        )
-        parser.add_argument(
-            "-t",
-            "--table",
-            action="store_true",
-            help="Display jobs details in table format",
-        )
-        group = parser.add_mutually_exclusive_group()
-        group.add_argument(
-            "-c", "--create", action="store_true", help="Create a job",
-        )
-        group.add_argument(
-            "-d",
-            "--delete",
-            action="store_true",
-            help="Delete the specified job and all its tasks",
-        )
-        group.add_argument(
-            "-r", "--rename", action="store_true", help="Rename the specified job"
-        )
-        group.add_argument(
-            "-l", "--list", action="store_true", help="List all existing jobs"
-        )
-        parser.add_argument("job", nargs="*", help="The job(s) to handle")
-        args = parser.parse_args(sys.argv[2:])
-        if args.create:
-            if not self.__check_args_nb(args.job, lambda x: x > 0):
-                return
-            for job in args.job:
-                res, msg = self.api.add_job(job)
-                if res:
-                    # One job res might be False but save must stay True
-                    self.save = True
-                print(msg)
-        elif args.delete:
-            if not self.__check_args_nb(args.job, lambda x: x == 1):
-                return
-            self.save, out = self.api.delete_job(args.job[0])
-            print(out)
-        elif args.rename:
-            if not self.__check_args_nb(args.job, lambda x: x == 2):
-                return
-            self.save, out = self.api.rename_job(*args.job[:2])
-            print(out)
-        elif len(args.job) == 0 or args.list:
-            _, out = self.api.list_jobs()
-            print(out)
-        else:
-            for job in args.job:
-                _, out = self.api.get_job_details(job, table=args.table)
-                print(out)
+    :param args: The command line arguments
+    :param dump: '1' or a file to write cProfile stats to
 
-    def task(self):
-        description = "Handle tasks\n\n"
-        description += "Examples:\n"
-        description += (
-            f"\t- '{sys.argv[0]} task my_task' : display info about 'my_task'\n"
-        )
-        description += f"\t- '{sys.argv[0]} task --create my_other_task'\n"
-        description += f"\t- '{sys.argv[0]} task --rename my_other_task my_newer_task'"
-        parser = ArgumentParser(
-            prog=sys.argv[0] + " task",
-            description=description,
-            formatter_class=RawDescriptionHelpFormatter,
-        )
-        parser.add_argument(
-            "-t",
-            "--table",
-            action="store_true",
-            help="Display tasks details in table format",
-        )
-        group = parser.add_mutually_exclusive_group()
-        group.add_argument(
-            "-c",
-            "--create",
-            action="store_true",
-            help="Create a task in the current job",
-        )
-        group.add_argument(
-            "-d", "--delete", action="store_true", help="Delete the specified task",
-        )
-        group.add_argument(
-            "-r", "--rename", action="store_true", help="Rename the specified task"
-        )
-        group.add_argument(
-            "-l",
-            "--list",
-            action="store_true",
-            help="List all existing tasks in the current job",
-        )
-        group.add_argument(
-            "--register",
-            help="""Register starting and/or ending dates for the given task.
-Examples: "2020-01-01T09:10:11.123456->12:34", "12:34:56", "->01:02", ...""",
-        )
-        parser.add_argument(
-            "-s", "--short", action="store_true", help="Do not display previous times"
-        )
-        parser.add_argument(
-            "path",
-            help="the task(s) to handle, can be prefixed by the job as 'job.task'",
-            nargs="*",
-        )
-        args = parser.parse_args(sys.argv[2:])
-        if args.create:
-            if not self.__check_args_nb(args.path, lambda x: x > 0):
-                return
-            for path in args.path:
-                res, msg = self.api.add_task(path)
-                if res:
-                    # One path res might be False but save must stay True
-                    self.save = True
-                print(msg)
-        elif args.delete:
-            if not self.__check_args_nb(args.path, lambda x: x == 1):
-                return
-            self.save, out = self.api.delete_task(args.path[0])
-            print(out)
-        elif args.rename:
-            if not self.__check_args_nb(args.path, lambda x: x == 2):
-                return
-            self.save, out = self.api.rename_task(*args.path[:2])
-            print(out)
-        elif args.register is not None:
-            if not self.__check_args_nb(args.path, lambda x: x == 1):
-                return
-            if "->" not in args.register:
-                start, end = args.register, None
-            else:
-                start, end = args.register.split("->")
-            self.save, out = self.api.register_task(args.path[0], start, end)
-            print(out)
-        elif len(args.path) == 0 or args.list:
-            _, out = self.api.list_current_job_tasks()
-            print(out)
+    """
+    from cProfile import Profile
 
-        else:
-            for path in args.path:
-                _, out = self.api.get_task_details(
-                    path, table=args.table, time=not args.short
-                )
-                print(out)
+    from wok import trace
 
-    def details(self):
-        parser = ArgumentParser(
-            prog=sys.argv[0] + " details",
-            description="Display detailed tables of all jobs and tasks",
-        )
-        parser.parse_args(sys.argv[2:])
-        _, out = self.api.get_details()
-        print(out)
+    trace.enable()
+    profiler = None if dump == "1" else Profile()
+    try:
+        with trace.span("wok"):
+            if profiler is not None:
+                profiler.enable()
+            run(args, forward=False)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(dump)
+        trace.report(sys.stderr)
 
 
 def main():
-    WokCli()
+    args = sys.argv[1:]
+    # --profile or --profile=FILE before the command, or WOK_TRACE=1|FILE
+    dump = os.environ.get("WOK_TRACE", "")
+    if len(args) > 0 and args[0].split("=")[0] == "--profile":
+        dump = args[0].partition("=")[2] or "1"
+        del sys.argv[1]
+        args = args[1:]
+    if dump != "":
+        profile(args, dump)
+    else:
+        run(args)
 
 
 if __name__ == "__main__":